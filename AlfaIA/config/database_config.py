@@ -35,17 +35,119 @@ class DatabaseConfig:
         'sql_mode': 'STRICT_TRANS_TABLES,NO_ZERO_DATE,NO_ZERO_IN_DATE,ERROR_FOR_DIVISION_BY_ZERO',
 
         # Pool de conexiones
-        'pool_size': 10,
-        'pool_reset_session': True,
-        'pool_name': 'alfaia_pool'
+        'pool_size': int(os.getenv('DB_POOL_SIZE', 20)),
+        'pool_reset_session': os.getenv('DB_POOL_RESET_SESSION', 'false').lower() == 'true',
+        'pool_name': 'alfaia_pool',
+        # Segundos que get_connection espera por una conexión libre
+        'pool_queue_timeout': float(os.getenv('DB_POOL_QUEUE_TIMEOUT', 5))
     }
 
+    # Claves de DATABASE que configuran el pool y no se pasan a connect()
+    POOL_KEYS = ('pool_size', 'pool_reset_session', 'pool_name', 'pool_queue_timeout')
+
+    # Réplicas de solo lectura: DB_REPLICAS="host1:3306,host2" (mismo usuario, clave y BD)
+    REPLICAS = [
+        {'host': host, 'port': int(port or 3306)}
+        for host, _, port in (
+            entry.strip().partition(':') for entry in os.getenv('DB_REPLICAS', '').split(',')
+        )
+        if host
+    ]
+
+    # Resultados memorizados de get_connection_dict / get_pool_settings
+    _connection_dict = None
+    _pool_settings = None
+
+    @classmethod
+    def get_connection_dict(cls) -> Dict[str, Any]:
+        """Obtener parámetros de conexión para mysql.connector (copia del valor memorizado)"""
+        if cls._connection_dict is None:
+            cls._connection_dict = {
+                key: value for key, value in cls.DATABASE.items() if key not in cls.POOL_KEYS
+            }
+        return dict(cls._connection_dict)
+
+    @classmethod
+    def get_pool_settings(cls) -> Dict[str, Any]:
+        """Obtener parámetros del pool de conexiones (no modificar el dict devuelto)"""
+        if cls._pool_settings is None:
+            cls._pool_settings = {key: cls.DATABASE[key] for key in cls.POOL_KEYS}
+        return cls._pool_settings
+
+    @classmethod
+    def invalidate(cls) -> None:
+        """Descartar los valores memorizados tras modificar DATABASE"""
+        cls._connection_dict = None
+        cls._pool_settings = None
+
+    @classmethod
+    def create_database_if_not_exists(cls, connection_config: Dict[str, Any] = None):
+        """
+        Crear la base de datos si no existe
+
+        Args:
+            connection_config: Parámetros de conexión (por defecto get_connection_dict())
+
+        Returns:
+            MySQLConnection abierta y situada en la base de datos; el llamador
+            debe cerrarla o reutilizarla
+        """
+        import mysql.connector
+
+        params = dict(connection_config or cls.get_connection_dict())
+        database = params.pop('database')
+        connection = mysql.connector.connect(**params)
+        try:
+            cursor = connection.cursor()
+            cursor.execute(
+                f"CREATE DATABASE IF NOT EXISTS `{database}` "
+                f"CHARACTER SET {params['charset']} COLLATE {params['collation']}"
+            )
+            cursor.close()
+            connection.database = database
+        except Exception:
+            connection.close()
+            raise
+        return connection
+
     # =============================================================================
     # CONFIGURACIÓN DE TABLAS
     # =============================================================================
 
     # Scripts SQL para crear las tablas
     TABLE_SCHEMAS = {
+        # Catálogos de las columnas nivel_inicial, rol y estilo_aprendizaje: el id
+        # (posición desde 1) coincide con core.database.connection.LOOKUP_TABLES
+        'niveles_usuario': """
+                           CREATE TABLE IF NOT EXISTS niveles_usuario
+                           (
+                               id     TINYINT UNSIGNED PRIMARY KEY,
+                               nombre VARCHAR(32) UNIQUE NOT NULL
+                           ) ENGINE = InnoDB
+                             DEFAULT CHARSET = utf8mb4
+                             COLLATE = utf8mb4_unicode_ci;
+                           """,
+
+        'roles_usuario': """
+                         CREATE TABLE IF NOT EXISTS roles_usuario
+                         (
+                             id     TINYINT UNSIGNED PRIMARY KEY,
+                             nombre VARCHAR(32) UNIQUE NOT NULL
+                         ) ENGINE = InnoDB
+                           DEFAULT CHARSET = utf8mb4
+                           COLLATE = utf8mb4_unicode_ci;
+                         """,
+
+        'estilos_aprendizaje': """
+                               CREATE TABLE IF NOT EXISTS estilos_aprendizaje
+                               (
+                                   id     TINYINT UNSIGNED PRIMARY KEY,
+                                   nombre VARCHAR(32) UNIQUE NOT NULL
+                               ) ENGINE = InnoDB
+                                 DEFAULT CHARSET = utf8mb4
+                                 COLLATE = utf8mb4_unicode_ci;
+                               """,
+
         'usuarios': """
                     CREATE TABLE IF NOT EXISTS usuarios
                     (
@@ -55,12 +157,14 @@ class DatabaseConfig:
                         nombre             VARCHAR(100)        NOT NULL,
                         apellido           VARCHAR(100)        NOT NULL,
                         fecha_nacimiento   DATE,
-                        nivel_inicial      ENUM ('principiante', 'basico', 'intermedio', 'avanzado') DEFAULT 'principiante',
-                        rol                ENUM ('estudiante', 'profesor', 'administrador')          DEFAULT 'estudiante',
-                        activo             BOOLEAN                                                   DEFAULT TRUE,
-                        fecha_registro     TIMESTAMP                                                 DEFAULT CURRENT_TIMESTAMP,
+                        nivel_inicial      TINYINT UNSIGNED    NOT NULL DEFAULT 1,
+                        rol                TINYINT UNSIGNED    NOT NULL DEFAULT 1,
+                        activo             BOOLEAN                      DEFAULT TRUE,
+                        fecha_registro     TIMESTAMP                    DEFAULT CURRENT_TIMESTAMP,
                         ultima_conexion    TIMESTAMP           NULL,
                         configuracion_json TEXT,
+                        FOREIGN KEY (nivel_inicial) REFERENCES niveles_usuario (id),
+                        FOREIGN KEY (rol) REFERENCES roles_usuario (id),
                         INDEX idx_email (email),
                         INDEX idx_activo (activo),
                         INDEX idx_fecha_registro (fecha_registro)
@@ -83,12 +187,13 @@ class DatabaseConfig:
                                 tiempo_total_minutos       INT                                                 DEFAULT 0,
                                 ejercicios_completados     INT                                                 DEFAULT 0,
                                 objetivo_diario_ejercicios INT                                                 DEFAULT 5,
-                                estilo_aprendizaje         ENUM ('visual', 'auditivo', 'kinestesico', 'mixto') DEFAULT 'mixto',
+                                estilo_aprendizaje         TINYINT UNSIGNED                           NOT NULL DEFAULT 4,
                                 preferencias_json          TEXT,
                                 estadisticas_json          TEXT,
                                 fecha_creacion             TIMESTAMP                                           DEFAULT CURRENT_TIMESTAMP,
                                 fecha_actualizacion        TIMESTAMP                                           DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
                                 FOREIGN KEY (user_id) REFERENCES usuarios (id) ON DELETE CASCADE,
+                                FOREIGN KEY (estilo_aprendizaje) REFERENCES estilos_aprendizaje (id),
                                 UNIQUE KEY unique_user_profile (user_id),
                                 INDEX idx_user_id (user_id),
                                 INDEX idx_puntos (puntos_totales),
@@ -144,7 +249,7 @@ class DatabaseConfig:
                                      total_preguntas      INT           DEFAULT 0,
                                      intentos             INT           DEFAULT 1,
                                      pistas_usadas        INT           DEFAULT 0,
-                                     fecha_completado     TIMESTAMP     DEFAULT CURRENT_TIMESTAMP,
+                                     fecha_completado     DATETIME(6)   NOT NULL DEFAULT CURRENT_TIMESTAMP(6),
                                      datos_json           TEXT,                    -- Respuestas detalladas y análisis
                                      FOREIGN KEY (user_id) REFERENCES usuarios (id) ON DELETE CASCADE,
                                      FOREIGN KEY (ejercicio_id) REFERENCES ejercicios (id) ON DELETE SET NULL,
@@ -240,6 +345,25 @@ class DatabaseConfig:
     # =============================================================================
 
     INITIAL_DATA = {
+        'niveles_usuario': [
+            {'id': 1, 'nombre': 'Principiante'},
+            {'id': 2, 'nombre': 'Intermedio'},
+            {'id': 3, 'nombre': 'Avanzado'}
+        ],
+
+        'roles_usuario': [
+            {'id': 1, 'nombre': 'Estudiante'},
+            {'id': 2, 'nombre': 'Tutor'},
+            {'id': 3, 'nombre': 'Administrador'}
+        ],
+
+        'estilos_aprendizaje': [
+            {'id': 1, 'nombre': 'Visual'},
+            {'id': 2, 'nombre': 'Auditivo'},
+            {'id': 3, 'nombre': 'Kinestésico'},
+            {'id': 4, 'nombre': 'Mixto'}
+        ],
+
         'usuarios': [
             {
                 'email': 'admin@alfaia.com',
@@ -247,8 +371,8 @@ class DatabaseConfig:
                 'nombre': 'Administrador',
                 'apellido': 'Sistema',
                 'fecha_nacimiento': '1990-01-01',
-                'nivel_inicial': 'avanzado',
-                'rol': 'administrador'
+                'nivel_inicial': 3,  # Avanzado
+                'rol': 3  # Administrador
             },
             {
                 'email': 'test@alfaia.com',
@@ -256,8 +380,8 @@ class DatabaseConfig:
                 'nombre': 'Usuario',
                 'apellido': 'Prueba',
                 'fecha_nacimiento': '2000-06-15',
-                'nivel_inicial': 'principiante',
-                'rol': 'estudiante'
+                'nivel_inicial': 1,  # Principiante
+                'rol': 1  # Estudiante
             }
         ],
 
@@ -7,13 +7,14 @@ from datetime import datetime, timedelta
 from typing import Optional, Tuple
 import secrets
 import sys
+import time
 from pathlib import Path
 import threading
 
 # Agregar path para imports
 sys.path.append(str(Path(__file__).parent.parent.parent))
 
-from core.database.models import Usuario, PerfilUsuario, NivelUsuario, RolUsuario
+from core.database.models import Usuario, PerfilUsuario, NivelUsuario, RolUsuario, forget_missing_email
 
 
 class ValidationError(Exception):
@@ -28,6 +29,10 @@ class AuthenticationManager:
     _lock = threading.RLock()  # Recursive lock para evitar deadlock
     _initialized = False
 
+    # Duración de la sesión: la validez se comprueba con reloj monótono
+    _SESSION_TTL = timedelta(hours=8)
+    _SESSION_TTL_NS = int(_SESSION_TTL.total_seconds()) * 1_000_000_000
+
     def __new__(cls):
         """Implementación de Singleton thread-safe"""
         if cls._instance is None:
@@ -44,6 +49,7 @@ class AuthenticationManager:
                     self.current_user: Optional[Usuario] = None
                     self.session_token: Optional[str] = None
                     self.session_expires: Optional[datetime] = None
+                    self._expires_ns: int = 0
                     self.is_authenticated: bool = False
                     self.__class__._initialized = True
                     print("🔐 AuthenticationManager inicializado (Singleton)")
@@ -89,20 +95,35 @@ class AuthenticationManager:
                     except ValueError:
                         pass  # Ignorar si el formato es inválido
 
-                # Guardar usuario
-                if not user.save():
+                # Guardar usuario y perfil en una sola transacción
+                from core.database.connection import DatabaseManager, DatabaseUnavailable
+                try:
+                    connection = DatabaseManager().get_connection()
+                except DatabaseUnavailable:
                     return False, "Error al guardar el usuario"
 
-                # Crear perfil por defecto
-                perfil = PerfilUsuario(
-                    user_id=user.id,
-                    preferencias_json={
-                        "tema": "light",
-                        "notificaciones": True,
-                        "sonidos": True
-                    }
-                )
-                perfil.save()
+                cursor = connection.cursor()
+                try:
+                    user.save(cursor=cursor)
+
+                    # Crear perfil por defecto
+                    perfil = PerfilUsuario(
+                        user_id=user.id,
+                        preferencias_json={
+                            "tema": "light",
+                            "notificaciones": True,
+                            "sonidos": True
+                        }
+                    )
+                    perfil.save(cursor=cursor)
+                    connection.commit()
+                    forget_missing_email(user.email)
+                except Exception:
+                    connection.rollback()
+                    raise
+                finally:
+                    cursor.close()
+                    connection.close()
 
                 print(f"✅ Usuario registrado exitosamente: {email}")
                 return True, "Usuario registrado exitosamente"
@@ -120,25 +141,36 @@ class AuthenticationManager:
                 if not email or not password:
                     return False, "Email y contraseña son requeridos"
 
-                # Buscar usuario
-                user = Usuario.find_by_email(email.lower().strip())
-                if not user:
+                # Buscar credenciales (solo id, hash y estado)
+                auth = Usuario.find_auth_by_email(email.lower().strip())
+                if not auth:
                     print(f"❌ Usuario no encontrado: {email}")
                     return False, "Credenciales inválidas"
 
-                if not user.activo:
+                user_id, password_hash, activo = auth
+                if not activo:
                     print(f"❌ Cuenta desactivada: {email}")
                     return False, "Cuenta desactivada"
 
                 # Verificar contraseña
-                if not user.verify_password(password):
+                if not Usuario.check_password(password, password_hash):
                     print(f"❌ Contraseña incorrecta para: {email}")
                     return False, "Credenciales inválidas"
 
+                # Cargar el usuario completo solo tras validar las credenciales
+                user = Usuario.find_by_id(user_id)
+                if not user:
+                    return False, "Credenciales inválidas"
+
+                if user.needs_rehash():
+                    # Hash con un coste inferior al actual: se renueva aprovechando el login
+                    user.update_password(password)
+
                 # CREAR SESIÓN DE FORMA ATÓMICA
                 self.current_user = user
                 self.session_token = secrets.token_urlsafe(32)
-                self.session_expires = datetime.now() + timedelta(hours=8)
+                self.session_expires = datetime.now() + self._SESSION_TTL
+                self._expires_ns = time.monotonic_ns() + self._SESSION_TTL_NS
                 self.is_authenticated = True
 
                 print(f"✅ [THREAD-SAFE] Login exitoso para: {user.email}")
@@ -165,6 +197,7 @@ class AuthenticationManager:
                 self.current_user = None
                 self.session_token = None
                 self.session_expires = None
+                self._expires_ns = 0
                 self.is_authenticated = False
 
                 print("✅ Sesión cerrada exitosamente")
@@ -182,7 +215,7 @@ class AuthenticationManager:
             if not self.current_user or not self.session_expires:
                 return False
 
-            is_valid = datetime.now() < self.session_expires
+            is_valid = time.monotonic_ns() < self._expires_ns
 
             if not is_valid:
                 print("⏰ Sesión expirada, limpiando...")
@@ -190,6 +223,7 @@ class AuthenticationManager:
                 self.current_user = None
                 self.session_token = None
                 self.session_expires = None
+                self._expires_ns = 0
                 self.is_authenticated = False
 
             return is_valid
@@ -3,9 +3,15 @@
 # =============================================================================
 
 import mysql.connector
-from mysql.connector import pooling, Error
-from typing import Optional, Dict, Any, List
+from mysql.connector import pooling, Error, PoolError, InterfaceError
+from mysql.connector.conversion import MySQLConverter
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, List, Iterator
 import logging
+import re
+import threading
+import time
+import weakref
 from pathlib import Path
 import sys
 
@@ -13,6 +19,96 @@ import sys
 sys.path.append(str(Path(__file__).parent.parent.parent))
 
 from config.database_config import DatabaseConfig
+from core.database.models import NivelUsuario, RolUsuario, EstiloAprendizaje, legacy_lookup_ids
+
+# Tablas de catálogo que sustituyen a las columnas ENUM: {tabla: nombres}.
+# El id de cada fila es su posición (desde 1), igual que el índice de un ENUM.
+LOOKUP_TABLES = {
+    "niveles_usuario": tuple(nivel.value for nivel in NivelUsuario),
+    "roles_usuario": tuple(rol.value for rol in RolUsuario),
+    "estilos_aprendizaje": tuple(estilo.value for estilo in EstiloAprendizaje),
+    "tipos_ejercicio": ('Completar_Palabra', 'Encontrar_Error', 'Clasificar_Palabra', 'Comprension', 'Ordenar_Frase'),
+}
+
+LOOKUP_TABLE_DDL = """
+                   CREATE TABLE IF NOT EXISTS {tabla}
+                   (
+                       id     TINYINT UNSIGNED PRIMARY KEY,
+                       nombre VARCHAR(32) UNIQUE NOT NULL
+                   ) ENGINE = InnoDB
+                     CHARSET = utf8mb4
+                     COLLATE = utf8mb4_unicode_ci;
+                   """
+
+# Columnas que en esquemas previos eran ENUM y ahora guardan el id de catálogo:
+# (tabla, columna, catálogo, texto en minúsculas -> id, id por defecto).
+# Los ids no coinciden con el índice de esos ENUM, por eso hay que migrarlas.
+LOOKUP_COLUMNS = (
+    ("usuarios", "nivel_inicial", "niveles_usuario", legacy_lookup_ids(NivelUsuario), 1),
+    ("usuarios", "rol", "roles_usuario", legacy_lookup_ids(RolUsuario), 1),
+    ("perfiles_usuario", "estilo_aprendizaje", "estilos_aprendizaje", legacy_lookup_ids(EstiloAprendizaje), 4),
+    ("ejercicios", "tipo", "tipos_ejercicio",
+     {nombre.lower(): index for index, nombre in enumerate(LOOKUP_TABLES["tipos_ejercicio"], start=1)}, None),
+)
+
+# orjson es opcional: si está instalado las columnas JSON llegan ya decodificadas
+try:
+    import orjson
+
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Nombres de tabla/columna aceptados al construir SQL dinámico
+IDENTIFIER_PATTERN = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+# Errores de conexión que se reintentan: CR_SERVER_GONE_ERROR, CR_SERVER_LOST
+TRANSIENT_ERRNOS = (2006, 2013)
+
+
+class DatabaseUnavailable(Error):
+    """No se pudo obtener una conexión válida a la base de datos"""
+    pass
+
+
+# Índices añadidos después del esquema inicial: (tabla, índice, tipo, columnas)
+MIGRATION_INDEXES = (
+    # Cubre ExercisesManager.get_user_progress: filtra por user_id y completado
+    # y agrega el resto de columnas sin leer las filas de la tabla
+    ("resultados_ejercicios", "idx_user_progreso", "INDEX",
+     "(user_id, completado, ejercicio_id, puntos_obtenidos, precision_porcentaje, tiempo_segundos)"),
+    # Un perfil por usuario; lo necesita el upsert de perfiles (ON DUPLICATE KEY UPDATE)
+    ("perfiles_usuario", "unique_user_profile", "UNIQUE INDEX", "(user_id)"),
+)
+
+
+class OrjsonConverter(MySQLConverter):
+    """Conversor que decodifica las columnas JSON con orjson al leer cada fila"""
+
+    def _json_to_python(self, value, dsc=None):
+        return orjson.loads(value)
+
+
+class NotifyingConnectionPool(pooling.MySQLConnectionPool):
+    """Pool que despierta a los hilos en espera cuando se devuelve una conexión
+
+    PooledMySQLConnection.close() devuelve la conexión con add_connection(), así
+    que basta con notificar ahí para que _checkout espere sin sondear.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self._returned = threading.Condition()
+        super().__init__(*args, **kwargs)
+
+    def add_connection(self, cnx=None) -> None:
+        super().add_connection(cnx)
+        with self._returned:
+            self._returned.notify()
+
+    def wait_for_connection(self, timeout: float) -> bool:
+        """Esperar hasta `timeout` segundos a que haya una conexión libre"""
+        with self._returned:
+            return self._returned.wait_for(lambda: not self._cnx_queue.empty(), timeout)
 
 
 class DatabaseManager:
@@ -20,130 +116,626 @@ class DatabaseManager:
 
     _instance = None
     _pool = None
+    _keepalive_timer = None
+    _keepalive_stop = threading.Event()
+    _lock = threading.Lock()
+
+    # Cursores preparados por conexión física: {conexión: (connection_id, {sql: cursor})}.
+    # Una reconexión (ping o el propio pool) reutiliza el objeto pero abre otra
+    # sesión sin esas sentencias; el connection_id distinto lo delata.
+    _prepared_cursors = weakref.WeakKeyDictionary()
+    _prepared_lock = threading.Lock()
+
+    # Último checkout de cada conexión física, para decidir si validarla
+    _last_checkout = weakref.WeakKeyDictionary()
+
+    # Intervalo del ping que mantiene el pool caliente (menor que wait_timeout)
+    KEEPALIVE_INTERVAL = 60.0
+
+    # Ocupación del pool a partir de la cual el monitor avisa, y cuántas
+    # muestras seguidas deben superarla antes de emitir el aviso
+    POOL_SATURATION_THRESHOLD = 0.8
+    POOL_SATURATION_SAMPLES = 3
+
+    # Reintentos de get_connection ante errores transitorios y backoff inicial (s)
+    CONNECT_ATTEMPTS = 3
+    CONNECT_BACKOFF = 0.05
+
+    # Solo se valida con ping una conexión que lleva más de estos segundos sin usarse
+    VALIDATION_IDLE_SECONDS = 30.0
+
+    # Filas por executemany al sembrar datos, para no superar max_allowed_packet
+    SEED_CHUNK_SIZE = 1000
 
     def __new__(cls):
-        """Singleton pattern para el gestor de BD"""
+        """Singleton pattern thread-safe para el gestor de BD"""
         if cls._instance is None:
-            cls._instance = super(DatabaseManager, cls).__new__(cls)
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = super(DatabaseManager, cls).__new__(cls)
         return cls._instance
 
     def __init__(self):
         """Inicializar el gestor de base de datos"""
         if not hasattr(self, 'initialized'):
-            self.logger = logging.getLogger(__name__)
-            self.config = DatabaseConfig()
-            self.initialized = True
+            with self._lock:
+                if not hasattr(self, 'initialized'):
+                    self.logger = logging.getLogger(__name__)
+                    self.config = DatabaseConfig()
+                    self._waiting = 0
+                    self._waiting_lock = threading.Lock()
+                    self._monitor_thread = None
+                    self._monitor_stop = threading.Event()
+                    self.initialized = True
+
+    def ensure_database_exists(self, connection_config: Dict[str, Any] = None):
+        """Asegurar que la base de datos existe
 
-    def ensure_database_exists(self) -> bool:
-        """Asegurar que la base de datos existe"""
+        Retorna la conexión administrativa usada (ya situada en la BD) o None.
+        """
         try:
-            return self.config.create_database_if_not_exists()
+            return self.config.create_database_if_not_exists(connection_config)
         except Exception as e:
-            self.logger.error(f"Error asegurando que existe la BD: {e}")
-            return False
+            self.logger.error("Error asegurando que existe la BD: %s", e)
+            return None
 
     def create_connection_pool(self) -> bool:
         """Crear pool de conexiones a MySQL"""
+        admin_connection = None
         try:
-            if not self.ensure_database_exists():
+            pool_settings = self.config.get_pool_settings()
+            connection_config = self._with_session_init(self.config.get_connection_dict())
+            if ORJSON_AVAILABLE:
+                connection_config["converter_class"] = OrjsonConverter
+
+            # La conexión que crea la BD pasa a ser el primer miembro del pool
+            admin_connection = self.ensure_database_exists(connection_config)
+            if admin_connection is None:
                 self.logger.error("No se pudo crear o verificar la base de datos")
                 return False
 
-            pool_config = self.config.get_connection_dict()
-            safe_pool_config = {
-                "pool_name": "alfaia_pool",
-                "pool_size": 10,
-                "pool_reset_session": True
-            }
+            pool_size = pool_settings["pool_size"]
+            if pool_size > pooling.CNX_POOL_MAXSIZE:
+                self.logger.warning(
+                    "pool_size=%d supera el máximo de mysql-connector; se usan %d conexiones",
+                    pool_size, pooling.CNX_POOL_MAXSIZE
+                )
+                pool_size = pooling.CNX_POOL_MAXSIZE
+
+            # Sin parámetros de conexión el pool se crea vacío y se llena a mano
+            pool = NotifyingConnectionPool(
+                pool_name=pool_settings["pool_name"],
+                pool_size=pool_size,
+                pool_reset_session=pool_settings["pool_reset_session"]
+            )
+            pool.set_config(**connection_config)
+            # add_connection() solo marca con la versión de configuración del pool las
+            # conexiones que abre él; sin la marca, el primer checkout de la
+            # administrativa repetiría config() + reconnect(). Se abrió con la misma
+            # connection_config, así que se marca como ya configurada.
+            admin_connection.pool_config_version = pool._config_version
+            pool.add_connection(admin_connection)
+            self.logger.info("Conexión administrativa %s reutilizada en el pool", admin_connection.connection_id)
+            admin_connection = None
 
-            pool_config.update(safe_pool_config)
+            for _ in range(pool_size - 1):
+                pool.add_connection()
 
-            self._pool = pooling.MySQLConnectionPool(**pool_config)
+            self._pool = pool
             self.logger.info("Pool de conexiones creado exitosamente")
+
+            # Se acaban de abrir: no hace falta un ping por conexión para validarlas
+            self._mark_validated(list(pool._cnx_queue.queue))
+            DatabaseManager._keepalive_stop.clear()
+            self._schedule_keepalive()
             return True
 
         except Error as e:
-            self.logger.error(f"Error creando pool de conexiones: {e}")
+            if admin_connection is not None:
+                admin_connection.close()
+            self.logger.error("Error creando pool de conexiones: %s", e)
             return False
 
-    def get_connection(self):
-        """Obtener conexión del pool"""
+    @staticmethod
+    def _with_session_init(connection_config: Dict[str, Any]) -> Dict[str, Any]:
+        """Agrupar el estado de sesión en un único init_command
+
+        time_zone y sql_mode se aplicarían con un SET por variable al abrir cada
+        conexión física; juntos en init_command cuestan un solo round trip y se
+        reaplican también en reconexiones. Sin pool_reset_session, ese estado se
+        conserva entre checkouts del pool.
+        """
+        config = dict(connection_config)
+        assignments = []
+        time_zone = config.pop("time_zone", None)
+        if time_zone:
+            assignments.append(f"time_zone = '{time_zone}'")
+        sql_mode = config.pop("sql_mode", None)
+        if sql_mode:
+            assignments.append(f"sql_mode = '{sql_mode}'")
+        if assignments:
+            config["init_command"] = "SET " + ", ".join(assignments)
+        return config
+
+    def warmup(self) -> bool:
+        """Crear el pool si aún no existe y dejar todas sus conexiones abiertas y validadas
+
+        Llamar al arrancar la aplicación para que la primera query del usuario no
+        pague los handshakes con MySQL.
+        """
+        if self._pool is None:
+            # create_connection_pool deja abiertas y validadas todas las conexiones
+            with self._lock:
+                if self._pool is None:
+                    return self.create_connection_pool()
+            return True
+
+        self._warmup_pool(self._pool.pool_size)
+        return True
+
+    def _warmup_pool(self, pool_size: int) -> None:
+        """Validar las conexiones del pool inactivas para no pagar la reconexión en la primera query
+
+        Solo se hace ping a las que llevan más de VALIDATION_IDLE_SECONDS sin
+        usarse; las demás se validaron (o se abrieron) hace poco.
+        """
+        connections = []
         try:
-            if self._pool is None:
-                if not self.create_connection_pool():
-                    return None
+            for _ in range(pool_size):
+                try:
+                    connections.append(self._pool.get_connection())
+                except Error as e:
+                    self.logger.warning("No se pudo precalentar el pool completo: %s", e)
+                    break
 
-            connection = self._pool.get_connection()
-            return connection
+            for connection in connections:
+                try:
+                    self._validate_connection(connection)
+                except Error as e:
+                    self.logger.warning("Conexión del pool sin respuesta al precalentar: %s", e)
+        finally:
+            for connection in connections:
+                connection.close()
+
+    def _mark_validated(self, raw_connections) -> None:
+        """Registrar como recién validadas conexiones físicas que se acaban de abrir"""
+        now = time.monotonic()
+        with self._prepared_lock:
+            for raw_connection in raw_connections:
+                self._last_checkout[raw_connection] = now
+
+    def _schedule_keepalive(self) -> None:
+        """Programar el siguiente ping de mantenimiento del pool"""
+        if self._keepalive_stop.is_set():
+            return
+        timer = threading.Timer(self.KEEPALIVE_INTERVAL, self._keepalive)
+        timer.daemon = True
+        DatabaseManager._keepalive_timer = timer
+        timer.start()
+
+    def stop_keepalive(self) -> None:
+        """Detener el ping de mantenimiento del pool (al cerrar la aplicación)"""
+        DatabaseManager._keepalive_stop.set()
+        timer = DatabaseManager._keepalive_timer
+        if timer is not None:
+            timer.cancel()
+            DatabaseManager._keepalive_timer = None
 
+    def _keepalive(self) -> None:
+        """Hacer ping a una conexión libre para evitar desconexiones por wait_timeout"""
+        if self._pool is None or self._keepalive_stop.is_set():
+            return
+        try:
+            connection = self._pool.get_connection()
+            try:
+                connection.ping(reconnect=True, attempts=1, delay=0)
+            finally:
+                connection.close()
         except Error as e:
-            self.logger.error(f"Error obteniendo conexión: {e}")
-            return None
+            # Pool agotado o servidor caído: se reintenta en el siguiente ciclo
+            self.logger.debug("Keepalive del pool omitido: %s", e)
+        self._schedule_keepalive()
 
-    def test_connection(self) -> bool:
-        """Probar la conexión a la base de datos"""
+    def get_connection(self, timeout: float = None):
+        """Obtener conexión validada del pool
+
+        Si el pool está agotado espera hasta `timeout` segundos (por defecto
+        pool_queue_timeout de la configuración) a que se libere una conexión.
+        Ante errores transitorios (servidor caído, conexión perdida) reintenta con
+        backoff exponencial; si no lo consigue lanza DatabaseUnavailable.
+        """
+        last_error = None
+        for attempt in range(self.CONNECT_ATTEMPTS):
+            if attempt:
+                time.sleep(self.CONNECT_BACKOFF * 2 ** (attempt - 1))
+
+            connection = None
+            try:
+                if self._pool is None:
+                    # Solo un hilo crea el pool; los demás esperan y lo reutilizan
+                    with self._lock:
+                        if self._pool is None and not self.create_connection_pool():
+                            last_error = DatabaseUnavailable(msg="No se pudo crear el pool de conexiones")
+                            continue
+
+                connection = self._checkout(timeout)
+                self._validate_connection(connection)
+                return connection
+
+            except PoolError as e:
+                # Ya se esperó el timeout de cola: reintentar solo alargaría la espera
+                self.logger.error("Error obteniendo conexión: %s", e)
+                raise DatabaseUnavailable(msg=str(e)) from e
+
+            except Error as e:
+                if connection is not None:
+                    try:
+                        connection.close()
+                    except Error:
+                        pass
+                if not self._is_transient(e):
+                    self.logger.error("Error obteniendo conexión: %s", e)
+                    raise DatabaseUnavailable(msg=str(e)) from e
+                last_error = e
+                self.logger.warning("Conexión no disponible (intento %d): %s", attempt + 1, e)
+
+        self.logger.error("Error obteniendo conexión: %s", last_error)
+        raise DatabaseUnavailable(msg=str(last_error)) from last_error
+
+    @staticmethod
+    def _is_transient(error: Error) -> bool:
+        """Indicar si el error de conexión puede resolverse reintentando"""
+        return isinstance(error, InterfaceError) or getattr(error, 'errno', None) in TRANSIENT_ERRNOS
+
+    def _validate_connection(self, connection) -> None:
+        """Hacer ping (con reconexión) si la conexión física lleva tiempo sin usarse"""
+        raw_connection = getattr(connection, '_cnx', connection)
+        now = time.monotonic()
+        with self._prepared_lock:
+            last_checkout = self._last_checkout.get(raw_connection)
+            self._last_checkout[raw_connection] = now
+
+        if last_checkout is None or now - last_checkout > self.VALIDATION_IDLE_SECONDS:
+            connection.ping(reconnect=True, attempts=1, delay=0)
+
+    def _checkout(self, timeout: float = None):
+        """Sacar una conexión del pool esperando hasta `timeout` si está agotado"""
         try:
-            connection = self.get_connection()
-            if connection is None:
-                return False
+            return self._pool.get_connection()
+        except PoolError:
+            pass
+
+        # Pool agotado: esperar a que otro hilo devuelva una conexión
+        if timeout is None:
+            timeout = self.config.get_pool_settings()["pool_queue_timeout"]
+        deadline = time.monotonic() + timeout
+
+        with self._waiting_lock:
+            self._waiting += 1
+        try:
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._pool.wait_for_connection(remaining):
+                    raise PoolError(msg="Pool de conexiones agotado")
+                try:
+                    return self._pool.get_connection()
+                except PoolError:
+                    continue
+        finally:
+            with self._waiting_lock:
+                self._waiting -= 1
+
+    def get_pool_metrics(self) -> Dict[str, Any]:
+        """Obtener ocupación actual del pool: total, activas, libres y en espera"""
+        pool = self._pool
+        if pool is None:
+            return {"total": 0, "active": 0, "idle": 0, "waiting": self._waiting, "utilization": 0.0}
+
+        total = pool.pool_size
+        idle = pool._cnx_queue.qsize()
+        active = total - idle
+        return {
+            "total": total,
+            "active": active,
+            "idle": idle,
+            "waiting": self._waiting,
+            "utilization": active / total if total else 0.0
+        }
+
+    def start_pool_monitor(self, interval: float = 60.0) -> None:
+        """Iniciar hilo que registra periódicamente la ocupación del pool"""
+        if self._monitor_thread is not None and self._monitor_thread.is_alive():
+            return
+
+        self._monitor_stop.clear()
+        self._monitor_thread = threading.Thread(
+            target=self._monitor_pool, args=(interval,),
+            name="alfaia-pool-monitor", daemon=True
+        )
+        self._monitor_thread.start()
+
+    def stop_pool_monitor(self) -> None:
+        """Detener el monitor del pool"""
+        self._monitor_stop.set()
 
-            cursor = connection.cursor()
-            cursor.execute("SELECT 1")
-            result = cursor.fetchone()
+    def _monitor_pool(self, interval: float) -> None:
+        """Bucle del monitor: avisa si el pool se mantiene saturado"""
+        saturated_samples = 0
+        while not self._monitor_stop.wait(interval):
+            metrics = self.get_pool_metrics()
+            self.logger.info(
+                "Pool BD: total=%d activas=%d libres=%d en_espera=%d",
+                metrics["total"], metrics["active"], metrics["idle"], metrics["waiting"]
+            )
 
+            if metrics["utilization"] >= self.POOL_SATURATION_THRESHOLD:
+                saturated_samples += 1
+            else:
+                saturated_samples = 0
+
+            if saturated_samples >= self.POOL_SATURATION_SAMPLES:
+                self.logger.warning(
+                    "Pool BD cerca de saturarse: %.0f%% en uso durante %d muestras",
+                    metrics["utilization"] * 100, saturated_samples
+                )
+
+    @contextmanager
+    def _cursor(self, commit: bool = False, dictionary: bool = False):
+        """Cursor ligado a una conexión del pool durante un bloque de trabajo
+
+        Con commit=True se confirma al salir del bloque; ante cualquier error se
+        hace rollback. Cursor y conexión siempre se liberan.
+        """
+        connection = self.get_connection()
+        cursor = connection.cursor(dictionary=dictionary)
+        try:
+            yield cursor
+            if commit:
+                connection.commit()
+            else:
+                self._end_read_transaction(connection)
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
             cursor.close()
             connection.close()
 
-            return result is not None
+    @staticmethod
+    def _end_read_transaction(connection) -> None:
+        """Cerrar la transacción implícita que abre una lectura con autocommit=False
+
+        Sin pool_reset_session la conexión vuelve al pool tal cual; si la
+        transacción siguiera abierta, su snapshot REPEATABLE READ haría que los
+        siguientes checkouts leyeran filas antiguas. in_transaction sale de los
+        flags de estado del servidor, así que solo se paga el ROLLBACK si hace falta.
+        """
+        if connection.in_transaction:
+            connection.rollback()
+
+    def test_connection(self) -> bool:
+        """Probar la conexión a la base de datos"""
+        return bool(self.execute_prepared("SELECT 1"))
+
+    def execute_query(self, query: str, params: tuple = None,
+                      dictionary: bool = False) -> Optional[List[tuple]]:
+        """Ejecutar query SELECT y retornar resultados (dicts por columna si dictionary=True)"""
+        try:
+            with self._cursor(dictionary=dictionary) as cursor:
+                cursor.execute(query, params or ())
+                return cursor.fetchall()
 
         except Error as e:
-            self.logger.error(f"Error probando conexión: {e}")
-            return False
+            self.logger.error("Error ejecutando query: %s", e)
+            return None
 
-    def execute_query(self, query: str, params: tuple = None) -> Optional[List[tuple]]:
-        """Ejecutar query SELECT y retornar resultados"""
+    def iter_query(self, query: str, params: tuple = None, arraysize: int = 1000,
+                   raw: bool = False) -> Iterator[tuple]:
+        """Ejecutar query SELECT y entregar las filas a medida que llegan
+
+        Usa un cursor sin buffer y lee en bloques de `arraysize` filas, así que la
+        memoria queda acotada al bloque. Con raw=True el conector no convierte
+        tipos (útil si solo se reenvían columnas JSON o texto). Pensado para
+        consultas grandes; para pocas filas usar execute_query.
+        """
+        connection = None
+        cursor = None
         try:
             connection = self.get_connection()
-            if connection is None:
-                return None
-
-            cursor = connection.cursor()
+            cursor = connection.cursor(buffered=False, raw=raw)
             cursor.execute(query, params or ())
-            results = cursor.fetchall()
+            while True:
+                rows = cursor.fetchmany(arraysize)
+                if not rows:
+                    break
+                yield from rows
 
-            cursor.close()
-            connection.close()
+        except Error as e:
+            self.logger.error("Error iterando query: %s", e)
+
+        finally:
+            if cursor is not None:
+                try:
+                    # Consumir filas pendientes si el llamador cortó la iteración
+                    cursor.fetchall()
+                except Error:
+                    pass
+                cursor.close()
+            if connection is not None:
+                try:
+                    self._end_read_transaction(connection)
+                except Error:
+                    pass
+                connection.close()
+
+    def execute_non_query(self, query: str, params: tuple = None) -> bool:
+        """Ejecutar query INSERT/UPDATE/DELETE"""
+        try:
+            with self._cursor(commit=True) as cursor:
+                cursor.execute(query, params or ())
+            return True
+
+        except Error as e:
+            self.logger.error("Error ejecutando non-query: %s", e)
+            return False
 
-            return results
+    def execute_insert(self, query: str, params: tuple = None) -> Optional[int]:
+        """Ejecutar un INSERT con conexión del pool y retornar el id generado (None si hay error)"""
+        try:
+            with self._cursor(commit=True) as cursor:
+                cursor.execute(query, params or ())
+                return cursor.lastrowid
 
         except Error as e:
-            self.logger.error(f"Error ejecutando query: {e}")
+            self.logger.error("Error ejecutando insert: %s", e)
             return None
 
-    def execute_non_query(self, query: str, params: tuple = None) -> bool:
-        """Ejecutar query INSERT/UPDATE/DELETE"""
+    def bulk_insert(self, table: str, columns: List[str], rows: List[tuple]) -> int:
+        """Insertar muchas filas con INSERT multi-fila
+
+        executemany reescribe el INSERT como un único VALUES (...), (...), ...;
+        las filas se agrupan en bloques que no superan la mitad de
+        max_allowed_packet. Retorna las filas insertadas o -1 si hay error.
+        """
+        identifiers = [table, *columns]
+        if not all(IDENTIFIER_PATTERN.match(name) for name in identifiers):
+            self.logger.error("Identificador no válido en bulk_insert: %s", identifiers)
+            return -1
+
+        if not rows:
+            return 0
+
+        placeholders = "(" + ", ".join(["%s"] * len(columns)) + ")"
+        query = f"INSERT INTO {table} ({', '.join(columns)}) VALUES {placeholders}"
+
+        try:
+            inserted = 0
+            with self._cursor(commit=True) as cursor:
+                cursor.execute("SELECT @@max_allowed_packet")
+                max_chunk_bytes = cursor.fetchone()[0] // 2
+
+                chunk = []
+                chunk_bytes = 0
+                for row in rows:
+                    # Estimación del tamaño de la fila ya escapada en el paquete
+                    row_bytes = sum(len(str(value)) + 3 for value in row) + 3
+                    if chunk and chunk_bytes + row_bytes > max_chunk_bytes:
+                        cursor.executemany(query, chunk)
+                        inserted += cursor.rowcount
+                        chunk = []
+                        chunk_bytes = 0
+                    chunk.append(row)
+                    chunk_bytes += row_bytes
+
+                cursor.executemany(query, chunk)
+                inserted += cursor.rowcount
+            return inserted
+
+        except Error as e:
+            self.logger.error("Error en inserción masiva en %s: %s", table, e)
+            return -1
+
+    def _get_prepared_cursor(self, connection, query: str, dictionary: bool = False):
+        """Obtener cursor preparado para la query, reutilizándolo en la misma conexión física"""
+        raw_connection = getattr(connection, '_cnx', connection)
+        connection_id = raw_connection.connection_id
+        with self._prepared_lock:
+            entry = self._prepared_cursors.get(raw_connection)
+            if entry is None or entry[0] != connection_id:
+                # Los cursores de la sesión anterior se descartan sin cerrarlos:
+                # sus ids de sentencia no existen (o son otros) en la nueva
+                entry = (connection_id, {})
+                self._prepared_cursors[raw_connection] = entry
+        cache = entry[1]
+
+        key = (query, dictionary)
+        cursor = cache.get(key)
+        if cursor is None:
+            cursor = connection.cursor(prepared=True, dictionary=dictionary)
+            cache[key] = cursor
+        return cursor
+
+    def _close_prepared_cursors(self, connection) -> None:
+        """Cerrar los cursores preparados asociados a una conexión física"""
+        raw_connection = getattr(connection, '_cnx', connection)
+        with self._prepared_lock:
+            entry = self._prepared_cursors.pop(raw_connection, None)
+        if entry is None or entry[0] != raw_connection.connection_id:
+            return
+        for cursor in entry[1].values():
+            try:
+                cursor.close()
+            except Error:
+                pass
+
+    def execute_prepared(self, query: str, params=None, many: bool = False,
+                         dictionary: bool = False) -> Optional[List[tuple]]:
+        """Ejecutar query como sentencia preparada en el servidor
+
+        MySQL analiza la sentencia una sola vez por conexión física y, mientras el
+        pool no resetee la sesión, la reutiliza en los siguientes checkouts. Con
+        many=True, params es un iterable de tuplas que se ejecutan sobre la misma
+        sentencia. Con dictionary=True las filas son dicts por columna. Retorna
+        las filas para SELECT, lista vacía para escrituras y None si hay error.
+        """
+        connection = None
+        keep_cursors = not self.config.get_pool_settings()["pool_reset_session"]
         try:
             connection = self.get_connection()
-            if connection is None:
-                return False
+            cursor = self._get_prepared_cursor(connection, query, dictionary)
+            if many:
+                cursor.executemany(query, list(params or []))
+            else:
+                cursor.execute(query, params or ())
+
+            if cursor.with_rows:
+                rows = cursor.fetchall()
+                self._end_read_transaction(connection)
+                return rows
 
-            cursor = connection.cursor()
-            cursor.execute(query, params or ())
             connection.commit()
+            return []
 
-            cursor.close()
-            connection.close()
+        except Error as e:
+            # No reutilizar cursores que quedaron a medias tras el error
+            keep_cursors = False
+            self.logger.error("Error ejecutando query preparada: %s", e)
+            return None
 
-            return True
+        finally:
+            if connection is not None:
+                if not keep_cursors:
+                    self._close_prepared_cursors(connection)
+                connection.close()
 
-        except Error as e:
-            self.logger.error(f"Error ejecutando non-query: {e}")
-            return False
+    @staticmethod
+    def _execute_script(cursor, script: str) -> None:
+        """Ejecutar varias sentencias en un solo envío consumiendo todos los resultados
+
+        Los resultados se consumen para no dejar "Unread result found".
+        """
+        try:
+            # mysql-connector < 9.2: multi-sentencia explícita
+            results = cursor.execute(script, multi=True)
+        except TypeError:
+            # mysql-connector >= 9.2 acepta multi-sentencia directamente
+            cursor.execute(script)
+            for _ in cursor.fetchsets():
+                pass
+            return
+
+        for _ in results:
+            pass
 
     def create_database_schema(self) -> bool:
-        """Crear esquema completo de la base de datos"""
+        """Crear esquema completo de la base de datos
+
+        Todas las tablas se crean en un único envío multi-sentencia y los datos
+        iniciales se insertan sobre la misma conexión.
+        """
         try:
-            tables_sql = {
+            tables_sql = {tabla: LOOKUP_TABLE_DDL.format(tabla=tabla) for tabla in LOOKUP_TABLES}
+            tables_sql.update({
                 "usuarios": """
                             CREATE TABLE IF NOT EXISTS usuarios
                             (
@@ -153,11 +745,13 @@ class DatabaseManager:
                                 nombre             VARCHAR(100)        NOT NULL,
                                 apellido           VARCHAR(100)        NOT NULL,
                                 fecha_nacimiento   DATE,
-                                nivel_inicial      ENUM ('Principiante', 'Intermedio', 'Avanzado') DEFAULT 'Principiante',
-                                rol                ENUM ('Estudiante', 'Tutor', 'Administrador')   DEFAULT 'Estudiante',
-                                activo             BOOLEAN                                         DEFAULT TRUE,
-                                fecha_registro     TIMESTAMP                                       DEFAULT CURRENT_TIMESTAMP,
+                                nivel_inicial      TINYINT UNSIGNED    NOT NULL DEFAULT 1,
+                                rol                TINYINT UNSIGNED    NOT NULL DEFAULT 1,
+                                activo             BOOLEAN                      DEFAULT TRUE,
+                                fecha_registro     TIMESTAMP                    DEFAULT CURRENT_TIMESTAMP,
                                 configuracion_json JSON,
+                                FOREIGN KEY (nivel_inicial) REFERENCES niveles_usuario (id),
+                                FOREIGN KEY (rol) REFERENCES roles_usuario (id),
                                 INDEX idx_email (email),
                                 INDEX idx_activo (activo)
                             ) ENGINE = InnoDB
@@ -179,11 +773,12 @@ class DatabaseManager:
                                         tiempo_total_minutos       INT                                                 DEFAULT 0,
                                         ejercicios_completados     INT                                                 DEFAULT 0,
                                         objetivo_diario_ejercicios INT                                                 DEFAULT 5,
-                                        estilo_aprendizaje         ENUM ('Visual', 'Auditivo', 'Kinestésico', 'Mixto') DEFAULT 'Mixto',
+                                        estilo_aprendizaje         TINYINT UNSIGNED NOT NULL                           DEFAULT 4,
                                         preferencias_json          JSON,
                                         estadisticas_json          JSON,
                                         FOREIGN KEY (user_id) REFERENCES usuarios (id) ON DELETE CASCADE,
-                                        INDEX idx_user_id (user_id)
+                                        FOREIGN KEY (estilo_aprendizaje) REFERENCES estilos_aprendizaje (id),
+                                        UNIQUE INDEX unique_user_profile (user_id)
                                     ) ENGINE = InnoDB
                                       CHARSET = utf8mb4
                                       COLLATE = utf8mb4_unicode_ci;
@@ -212,7 +807,7 @@ class DatabaseManager:
                               CREATE TABLE IF NOT EXISTS ejercicios
                               (
                                   id                        INT PRIMARY KEY AUTO_INCREMENT,
-                                  tipo                      ENUM ('Completar_Palabra', 'Encontrar_Error', 'Clasificar_Palabra', 'Comprension', 'Ordenar_Frase') NOT NULL,
+                                  tipo                      TINYINT UNSIGNED                                                                                    NOT NULL,
                                   titulo                    VARCHAR(255)                                                                                        NOT NULL,
                                   instrucciones             TEXT                                                                                                NOT NULL,
                                   contenido_json            JSON                                                                                                NOT NULL,
@@ -225,6 +820,7 @@ class DatabaseManager:
                                   pistas_json               JSON,
                                   activo                    BOOLEAN DEFAULT TRUE,
                                   FOREIGN KEY (categoria_id) REFERENCES categorias (id) ON DELETE SET NULL,
+                                  FOREIGN KEY (tipo) REFERENCES tipos_ejercicio (id),
                                   INDEX idx_tipo (tipo),
                                   INDEX idx_nivel (nivel_dificultad),
                                   INDEX idx_activo (activo)
@@ -249,32 +845,152 @@ class DatabaseManager:
                                              FOREIGN KEY (user_id) REFERENCES usuarios (id) ON DELETE CASCADE,
                                              FOREIGN KEY (ejercicio_id) REFERENCES ejercicios (id) ON DELETE CASCADE,
                                              INDEX idx_user_ejercicio (user_id, ejercicio_id),
+                                             INDEX idx_user_progreso (user_id, completado, ejercicio_id, puntos_obtenidos,
+                                                                      precision_porcentaje, tiempo_segundos),
                                              INDEX idx_fecha (fecha_intento)
                                          ) ENGINE = InnoDB
                                            CHARSET = utf8mb4
                                            COLLATE = utf8mb4_unicode_ci;
                                          """
-            }
-
-            for table_name, sql in tables_sql.items():
-                if self.execute_non_query(sql):
-                    self.logger.info(f"Tabla {table_name} creada/verificada exitosamente")
-                    print(f"✅ Tabla {table_name} creada/verificada")
-                else:
-                    self.logger.error(f"Error creando tabla {table_name}")
-                    print(f"❌ Error creando tabla {table_name}")
-                    return False
-
-            self._insert_initial_data()
+            })
+
+            with self._cursor(commit=True) as cursor:
+                ddl = ";\n".join(sql.strip().rstrip(";") for sql in tables_sql.values())
+                self._execute_script(cursor, ddl)
+
+                self.logger.info("Tablas creadas/verificadas: %s", ", ".join(tables_sql))
+                print(f"✅ {len(tables_sql)} tablas creadas/verificadas")
+
+                self._insert_initial_data(cursor)
+
+            # CREATE TABLE IF NOT EXISTS no toca las columnas ENUM ni los índices de
+            # esquemas previos. Un índice que falta no impide usar el esquema.
+            if not self.migrate_lookup_columns():
+                return False
+            self.migrate_indexes()
             return True
 
         except Exception as e:
-            self.logger.error(f"Error creando esquema de BD: {e}")
+            self.logger.error("Error creando esquema de BD: %s", e)
             print(f"❌ Error creando esquema: {e}")
             return False
 
-    def _insert_initial_data(self) -> None:
-        """Insertar datos iniciales en la base de datos"""
+    def migrate_lookup_columns(self) -> bool:
+        """Convertir a ids de catálogo las columnas ENUM de esquemas previos
+
+        Cada columna pendiente pasa a VARCHAR, su texto se traduce al id con un
+        CASE y después se convierte a TINYINT con su clave foránea. Una columna
+        que quedó en VARCHAR por una migración interrumpida se retoma (el CASE
+        acepta también los ids ya escritos). Sin columnas pendientes solo cuesta
+        una consulta a information_schema.
+        """
+        try:
+            with self._cursor(commit=True) as cursor:
+                cursor.execute(
+                    "SELECT table_name, column_name FROM information_schema.columns "
+                    "WHERE table_schema = DATABASE() AND data_type IN ('enum', 'varchar')"
+                )
+                candidates = {(table.lower(), column.lower()) for table, column in cursor.fetchall()}
+                pending = [spec for spec in LOOKUP_COLUMNS if spec[:2] in candidates]
+                if not pending:
+                    return True
+
+                # Las claves foráneas necesitan los catálogos creados y poblados
+                self._execute_script(cursor, ";\n".join(
+                    LOOKUP_TABLE_DDL.format(tabla=tabla).strip().rstrip(";") for tabla in LOOKUP_TABLES
+                ))
+                self._seed_lookup_tables(cursor)
+
+                for table, column, lookup_table, ids, default in pending:
+                    mapping = dict(ids)
+                    mapping.update({str(lookup_id): lookup_id for lookup_id in set(ids.values())})
+                    cases = " ".join(["WHEN %s THEN %s"] * len(mapping))
+                    params = [item for pair in mapping.items() for item in pair]
+
+                    cursor.execute(f"ALTER TABLE {table} MODIFY {column} VARCHAR(32) NULL DEFAULT NULL")
+                    # Un texto desconocido toma el id por defecto; sin defecto queda NULL
+                    # y el paso a NOT NULL falla en lugar de inventar un valor
+                    cursor.execute(
+                        f"UPDATE {table} SET {column} = CASE LOWER({column}) {cases} ELSE %s END",
+                        params + [default]
+                    )
+                    default_sql = f" DEFAULT {default}" if default is not None else ""
+                    cursor.execute(
+                        f"ALTER TABLE {table} MODIFY {column} TINYINT UNSIGNED NOT NULL{default_sql}, "
+                        f"ADD FOREIGN KEY ({column}) REFERENCES {lookup_table} (id)"
+                    )
+                    self.logger.info("Columna %s.%s migrada a ids de %s", table, column, lookup_table)
+            return True
+
+        except Exception as e:
+            self.logger.error("Error migrando columnas de catálogo: %s", e)
+            return False
+
+    def migrate_indexes(self) -> bool:
+        """Añadir a un esquema ya desplegado los índices que falten
+
+        MySQL no admite CREATE INDEX IF NOT EXISTS, así que se consultan los
+        índices existentes y se crean los que falten en un único envío. Un índice
+        UNIQUE no se crea si la tabla ya tiene filas duplicadas: se registran los
+        valores repetidos para limpiarlos a mano y se devuelve False.
+        """
+        try:
+            with self._cursor(commit=True) as cursor:
+                cursor.execute(
+                    "SELECT DISTINCT table_name, index_name FROM information_schema.statistics "
+                    "WHERE table_schema = DATABASE()"
+                )
+                existing = {(table.lower(), index) for table, index in cursor.fetchall()}
+
+                pending = []
+                blocked = 0
+                for table, index, index_type, columns in MIGRATION_INDEXES:
+                    if (table, index) in existing:
+                        continue
+                    if index_type.startswith("UNIQUE"):
+                        duplicates = self._find_duplicates(cursor, table, columns.strip("()"))
+                        if duplicates:
+                            blocked += 1
+                            self.logger.error(
+                                "No se crea %s.%s: valores duplicados en %s (valor, filas): %s",
+                                table, index, columns, duplicates
+                            )
+                            continue
+                    pending.append(f"ALTER TABLE {table} ADD {index_type} {index} {columns}")
+
+                if pending:
+                    self._execute_script(cursor, ";\n".join(pending))
+
+            self.logger.info("Índices migrados: %d creados, %d bloqueados por duplicados",
+                             len(pending), blocked)
+            return not blocked
+
+        except Exception as e:
+            self.logger.error("Error migrando índices: %s", e)
+            return False
+
+    @staticmethod
+    def _find_duplicates(cursor, table: str, columns: str, limit: int = 20) -> List[tuple]:
+        """Valores de `columns` repetidos en `table`, con su número de filas (como mucho `limit`)"""
+        cursor.execute(
+            f"SELECT {columns}, COUNT(*) FROM {table} "
+            f"GROUP BY {columns} HAVING COUNT(*) > 1 LIMIT {int(limit)}"
+        )
+        return cursor.fetchall()
+
+    @staticmethod
+    def _seed_lookup_tables(cursor) -> None:
+        """Poblar las tablas de catálogo (id = posición del nombre, desde 1)"""
+        for tabla, nombres in LOOKUP_TABLES.items():
+            cursor.executemany(
+                f"INSERT IGNORE INTO {tabla} (id, nombre) VALUES (%s, %s)",
+                list(enumerate(nombres, start=1))
+            )
+
+    def _insert_initial_data(self, cursor) -> None:
+        """Insertar datos iniciales usando el cursor de la creación del esquema"""
+        self._seed_lookup_tables(cursor)
+
         categorias_iniciales = [
             ("Gramática Básica", "Ejercicios de gramática fundamental", "grammar", "#4A90E2", 1, 5),
             ("Vocabulario", "Ampliación de vocabulario", "vocabulary", "#7ED321", 1, 10),
@@ -282,13 +998,16 @@ class DatabaseManager:
             ("Ortografía", "Reglas de ortografía y acentuación", "spelling", "#9013FE", 1, 8)
         ]
 
-        for categoria in categorias_iniciales:
-            query = """
-                    INSERT IGNORE INTO categorias (nombre, descripcion, icono, color_hex, nivel_minimo, nivel_maximo)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                    """
-            if self.execute_non_query(query, categoria):
-                print(f"✅ Categoría '{categoria[0]}' insertada/verificada")
+        query = """
+                INSERT IGNORE INTO categorias (nombre, descripcion, icono, color_hex, nivel_minimo, nivel_maximo)
+                VALUES (%s, %s, %s, %s, %s, %s)
+                """
+        inserted = 0
+        for start in range(0, len(categorias_iniciales), self.SEED_CHUNK_SIZE):
+            cursor.executemany(query, categorias_iniciales[start:start + self.SEED_CHUNK_SIZE])
+            inserted += max(cursor.rowcount, 0)
+
+        print(f"✅ Categorías verificadas: {len(categorias_iniciales)} ({inserted} nuevas)")
 
 
 if __name__ == "__main__":
@@ -296,6 +1015,9 @@ if __name__ == "__main__":
 
     db_manager = DatabaseManager()
 
+    print("🔥 Precalentando pool de conexiones...")
+    db_manager.warmup()
+
     print("📡 Probando conexión...")
     if db_manager.test_connection():
         print("✅ Conexión exitosa")
@@ -3,9 +3,12 @@
 # =============================================================================
 
 import mysql.connector
-from mysql.connector import Error, pooling
+from mysql.connector import Error, PoolError, pooling
+import itertools
 import json
 import logging
+import os
+import re
 from typing import Dict, List, Optional, Tuple, Any, Union
 from dataclasses import dataclass
 from enum import Enum
@@ -14,6 +17,12 @@ from pathlib import Path
 from datetime import datetime, timedelta
 import threading
 import time
+import traceback
+import weakref
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextvars import ContextVar
+from collections import OrderedDict, defaultdict, namedtuple
+from functools import lru_cache
 
 # Agregar el directorio raíz al path para imports
 sys.path.append(str(Path(__file__).parent.parent.parent))
@@ -21,7 +30,9 @@ sys.path.append(str(Path(__file__).parent.parent.parent))
 # Imports de configuración y modelos
 try:
     from config.settings import Settings
-    from core.database.models import Usuario, PerfilUsuario, RolUsuario, NivelUsuario, EstiloAprendizaje
+    from core.database.models import (
+        Usuario, PerfilUsuario, RolUsuario, NivelUsuario, EstiloAprendizaje, lookup_id
+    )
 
     MODELS_AVAILABLE = True
 except ImportError as e:
@@ -39,6 +50,14 @@ except ImportError as e:
             'password': 'alfaia_password'
         }
 
+# orjson es opcional: si no está instalado se usa json de la librería estándar
+try:
+    import orjson
+
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -58,6 +77,22 @@ class ConnectionStatus(Enum):
     RECONNECTING = "reconnecting"
 
 
+class StatementKind(Enum):
+    """Tipo de sentencia: determina si execute_query lee filas"""
+    SELECT = "select"
+    DML = "dml"
+
+
+# Detección del tipo de sentencia para los llamadores que no lo indican
+_SELECT_RE = re.compile(r'\s*(?:SELECT|SHOW)\b', re.IGNORECASE)
+_TABLE_DDL_RE = re.compile(r'\s*(?:CREATE|DROP|RENAME|ALTER)\s+(?:TEMPORARY\s+)?TABLE\b', re.IGNORECASE)
+
+
+def _statement_kind(query: str) -> StatementKind:
+    """Deducir el tipo de sentencia mirando solo su comienzo"""
+    return StatementKind.SELECT if _SELECT_RE.match(query) else StatementKind.DML
+
+
 class TransactionStatus(Enum):
     """Estados de transacciones"""
     PENDING = "pending"
@@ -79,6 +114,21 @@ class DatabaseStats:
     last_backup: Optional[datetime]
 
 
+class _ThreadStats:
+    """Contadores de un solo hilo; get_database_stats los suma al leer"""
+
+    __slots__ = ('total_connections', 'active_connections', 'total_queries',
+                 'successful_queries', 'failed_queries', 'average_query_time')
+
+    def __init__(self):
+        self.total_connections = 0
+        self.active_connections = 0  # préstamos menos devoluciones hechos en este hilo
+        self.total_queries = 0
+        self.successful_queries = 0
+        self.failed_queries = 0
+        self.average_query_time = 0.0
+
+
 @dataclass
 class QueryResult:
     """Resultado de una consulta"""
@@ -88,6 +138,14 @@ class QueryResult:
     execution_time: float
     error_message: Optional[str] = None
 
+    def as_dicts(self) -> List[Dict[str, Any]]:
+        """Filas como diccionarios, para quien necesite el formato anterior"""
+        if not self.data:
+            return []
+        if isinstance(self.data, list):
+            return [row._asdict() for row in self.data]
+        return [self.data._asdict()]
+
 
 @dataclass
 class BackupInfo:
@@ -100,6 +158,127 @@ class BackupInfo:
     error_message: Optional[str] = None
 
 
+def _dumps_json(data: Any) -> str:
+    """
+    Serializar datos para una columna JSON
+
+    Se devuelve str y no bytes: el conector envía bytes como binario y MySQL
+    rechaza JSON con charset binary.
+    """
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(
+            data, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY
+        ).decode('utf-8')
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+# Columnas actualizables; fijan el orden de los parámetros en las plantillas SQL
+_USER_COLS = ('email', 'password_hash', 'nombre', 'apellido', 'fecha_nacimiento',
+              'nivel_inicial', 'rol', 'activo', 'ultima_conexion', 'configuracion_json')
+
+# Valores iniciales de un perfil nuevo (también fija sus columnas actualizables)
+_PROFILE_DEFAULTS = {
+    'nivel_lectura': 1,
+    'nivel_gramatica': 1,
+    'nivel_vocabulario': 1,
+    'puntos_totales': 0,
+    'experiencia_total': 0,
+    'racha_dias_consecutivos': 0,
+    'tiempo_total_minutos': 0,
+    'ejercicios_completados': 0,
+    'objetivo_diario_ejercicios': 5,
+    'estilo_aprendizaje': 4,  # Mixto
+    'preferencias_json': '{}',
+    'estadisticas_json': '{}'
+}
+_PROFILE_COLS = tuple(_PROFILE_DEFAULTS)
+
+# Columnas que guardan el id de su tabla de catálogo; aceptan también el Enum o
+# el texto de los antiguos ENUM ('principiante', 'profesor', 'mixto'...)
+_LOOKUP_COLUMNS = {
+    'nivel_inicial': (NivelUsuario, NivelUsuario.PRINCIPIANTE),
+    'rol': (RolUsuario, RolUsuario.ESTUDIANTE),
+    'estilo_aprendizaje': (EstiloAprendizaje, EstiloAprendizaje.MIXTO),
+} if MODELS_AVAILABLE else {}
+
+
+def _db_value(column: str, value: Any) -> Any:
+    """Valor a escribir en la columna (id de catálogo si lo es)"""
+    spec = _LOOKUP_COLUMNS.get(column)
+    if spec is None:
+        return value
+    return lookup_id(spec[0], value, spec[1])
+
+
+_TABLE_COLS = {
+    'usuarios': _USER_COLS,
+    'perfiles_usuario': _PROFILE_COLS
+}
+
+
+@lru_cache(maxsize=32)
+def _insert_profile_sql(extra_columns: Tuple[str, ...], from_last_insert: bool) -> str:
+    """INSERT de perfiles_usuario: todas las columnas por defecto más las extra indicadas"""
+    columns = _PROFILE_COLS + extra_columns
+    user_placeholder = 'LAST_INSERT_ID()' if from_last_insert else '%s'
+    placeholders = ', '.join(['%s'] * len(columns))
+    return (f"INSERT INTO perfiles_usuario (user_id, {', '.join(columns)}) "
+            f"VALUES ({user_placeholder}, {placeholders})")
+
+
+@lru_cache(maxsize=128)
+def _update_sql(table: str, key_column: str, fields: frozenset) -> Tuple[str, Tuple[str, ...]]:
+    """UPDATE para un conjunto de columnas; se construye una vez por combinación"""
+    columns = tuple(column for column in _TABLE_COLS[table] if column in fields)
+    set_clause = ', '.join(f"{column} = %s" for column in columns)
+    return f"UPDATE {table} SET {set_clause} WHERE {key_column} = %s", columns
+
+
+@lru_cache(maxsize=128)
+def _upsert_profile_sql(fields: frozenset, row_alias: bool) -> Tuple[str, Tuple[str, ...]]:
+    """INSERT ... ON DUPLICATE KEY UPDATE de perfiles_usuario para un conjunto de columnas
+
+    Con row_alias usa el alias de fila (MySQL 8.0.19+), ya que VALUES(col) está
+    obsoleto desde 8.0.20; sin él, VALUES(col) para servidores anteriores y MariaDB.
+    """
+    columns = tuple(column for column in _PROFILE_COLS if column in fields)
+    placeholders = ', '.join(['%s'] * (len(columns) + 1))
+    if row_alias:
+        alias = " AS new"
+        updates = ', '.join(f"{column} = new.{column}" for column in columns)
+    else:
+        alias = ""
+        updates = ', '.join(f"{column} = VALUES({column})" for column in columns)
+    query = (f"INSERT INTO perfiles_usuario (user_id, {', '.join(columns)}) "
+             f"VALUES ({placeholders}){alias} ON DUPLICATE KEY UPDATE {updates}")
+    return query, columns
+
+
+# Índices únicos de perfiles_usuario formados solo por user_id
+_PROFILE_UNIQUE_KEY_SQL = """
+                          SELECT index_name
+                          FROM information_schema.statistics
+                          WHERE table_schema = DATABASE()
+                            AND table_name = 'perfiles_usuario'
+                            AND non_unique = 0
+                          GROUP BY index_name
+                          HAVING COUNT(*) = 1
+                             AND MAX(column_name) = 'user_id' \
+                          """
+
+
+@lru_cache(maxsize=256)
+def _row_class(columns: Tuple[str, ...]):
+    """Clase de fila (namedtuple) para un conjunto de columnas; se reutiliza entre consultas"""
+    return namedtuple('Row', columns, rename=True)
+
+
+def _make_rows(cursor, rows: List[Tuple]) -> List[Tuple]:
+    """Convertir las tuplas del cursor en filas con acceso por nombre (row.email, row[0])"""
+    row_class = _row_class(tuple(cursor.column_names))
+    return [row_class._make(row) for row in rows]
+
+
 # =============================================================================
 # CLASE PRINCIPAL DEL GESTOR DE BASE DE DATOS
 # =============================================================================
@@ -112,19 +291,42 @@ class DatabaseManager:
     _instance = None
     _lock = threading.Lock()
 
+    # Sentencias preparadas que se conservan por conexión física (LRU)
+    STATEMENT_CACHE_SIZE = 128
+
+    # Pool: 2 conexiones por núcleo + 1, sin superar el máximo del conector (32)
+    DEFAULT_POOL_SIZE = min(32, (os.cpu_count() or 2) * 2 + 1)
+    CONNECTION_TIMEOUT = 5  # segundos para establecer la conexión
+    MAX_LIFETIME = 1800  # segundos antes de renovar una conexión física
+    # Segundos de préstamo antes de avisar; desactivado por defecto porque guarda
+    # la pila de cada checkout (se activa con initialize_connection_pool)
+    LEAK_DETECTION_THRESHOLD = 0
+
+    # Réplicas: retraso máximo tolerado y cada cuánto se vuelve a medir
+    REPLICA_MAX_LAG = 5
+    REPLICA_LAG_CHECK_INTERVAL = 10
+
+    # Segundos que se reutiliza la lista de tablas de SHOW TABLES
+    TABLE_NAMES_TTL = 300.0
+
     def __new__(cls):
-        """Implementar patrón Singleton thread-safe"""
-        if cls._instance is None:
+        """Implementar patrón Singleton thread-safe (sin lock una vez creado)"""
+        instance = cls._instance
+        if instance is None:
             with cls._lock:
-                if cls._instance is None:
-                    cls._instance = super(DatabaseManager, cls).__new__(cls)
-        return cls._instance
+                instance = cls._instance
+                if instance is None:
+                    instance = super(DatabaseManager, cls).__new__(cls)
+                    instance._init()
+                    cls._instance = instance
+        return instance
 
     def __init__(self):
-        """Inicializar gestor de base de datos"""
-        if hasattr(self, 'initialized'):
-            return
+        """La inicialización se hace una sola vez en __new__ (ver _init)"""
+        pass
 
+    def _init(self):
+        """Inicializar gestor de base de datos"""
         self.logger = logger
         self.settings = Settings()
 
@@ -150,6 +352,17 @@ class DatabaseManager:
         self.connection_pool = None
         self.status = ConnectionStatus.DISCONNECTED
 
+        # Réplicas de lectura ({'host', 'port'}); sin réplicas todo va al primario
+        try:
+            from config.database_config import DatabaseConfig
+            self.replica_hosts = list(DatabaseConfig.REPLICAS)
+        except (ImportError, AttributeError):
+            self.replica_hosts = []
+        self.read_pools = []
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._read_counter = itertools.count()
+        self._replica_checked: Dict[int, Tuple[float, bool]] = {}
+
         # Estadísticas
         self.stats = DatabaseStats(
             total_connections=0,
@@ -162,33 +375,82 @@ class DatabaseManager:
             last_backup=None
         )
 
+        # Contadores por hilo: cada hilo escribe solo en los suyos, sin locks
+        self._tls = threading.local()
+        self._thread_stats: List[_ThreadStats] = []
+        self._thread_stats_lock = threading.Lock()
+
         # Control de transacciones
-        self.active_transactions = {}
-        self.transaction_lock = threading.Lock()
+        # Transacción en curso del contexto actual y vista por hilo para diagnóstico.
+        # Cada hilo solo escribe su propia clave, así que no hace falta lock.
+        self._txn_ctx: ContextVar[Optional[Dict[str, Any]]] = ContextVar('alfaia_txn', default=None)
+        self._thread_transactions: Dict[int, Dict[str, Any]] = {}
+
+        # Caché de cursores preparados: {conexión física: (connection_id, OrderedDict[sql, cursor])}.
+        # Tras una reconexión el objeto es el mismo pero la sesión (y su
+        # connection_id) no, y las sentencias preparadas ya no existen.
+        self._statement_cache = weakref.WeakKeyDictionary()
+        self._statement_cache_lock = threading.Lock()
+
+        # Caché de get_user_statistics: {user_id: (versión, resultado)}
+        # save_exercise_result sube la versión del usuario y así invalida su entrada
+        self._user_version = defaultdict(int)
+        self._stats_cache: Dict[int, Tuple[int, QueryResult]] = {}
+        self._stats_cache_lock = threading.Lock()
+
+        # Lista de tablas memorizada; se invalida con DDL o invalidate_schema()
+        self._tables_cache: Optional[List[str]] = None
+        self._tables_cache_expiry = 0.0
+
+        # Sintaxis del upsert de perfiles (True = alias de fila); None hasta
+        # comprobar que existe la clave única en perfiles_usuario.user_id
+        self._profile_row_alias: Optional[bool] = None
+
+        # Ciclo de vida de las conexiones: {conexión física: instante de apertura}
+        self.max_lifetime = self.MAX_LIFETIME
+        self._connection_born = weakref.WeakKeyDictionary()
+
+        # Detección de fugas: {id(conexión prestada): (instante, pila de la llamada)}
+        self.leak_detection_threshold = self.LEAK_DETECTION_THRESHOLD
+        self._checkouts = {}
+        self._leak_timer = None
 
         # Inicialización
         self.start_time = datetime.now()
+        self._start_monotonic = time.monotonic()
         self.initialized = True
 
         print("✅ DatabaseManager inicializado")
 
-    def initialize_connection_pool(self, pool_size: int = 10) -> bool:
+    def initialize_connection_pool(self, pool_size: Optional[int] = None,
+                                   connection_timeout: Optional[int] = None,
+                                   max_lifetime: Optional[float] = None,
+                                   leak_detection_threshold: Optional[float] = None) -> bool:
         """
         Inicializar pool de conexiones
 
         Args:
-            pool_size: Tamaño del pool de conexiones
+            pool_size: Tamaño del pool (por defecto DEFAULT_POOL_SIZE, según núcleos)
+            connection_timeout: Segundos para establecer cada conexión
+            max_lifetime: Segundos tras los que una conexión física se renueva
+            leak_detection_threshold: Segundos de préstamo antes de registrar una fuga
+                (0 la desactiva; es el valor por defecto)
 
         Returns:
             bool: True si se inicializó correctamente
         """
-        try:
-            print(f"🔗 Inicializando pool de conexiones (tamaño: {pool_size})...")
+        pool_size = pool_size or self.DEFAULT_POOL_SIZE
+        if max_lifetime is not None:
+            self.max_lifetime = max_lifetime
+        if leak_detection_threshold is not None:
+            self.leak_detection_threshold = leak_detection_threshold
 
+        try:
             pool_config = {
                 'pool_name': 'alfaia_pool',
                 'pool_size': pool_size,
-                'pool_reset_session': True,
+                # Sin reset la sesión conserva las sentencias preparadas entre checkouts
+                'pool_reset_session': False,
                 'host': self.db_config['host'],
                 'port': self.db_config['port'],
                 'database': self.db_config['database'],
@@ -197,26 +459,90 @@ class DatabaseManager:
                 'charset': 'utf8mb4',
                 'collation': 'utf8mb4_unicode_ci',
                 'autocommit': False,
-                'time_zone': '+00:00'
+                'time_zone': '+00:00',
+                'connection_timeout': connection_timeout or self.CONNECTION_TIMEOUT
             }
 
             self.connection_pool = pooling.MySQLConnectionPool(**pool_config)
             self.status = ConnectionStatus.CONNECTED
+            self._initialize_read_pools(pool_config)
+            self._schedule_leak_check()
+
+            # Un hilo por conexión: lo enviado con async_execute espera en la cola
+            # del executor en lugar de agotar el pool (que falla sin esperar)
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+            self._executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix='alfa-db')
 
-            print("✅ Pool de conexiones inicializado exitosamente")
+            self.logger.info("Pool de conexiones inicializado (tamaño: %d, réplicas: %d)",
+                             pool_size, len(self.read_pools))
             return True
 
         except Error as e:
-            error_msg = f"Error inicializando pool de conexiones: {e}"
-            self.logger.error(error_msg)
-            print(f"❌ {error_msg}")
+            self.logger.error("Error inicializando pool de conexiones: %s", e)
             self.status = ConnectionStatus.ERROR
             return False
 
-    def get_connection(self) -> Optional[mysql.connector.MySQLConnection]:
+    def _initialize_read_pools(self, pool_config: Dict[str, Any]) -> None:
+        """Crear un pool por réplica; una réplica caída no impide arrancar"""
+        self.read_pools = []
+        for index, replica in enumerate(self.replica_hosts):
+            try:
+                self.read_pools.append(pooling.MySQLConnectionPool(
+                    **{**pool_config, **replica, 'pool_name': f'alfaia_ro_{index}'}
+                ))
+            except Error as e:
+                self.logger.warning("Réplica %s no disponible: %s", replica['host'], e)
+
+    def _read_pool(self):
+        """Elegir réplica por turnos; None si no hay o va retrasada (se usa el primario)"""
+        if not self.read_pools:
+            return None
+        index = next(self._read_counter) % len(self.read_pools)
+        return self.read_pools[index] if self._replica_in_sync(index) else None
+
+    def _replica_in_sync(self, index: int) -> bool:
+        """Comprobar (como mucho cada REPLICA_LAG_CHECK_INTERVAL) el retraso de una réplica"""
+        now = time.monotonic()
+        checked_at, in_sync = self._replica_checked.get(index, (None, False))
+        if checked_at is not None and now - checked_at < self.REPLICA_LAG_CHECK_INTERVAL:
+            return in_sync
+
+        # Se anota antes de medir para que otros hilos no repitan la comprobación
+        self._replica_checked[index] = (now, in_sync)
+        in_sync = False
+        connection = None
+        try:
+            connection = self.read_pools[index].get_connection()
+            cursor = connection.cursor(dictionary=True, buffered=True)
+            try:
+                cursor.execute("SHOW REPLICA STATUS")
+            except Error:
+                cursor.execute("SHOW SLAVE STATUS")  # MySQL < 8.0.22
+            status = cursor.fetchone()
+            cursor.close()
+            if status:
+                lag = status.get('Seconds_Behind_Source', status.get('Seconds_Behind_Master'))
+                in_sync = lag is not None and lag <= self.REPLICA_MAX_LAG
+        except Error as e:
+            self.logger.debug("No se pudo medir el retraso de la réplica %d: %s", index, e)
+        finally:
+            if connection is not None:
+                connection.close()
+
+        self._replica_checked[index] = (now, in_sync)
+        return in_sync
+
+    def get_connection(self, readonly: bool = False) -> Optional[mysql.connector.MySQLConnection]:
         """
         Obtener conexión del pool
 
+        Si la réplica elegida está agotada o no responde, la lectura se sirve
+        desde el pool primario.
+
+        Args:
+            readonly: Si la conexión puede venir de una réplica de lectura
+
         Returns:
             MySQLConnection o None si hay error
         """
@@ -225,29 +551,107 @@ class DatabaseManager:
                 if not self.initialize_connection_pool():
                     return None
 
-            connection = self.connection_pool.get_connection()
-            self.stats.total_connections += 1
-            self.stats.active_connections += 1
+            connection = self._replica_connection() if readonly else None
+            if connection is None:
+                connection = self.connection_pool.get_connection()
+            local_stats = self._local_stats()
+            local_stats.total_connections += 1
+            local_stats.active_connections += 1
+
+            now = time.monotonic()
+            self._connection_born.setdefault(getattr(connection, '_cnx', connection), now)
+            if self.leak_detection_threshold:
+                self._checkouts[id(connection)] = (now, traceback.extract_stack(limit=8)[:-1])
 
             return connection
 
         except Error as e:
-            self.logger.error(f"Error obteniendo conexión: {e}")
+            self.logger.error("Error obteniendo conexión: %s", e)
             return None
 
+    def _replica_connection(self):
+        """Conexión de una réplica en sincronía, o None para usar el primario"""
+        pool = self._read_pool()
+        if pool is None:
+            return None
+        try:
+            return pool.get_connection()
+        except PoolError as e:
+            self.logger.debug("Réplica agotada, se usa el primario: %s", e)
+        except Error as e:
+            # Réplica caída: se descarta hasta la próxima comprobación de retraso
+            self.logger.warning("Réplica no disponible, se usa el primario: %s", e)
+            self._replica_checked[self.read_pools.index(pool)] = (time.monotonic(), False)
+        return None
+
     def release_connection(self, connection: mysql.connector.MySQLConnection):
         """
         Liberar conexión de vuelta al pool
 
+        No se hace ping (is_connected() cuesta un viaje de red): el pool valida la
+        conexión en el siguiente préstamo. Las que superan max_lifetime se
+        desconectan antes de devolverse y el pool las reabre. Una lectura sin
+        commit deja abierta su transacción implícita; como el pool no resetea la
+        sesión, se cierra aquí para que el siguiente préstamo no lea un snapshot
+        antiguo.
+
         Args:
             connection: Conexión a liberar
         """
+        if connection is None:
+            return
+
+        self._checkouts.pop(id(connection), None)
         try:
-            if connection and connection.is_connected():
-                connection.close()
-                self.stats.active_connections = max(0, self.stats.active_connections - 1)
+            raw_connection = getattr(connection, '_cnx', connection)
+            born = self._connection_born.get(raw_connection)
+            expired = born is not None and time.monotonic() - born > self.max_lifetime
+            if expired:
+                self._retire_connection(raw_connection)
+            elif connection.in_transaction:
+                connection.rollback()
+
+            connection.close()
         except Error as e:
-            self.logger.error(f"Error liberando conexión: {e}")
+            self.logger.error("Error liberando conexión: %s", e)
+        finally:
+            self._local_stats().active_connections -= 1
+
+    def _retire_connection(self, raw_connection) -> None:
+        """Desconectar una conexión física caducada y olvidar sus sentencias preparadas"""
+        self._connection_born.pop(raw_connection, None)
+        with self._statement_cache_lock:
+            entry = self._statement_cache.pop(raw_connection, None)
+        cache = self._live_statements(raw_connection, entry)
+        for cursor in cache.values():
+            try:
+                cursor.close()
+            except Error:
+                pass
+        try:
+            raw_connection.disconnect()
+        except Error:
+            pass
+
+    def _schedule_leak_check(self) -> None:
+        """Programar la siguiente revisión de conexiones prestadas demasiado tiempo"""
+        if not self.leak_detection_threshold or self.connection_pool is None:
+            return
+        self._leak_timer = threading.Timer(self.leak_detection_threshold / 2, self._check_leaks)
+        self._leak_timer.daemon = True
+        self._leak_timer.start()
+
+    def _check_leaks(self) -> None:
+        """Registrar la pila de cada préstamo que supera leak_detection_threshold"""
+        now = time.monotonic()
+        for checkout_time, stack in list(self._checkouts.values()):
+            held = now - checkout_time
+            if held > self.leak_detection_threshold:
+                self.logger.warning(
+                    "Posible fuga: conexión prestada hace %.0fs desde:\n%s",
+                    held, ''.join(traceback.format_list(stack))
+                )
+        self._schedule_leak_check()
 
     def test_connection(self) -> bool:
         """
@@ -257,8 +661,6 @@ class DatabaseManager:
             bool: True si la conexión es exitosa
         """
         try:
-            print("🔍 Probando conexión a la base de datos...")
-
             connection = self.get_connection()
             if connection is None:
                 return False
@@ -271,27 +673,79 @@ class DatabaseManager:
             self.release_connection(connection)
 
             if result and result[0] == 1:
-                print("✅ Conexión a la base de datos exitosa")
                 return True
-            else:
-                print("❌ Respuesta inesperada de la base de datos")
-                return False
+            self.logger.warning("Respuesta inesperada de la base de datos: %r", result)
+            return False
 
         except Error as e:
-            error_msg = f"Error probando conexión: {e}"
-            self.logger.error(error_msg)
-            print(f"❌ {error_msg}")
+            self.logger.error("Error probando conexión: %s", e)
             return False
 
+    def _get_statement_cursor(self, connection, query: str):
+        """Obtener el cursor preparado de la query para esta conexión física (LRU)"""
+        raw_connection = getattr(connection, '_cnx', connection)
+        connection_id = raw_connection.connection_id
+        with self._statement_cache_lock:
+            entry = self._statement_cache.get(raw_connection)
+            if entry is None or entry[0] != connection_id:
+                # Sesión nueva: los cursores anteriores se descartan sin cerrarlos
+                entry = (connection_id, OrderedDict())
+                self._statement_cache[raw_connection] = entry
+        cache = entry[1]
+
+        cursor = cache.get(query)
+        if cursor is not None:
+            cache.move_to_end(query)
+            return cursor
+
+        cursor = connection.cursor(prepared=True)
+        cache[query] = cursor
+        if len(cache) > self.STATEMENT_CACHE_SIZE:
+            _, evicted = cache.popitem(last=False)
+            evicted.close()
+        return cursor
+
+    @staticmethod
+    def _live_statements(raw_connection, entry) -> Dict[str, Any]:
+        """Cursores de la entrada si siguen siendo de la sesión actual; si no, ninguno
+
+        Cerrar un cursor de una sesión anterior enviaría COM_STMT_CLOSE con un
+        id que en la sesión nueva puede ser de otra sentencia.
+        """
+        if entry is None or entry[0] != raw_connection.connection_id:
+            return {}
+        return entry[1]
+
+    def _discard_statement(self, connection, query: str) -> None:
+        """Descartar el cursor preparado de una query tras un error"""
+        raw_connection = getattr(connection, '_cnx', connection)
+        with self._statement_cache_lock:
+            entry = self._statement_cache.get(raw_connection)
+        cursor = self._live_statements(raw_connection, entry).pop(query, None)
+        if cursor is not None:
+            try:
+                cursor.close()
+            except Error:
+                pass
+
     def execute_query(self, query: str, params: Optional[Tuple] = None,
-                      fetch_results: bool = True) -> QueryResult:
+                      fetch_results: bool = True,
+                      kind: Optional[StatementKind] = None,
+                      prepared: bool = True,
+                      readonly: bool = False) -> QueryResult:
         """
         Ejecutar consulta SQL
 
+        Las consultas con parámetros se ejecutan como sentencias preparadas que se
+        reutilizan en la misma conexión física, así MySQL no vuelve a analizarlas.
+
         Args:
             query: Consulta SQL
             params: Parámetros de la consulta
             fetch_results: Si obtener resultados
+            kind: Tipo de sentencia; si no se indica se deduce del texto
+            prepared: False para SQL generado dinámicamente (no se cachea)
+            readonly: True para lecturas que pueden servirse desde una réplica
 
         Returns:
             QueryResult: Resultado de la consulta
@@ -299,37 +753,47 @@ class DatabaseManager:
         start_time = time.time()
         connection = None
         cursor = None
+        cached = prepared and bool(params)
 
         try:
-            self.stats.total_queries += 1
+            local_stats = self._local_stats()
+            local_stats.total_queries += 1
 
-            connection = self.get_connection()
+            connection = self.get_connection(readonly=readonly)
             if connection is None:
                 raise Exception("No se pudo obtener conexión a la base de datos")
 
-            cursor = connection.cursor(dictionary=True)
+            if cached:
+                cursor = self._get_statement_cursor(connection, query)
+            else:
+                cursor = connection.cursor()
 
             if params:
                 cursor.execute(query, params)
             else:
                 cursor.execute(query)
 
-            # Obtener resultados si es necesario
+            # Obtener resultados si es necesario (filas namedtuple, no dict)
             data = None
             if fetch_results:
-                if query.strip().upper().startswith('SELECT'):
-                    data = cursor.fetchall()
+                if kind is None:
+                    kind = _statement_kind(query)
+                if kind is StatementKind.SELECT:
+                    data = _make_rows(cursor, cursor.fetchall())
                 else:
-                    data = cursor.fetchone()
+                    row = cursor.fetchone()
+                    data = _make_rows(cursor, [row])[0] if row is not None else None
 
             affected_rows = cursor.rowcount
             connection.commit()
+            if not cached and _TABLE_DDL_RE.match(query):
+                self.invalidate_schema()
 
             execution_time = time.time() - start_time
 
             # Actualizar estadísticas
-            self.stats.successful_queries += 1
-            self._update_average_query_time(execution_time)
+            local_stats.successful_queries += 1
+            self._update_average_query_time(local_stats, execution_time)
 
             return QueryResult(
                 success=True,
@@ -341,12 +805,15 @@ class DatabaseManager:
         except Error as e:
             if connection:
                 connection.rollback()
+                if cached:
+                    self._discard_statement(connection, query)
+                    cursor = None
 
             execution_time = time.time() - start_time
             error_msg = f"Error ejecutando consulta: {e}"
 
             self.logger.error(error_msg)
-            self.stats.failed_queries += 1
+            self._local_stats().failed_queries += 1
 
             return QueryResult(
                 success=False,
@@ -357,11 +824,26 @@ class DatabaseManager:
             )
 
         finally:
-            if cursor:
+            if cursor and not cached:
                 cursor.close()
             if connection:
                 self.release_connection(connection)
 
+    def async_execute(self, query: str, params: Optional[Tuple] = None,
+                      **kwargs) -> 'Future[QueryResult]':
+        """
+        Encolar execute_query en el executor de la base de datos
+
+        Permite lanzar consultas independientes a la vez y esperarlas con límite:
+        ``[f.result(timeout=5) for f in futures]``. Las que aún no han empezado
+        pueden cancelarse con ``future.cancel()``.
+        """
+        if self._executor is None and not self.initialize_connection_pool():
+            future = Future()
+            future.set_result(QueryResult(False, None, 0, 0.0, "Pool de conexiones no disponible"))
+            return future
+        return self._executor.submit(self.execute_query, query, params, **kwargs)
+
     def execute_transaction(self, queries: List[Tuple[str, Optional[Tuple]]]) -> QueryResult:
         """
         Ejecutar múltiples consultas en una transacción
@@ -375,32 +857,36 @@ class DatabaseManager:
         start_time = time.time()
         connection = None
         cursor = None
-        transaction_id = f"txn_{int(time.time() * 1000)}"
+        transaction_id = f"txn_{time.time_ns() // 1_000_000}"
+        transaction = None
+        txn_token = None
+        debug = self.logger.isEnabledFor(logging.DEBUG)
 
         try:
-            print(f"🔄 Iniciando transacción {transaction_id}...")
-
             connection = self.get_connection()
             if connection is None:
                 raise Exception("No se pudo obtener conexión para transacción")
 
-            cursor = connection.cursor(dictionary=True)
+            cursor = connection.cursor()
             connection.start_transaction()
 
             # Registrar transacción activa
-            with self.transaction_lock:
-                self.active_transactions[transaction_id] = {
-                    'status': TransactionStatus.PENDING,
-                    'start_time': datetime.now(),
-                    'queries_count': len(queries)
-                }
+            transaction = {
+                'id': transaction_id,
+                'status': TransactionStatus.PENDING,
+                'start_time': time.monotonic(),
+                'queries_count': len(queries)
+            }
+            txn_token = self._txn_ctx.set(transaction)
+            self._thread_transactions[threading.get_ident()] = transaction
 
             total_affected_rows = 0
             results = []
 
             # Ejecutar cada consulta
             for i, (query, params) in enumerate(queries):
-                print(f"📝 Ejecutando consulta {i + 1}/{len(queries)}...")
+                if debug:
+                    self.logger.debug("%s: consulta %d/%d", transaction_id, i + 1, len(queries))
 
                 if params:
                     cursor.execute(query, params)
@@ -410,18 +896,18 @@ class DatabaseManager:
                 total_affected_rows += cursor.rowcount
 
                 # Obtener resultados si es SELECT
-                if query.strip().upper().startswith('SELECT'):
-                    results.extend(cursor.fetchall())
+                if _statement_kind(query) is StatementKind.SELECT:
+                    results.extend(_make_rows(cursor, cursor.fetchall()))
 
             # Confirmar transacción
             connection.commit()
             execution_time = time.time() - start_time
 
             # Actualizar estado de transacción
-            with self.transaction_lock:
-                self.active_transactions[transaction_id]['status'] = TransactionStatus.COMMITTED
+            transaction['status'] = TransactionStatus.COMMITTED
 
-            print(f"✅ Transacción {transaction_id} completada exitosamente")
+            if debug:
+                self.logger.debug("%s completada", transaction_id)
 
             return QueryResult(
                 success=True,
@@ -438,12 +924,10 @@ class DatabaseManager:
             error_msg = f"Error en transacción: {e}"
 
             # Actualizar estado de transacción
-            with self.transaction_lock:
-                if transaction_id in self.active_transactions:
-                    self.active_transactions[transaction_id]['status'] = TransactionStatus.ROLLED_BACK
+            if transaction is not None:
+                transaction['status'] = TransactionStatus.ROLLED_BACK
 
-            self.logger.error(error_msg)
-            print(f"❌ Transacción {transaction_id} falló: {error_msg}")
+            self.logger.error("Transacción %s falló: %s", transaction_id, e)
 
             return QueryResult(
                 success=False,
@@ -460,59 +944,87 @@ class DatabaseManager:
                 self.release_connection(connection)
 
             # Limpiar transacción activa
-            with self.transaction_lock:
-                if transaction_id in self.active_transactions:
-                    del self.active_transactions[transaction_id]
+            if txn_token is not None:
+                self._txn_ctx.reset(txn_token)
+                self._thread_transactions.pop(threading.get_ident(), None)
 
     # =============================================================================
     # OPERACIONES CRUD PARA USUARIOS
     # =============================================================================
 
-    def create_user(self, email: str, password_hash: str, nombre: str,
-                    apellido: str, fecha_nacimiento: str,
-                    nivel_inicial: str = "principiante",
-                    rol: str = "estudiante") -> QueryResult:
-        """Crear nuevo usuario"""
+    def _user_insert(self, email: str, password_hash: str, nombre: str,
+                     apellido: str, fecha_nacimiento: str,
+                     nivel_inicial: str, rol: str) -> Tuple[str, Tuple]:
+        """Construir el INSERT de usuarios con sus parámetros"""
         query = """
                 INSERT INTO usuarios (email, password_hash, nombre, apellido, fecha_nacimiento,
-                                      nivel_inicial, rol, activo, fecha_registro)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s) \
+                                      nivel_inicial, rol, activo)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s) \
                 """
 
+        # fecha_registro la pone el servidor (DEFAULT CURRENT_TIMESTAMP)
         params = (
             email, password_hash, nombre, apellido, fecha_nacimiento,
-            nivel_inicial, rol, True, datetime.now()
+            _db_value('nivel_inicial', nivel_inicial), _db_value('rol', rol), True
         )
+        return query, params
 
+    def create_user(self, email: str, password_hash: str, nombre: str,
+                    apellido: str, fecha_nacimiento: str,
+                    nivel_inicial: str = "principiante",
+                    rol: str = "estudiante") -> QueryResult:
+        """Crear nuevo usuario (sin perfil; para altas usar create_user_with_profile)"""
+        query, params = self._user_insert(email, password_hash, nombre, apellido,
+                                          fecha_nacimiento, nivel_inicial, rol)
         return self.execute_query(query, params, fetch_results=False)
 
+    def create_user_with_profile(self, email: str, password_hash: str, nombre: str,
+                                 apellido: str, fecha_nacimiento: str,
+                                 nivel_inicial: str = "principiante",
+                                 rol: str = "estudiante",
+                                 **profile_data) -> QueryResult:
+        """
+        Crear usuario y perfil en una única transacción
+
+        Es la vía recomendada para registrar usuarios: usa una sola conexión y un
+        solo commit, y el perfil toma el id del usuario con LAST_INSERT_ID() sin
+        consultarlo antes.
+        """
+        queries = [
+            self._user_insert(email, password_hash, nombre, apellido,
+                              fecha_nacimiento, nivel_inicial, rol),
+            self._profile_insert(None, profile_data)
+        ]
+        return self.execute_transaction(queries)
+
     def get_user_by_email(self, email: str) -> QueryResult:
         """Obtener usuario por email"""
         query = "SELECT * FROM usuarios WHERE email = %s AND activo = TRUE"
-        return self.execute_query(query, (email,))
+        return self.execute_query(query, (email,), kind=StatementKind.SELECT, readonly=True)
 
     def get_user_by_id(self, user_id: int) -> QueryResult:
         """Obtener usuario por ID"""
         query = "SELECT * FROM usuarios WHERE id = %s AND activo = TRUE"
-        return self.execute_query(query, (user_id,))
+        return self.execute_query(query, (user_id,), kind=StatementKind.SELECT, readonly=True)
 
-    def update_user(self, user_id: int, updates: Dict[str, Any]) -> QueryResult:
-        """Actualizar datos de usuario"""
+    def _update_row(self, table: str, key_column: str, key: int,
+                    updates: Dict[str, Any]) -> QueryResult:
+        """Actualizar las columnas indicadas con una plantilla UPDATE cacheada"""
         if not updates:
             return QueryResult(False, None, 0, 0.0, "No hay datos para actualizar")
 
-        # Construir consulta dinámicamente
-        set_clauses = []
-        params = []
-
-        for field, value in updates.items():
-            set_clauses.append(f"{field} = %s")
-            params.append(value)
+        fields = frozenset(updates)
+        invalid = fields.difference(_TABLE_COLS[table])
+        if invalid:
+            return QueryResult(False, None, 0, 0.0, f"Campos no válidos: {', '.join(sorted(invalid))}")
 
-        params.append(user_id)
+        query, columns = _update_sql(table, key_column, fields)
+        params = tuple(_db_value(column, updates[column]) for column in columns) + (key,)
+        return self.execute_query(query, params, fetch_results=False)
 
-        query = f"UPDATE usuarios SET {', '.join(set_clauses)} WHERE id = %s"
-        return self.execute_query(query, tuple(params), fetch_results=False)
+    def update_user(self, user_id: int, updates: Dict[str, Any]) -> QueryResult:
+        """Actualizar datos de usuario"""
+        return self._update_row('usuarios', 'id', user_id, updates)
 
     def delete_user(self, user_id: int, soft_delete: bool = True) -> QueryResult:
         """Eliminar usuario (soft delete por defecto)"""
@@ -527,70 +1039,110 @@ class DatabaseManager:
     # OPERACIONES CRUD PARA PERFILES DE USUARIO
     # =============================================================================
 
-    def create_user_profile(self, user_id: int, **profile_data) -> QueryResult:
-        """Crear perfil de usuario"""
-        default_profile = {
-            'user_id': user_id,
-            'nivel_lectura': 1,
-            'nivel_gramatica': 1,
-            'nivel_vocabulario': 1,
-            'puntos_totales': 0,
-            'experiencia_total': 0,
-            'racha_dias_consecutivos': 0,
-            'tiempo_total_minutos': 0,
-            'ejercicios_completados': 0,
-            'objetivo_diario_ejercicios': 5,
-            'estilo_aprendizaje': 'mixto',
-            'preferencias_json': '{}',
-            'estadisticas_json': '{}'
-        }
-
-        # Actualizar con datos proporcionados
-        default_profile.update(profile_data)
+    def _profile_insert(self, user_id: Optional[int],
+                        profile_data: Dict[str, Any]) -> Tuple[str, Tuple]:
+        """
+        Construir el INSERT de perfiles_usuario
 
-        fields = ', '.join(default_profile.keys())
-        placeholders = ', '.join(['%s'] * len(default_profile))
-        values = tuple(default_profile.values())
+        Con user_id None el id se toma de LAST_INSERT_ID() (misma transacción).
+        """
+        extra_columns = tuple(sorted(
+            column for column in profile_data
+            if column != 'user_id' and column not in _PROFILE_DEFAULTS
+        ))
+        query = _insert_profile_sql(extra_columns, user_id is None)
+
+        values = tuple(_db_value(column, profile_data.get(column, default))
+                       for column, default in _PROFILE_DEFAULTS.items())
+        values += tuple(_db_value(column, profile_data[column]) for column in extra_columns)
+        if user_id is not None:
+            values = (user_id,) + values
+        return query, values
 
-        query = f"INSERT INTO perfiles_usuario ({fields}) VALUES ({placeholders})"
+    def create_user_profile(self, user_id: int, **profile_data) -> QueryResult:
+        """Crear perfil de usuario"""
+        query, values = self._profile_insert(user_id, profile_data)
         return self.execute_query(query, values, fetch_results=False)
 
     def get_user_profile(self, user_id: int) -> QueryResult:
         """Obtener perfil de usuario"""
         query = "SELECT * FROM perfiles_usuario WHERE user_id = %s"
-        return self.execute_query(query, (user_id,))
+        return self.execute_query(query, (user_id,), kind=StatementKind.SELECT, readonly=True)
 
     def update_user_profile(self, user_id: int, updates: Dict[str, Any]) -> QueryResult:
         """Actualizar perfil de usuario"""
-        if not updates:
+        return self._update_row('perfiles_usuario', 'user_id', user_id, updates)
+
+    def upsert_user_profile(self, user_id: int, **fields) -> QueryResult:
+        """
+        Crear o actualizar el perfil en una sola sentencia
+
+        Evita consultar antes si el perfil existe. Requiere la clave única
+        de perfiles_usuario.user_id: sin ella cada llamada insertaría otro
+        perfil, así que se rechaza hasta que migrate_indexes la cree.
+        """
+        if not fields:
             return QueryResult(False, None, 0, 0.0, "No hay datos para actualizar")
 
-        set_clauses = []
-        params = []
+        field_names = frozenset(fields)
+        invalid = field_names.difference(_PROFILE_COLS)
+        if invalid:
+            return QueryResult(False, None, 0, 0.0, f"Campos no válidos: {', '.join(sorted(invalid))}")
 
-        for field, value in updates.items():
-            set_clauses.append(f"{field} = %s")
-            params.append(value)
+        row_alias = self._profile_upsert_syntax()
+        if row_alias is None:
+            error_msg = "perfiles_usuario no tiene clave única en user_id (ejecute migrate_indexes)"
+            self.logger.error(error_msg)
+            return QueryResult(False, None, 0, 0.0, error_msg)
+
+        query, columns = _upsert_profile_sql(field_names, row_alias)
+        params = (user_id,) + tuple(_db_value(column, fields[column]) for column in columns)
+        return self.execute_query(query, params, fetch_results=False)
 
-        params.append(user_id)
+    def _profile_upsert_syntax(self) -> Optional[bool]:
+        """
+        Comprobar si se puede usar el upsert de perfiles y con qué sintaxis
+
+        Returns:
+            None si falta la clave única; True si el servidor admite el alias de
+            fila (MySQL 8.0.19+), False si hay que usar VALUES(col)
+        """
+        if self._profile_row_alias is not None:
+            return self._profile_row_alias
 
-        query = f"UPDATE perfiles_usuario SET {', '.join(set_clauses)} WHERE user_id = %s"
-        return self.execute_query(query, tuple(params), fetch_results=False)
+        # Solo se memoriza el resultado positivo: la clave puede crearse después
+        result = self.execute_query(_PROFILE_UNIQUE_KEY_SQL, kind=StatementKind.SELECT)
+        if not result.success or not result.data:
+            return None
+
+        connection = self.get_connection()
+        if connection is None:
+            return None
+        try:
+            version = tuple(connection.get_server_version() or ())
+            mariadb = 'mariadb' in (connection.get_server_info() or '').lower()
+        finally:
+            self.release_connection(connection)
+
+        self._profile_row_alias = not mariadb and version >= (8, 0, 19)
+        return self._profile_row_alias
 
     # =============================================================================
     # OPERACIONES DE EJERCICIOS Y RESULTADOS
     # =============================================================================
 
-    def save_exercise_result(self, user_id: int, exercise_data: Dict[str, Any]) -> QueryResult:
-        """Guardar resultado de ejercicio"""
-        query = """
+    # fecha_completado la pone el servidor (DEFAULT CURRENT_TIMESTAMP(6))
+    INSERT_EXERCISE_SQL = """
                 INSERT INTO resultados_ejercicios
                 (user_id, tipo_ejercicio, dificultad, puntuacion, tiempo_empleado,
-                 respuestas_correctas, total_preguntas, fecha_completado, datos_json)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s) \
+                 respuestas_correctas, total_preguntas, datos_json)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s) \
                 """
 
-        params = (
+    @staticmethod
+    def _exercise_params(user_id: int, exercise_data: Dict[str, Any]) -> Tuple:
+        """Parámetros de INSERT_EXERCISE_SQL para un resultado"""
+        return (
             user_id,
             exercise_data.get('tipo_ejercicio', 'general'),
             exercise_data.get('dificultad', 'intermedio'),
@@ -598,11 +1150,67 @@ class DatabaseManager:
             exercise_data.get('tiempo_empleado', 0),
             exercise_data.get('respuestas_correctas', 0),
             exercise_data.get('total_preguntas', 0),
-            datetime.now(),
-            json.dumps(exercise_data, ensure_ascii=False)
+            _dumps_json(exercise_data)
         )
 
-        return self.execute_query(query, params, fetch_results=False)
+    def save_exercise_result(self, user_id: int, exercise_data: Dict[str, Any]) -> QueryResult:
+        """Guardar resultado de ejercicio"""
+        params = self._exercise_params(user_id, exercise_data)
+        result = self.execute_query(self.INSERT_EXERCISE_SQL, params, fetch_results=False)
+        with self._stats_cache_lock:
+            self._user_version[user_id] += 1
+        return result
+
+    def save_exercise_results_bulk(self, user_id: int,
+                                   exercises: List[Dict[str, Any]]) -> QueryResult:
+        """
+        Guardar varios resultados de ejercicio en una sola transacción
+
+        executemany sobre un cursor normal hace que el conector envíe un único
+        INSERT multi-fila, así que la sesión entera cuesta un viaje y un commit.
+        """
+        if not exercises:
+            return QueryResult(True, None, 0, 0.0)
+
+        start_time = time.time()
+        connection = None
+        cursor = None
+        local_stats = self._local_stats()
+        local_stats.total_queries += 1
+
+        try:
+            connection = self.get_connection()
+            if connection is None:
+                raise Error("No se pudo obtener conexión a la base de datos")
+
+            cursor = connection.cursor()
+            cursor.executemany(
+                self.INSERT_EXERCISE_SQL,
+                [self._exercise_params(user_id, exercise) for exercise in exercises]
+            )
+            affected_rows = cursor.rowcount
+            connection.commit()
+
+            execution_time = time.time() - start_time
+            local_stats.successful_queries += 1
+            self._update_average_query_time(local_stats, execution_time)
+            return QueryResult(True, None, affected_rows, execution_time)
+
+        except Error as e:
+            if connection:
+                connection.rollback()
+            local_stats.failed_queries += 1
+            error_msg = f"Error guardando resultados: {e}"
+            self.logger.error(error_msg)
+            return QueryResult(False, None, 0, time.time() - start_time, error_msg)
+
+        finally:
+            if cursor:
+                cursor.close()
+            if connection:
+                self.release_connection(connection)
+            with self._stats_cache_lock:
+                self._user_version[user_id] += 1
 
     def get_user_exercise_history(self, user_id: int, limit: int = 50) -> QueryResult:
         """Obtener historial de ejercicios del usuario"""
@@ -613,10 +1221,21 @@ class DatabaseManager:
                 ORDER BY fecha_completado DESC
                 LIMIT %s \
                 """
-        return self.execute_query(query, (user_id, limit))
+        return self.execute_query(query, (user_id, limit), kind=StatementKind.SELECT, readonly=True)
 
     def get_user_statistics(self, user_id: int) -> QueryResult:
-        """Obtener estadísticas del usuario"""
+        """
+        Obtener estadísticas del usuario
+
+        El resultado se reutiliza hasta que save_exercise_result registra un
+        ejercicio nuevo para ese usuario.
+        """
+        with self._stats_cache_lock:
+            version = self._user_version[user_id]
+            cached_version, cached_result = self._stats_cache.get(user_id, (None, None))
+        if cached_version == version:
+            return cached_result
+
         query = """
                 SELECT COUNT(*)                  as total_ejercicios, \
                        AVG(puntuacion)           as puntuacion_promedio, \
@@ -627,57 +1246,112 @@ class DatabaseManager:
                 FROM resultados_ejercicios
                 WHERE user_id = %s \
                 """
-        return self.execute_query(query, (user_id,))
+        result = self.execute_query(query, (user_id,), kind=StatementKind.SELECT)
+        if result.success:
+            with self._stats_cache_lock:
+                self._stats_cache[user_id] = (version, result)
+        return result
 
     # =============================================================================
     # UTILIDADES Y MANTENIMIENTO
     # =============================================================================
 
+    @property
+    def active_transactions(self) -> Dict[str, Dict[str, Any]]:
+        """Instantánea de las transacciones en curso en todos los hilos, por id"""
+        return {txn['id']: dict(txn) for txn in list(self._thread_transactions.values())}
+
+    def _local_stats(self) -> _ThreadStats:
+        """Contadores del hilo actual (se registran la primera vez)"""
+        local_stats = getattr(self._tls, 'stats', None)
+        if local_stats is None:
+            local_stats = _ThreadStats()
+            self._tls.stats = local_stats
+            # Se guardan aunque el hilo termine para no perder sus cifras
+            with self._thread_stats_lock:
+                self._thread_stats.append(local_stats)
+        return local_stats
+
     def get_database_stats(self) -> DatabaseStats:
-        """Obtener estadísticas actuales de la base de datos"""
-        self.stats.uptime = (datetime.now() - self.start_time).total_seconds()
-        return self.stats
-
-    def _update_average_query_time(self, execution_time: float):
-        """Actualizar tiempo promedio de consultas"""
-        if self.stats.successful_queries > 1:
-            current_avg = self.stats.average_query_time
-            new_avg = ((current_avg * (
-                        self.stats.successful_queries - 1)) + execution_time) / self.stats.successful_queries
-            self.stats.average_query_time = new_avg
-        else:
-            self.stats.average_query_time = execution_time
+        """Obtener estadísticas actuales de la base de datos (suma de todos los hilos)"""
+        with self._thread_stats_lock:
+            thread_stats = list(self._thread_stats)
+
+        stats = self.stats
+        stats.total_connections = sum(t.total_connections for t in thread_stats)
+        stats.active_connections = max(0, sum(t.active_connections for t in thread_stats))
+        stats.total_queries = sum(t.total_queries for t in thread_stats)
+        stats.successful_queries = sum(t.successful_queries for t in thread_stats)
+        stats.failed_queries = sum(t.failed_queries for t in thread_stats)
+        stats.average_query_time = (
+            sum(t.average_query_time * t.successful_queries for t in thread_stats)
+            / max(stats.successful_queries, 1)
+        )
+        stats.uptime = time.monotonic() - self._start_monotonic
+        return stats
 
-    def create_backup(self, backup_path: Optional[str] = None) -> BackupInfo:
-        """Crear respaldo de la base de datos"""
+    @staticmethod
+    def _update_average_query_time(local_stats: _ThreadStats, execution_time: float):
+        """Actualizar tiempo promedio de consultas del hilo (media incremental de Welford)"""
+        n = local_stats.successful_queries  # ya incrementado por execute_query
+        local_stats.average_query_time += (execution_time - local_stats.average_query_time) / n
+
+    def create_backup(self, backup_path: Optional[str] = None,
+                      compress: bool = True) -> BackupInfo:
+        """
+        Crear respaldo de la base de datos
+
+        La salida de mysqldump se comprime con zstd mientras se genera (.sql.zst),
+        sin pasar por un .sql intermedio. Sin zstd en el PATH se escribe el .sql tal cual.
+        """
+        import shutil
         import subprocess
-        import os
 
         try:
             timestamp = datetime.now()
+            compress = compress and shutil.which('zstd') is not None
+            extension = '.sql.zst' if compress else '.sql'
             if backup_path is None:
-                backup_filename = f"alfaia_backup_{timestamp.strftime('%Y%m%d_%H%M%S')}.sql"
+                backup_filename = f"alfaia_backup_{timestamp.strftime('%Y%m%d_%H%M%S')}{extension}"
                 backup_path = f"./backups/{backup_filename}"
             else:
+                if compress and not backup_path.endswith('.zst'):
+                    backup_path += '.zst'
                 backup_filename = os.path.basename(backup_path)
 
             # Crear directorio de respaldos si no existe
-            os.makedirs(os.path.dirname(backup_path), exist_ok=True)
+            os.makedirs(os.path.dirname(backup_path) or '.', exist_ok=True)
 
-            # Ejecutar mysqldump
+            # Ejecutar mysqldump (--quick vuelca fila a fila sin cargar cada tabla en memoria)
             cmd = [
                 'mysqldump',
                 f'--host={self.db_config["host"]}',
                 f'--port={self.db_config["port"]}',
                 f'--user={self.db_config["user"]}',
                 f'--password={self.db_config["password"]}',
+                '--single-transaction',
+                '--quick',
+                '--skip-lock-tables',
                 '--routines',
                 '--triggers',
                 self.db_config['database']
             ]
 
-            with open(backup_path, 'w') as backup_file:
-                result = subprocess.run(cmd, stdout=backup_file, stderr=subprocess.PIPE, text=True)
+            with open(backup_path, 'wb') as backup_file:
+                if compress:
+                    dump = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                    compressor = subprocess.Popen(['zstd', '-T0', '-3', '-q'],
+                                                  stdin=dump.stdout, stdout=backup_file)
+                    # Solo zstd debe tener abierto el extremo de lectura
+                    dump.stdout.close()
+                    _, stderr = dump.communicate()
+                    compressor.wait()
+                    if dump.returncode == 0 and compressor.returncode != 0:
+                        stderr = f"zstd terminó con código {compressor.returncode}".encode()
+                    result = subprocess.CompletedProcess(
+                        cmd, dump.returncode or compressor.returncode, stderr=stderr)
+                else:
+                    result = subprocess.run(cmd, stdout=backup_file, stderr=subprocess.PIPE)
 
             if result.returncode == 0:
                 file_size = os.path.getsize(backup_path)
@@ -697,7 +1371,7 @@ class DatabaseManager:
                     size_bytes=0,
                     tables_included=[],
                     success=False,
-                    error_message=result.stderr
+                    error_message=result.stderr.decode('utf-8', errors='replace')
                 )
 
         except Exception as e:
@@ -711,27 +1385,66 @@ class DatabaseManager:
             )
 
     def _get_table_names(self) -> List[str]:
-        """Obtener nombres de todas las tablas"""
-        result = self.execute_query("SHOW TABLES")
-        if result.success and result.data:
-            return [list(row.values())[0] for row in result.data]
-        return []
+        """Obtener nombres de todas las tablas (memorizado TABLE_NAMES_TTL segundos)"""
+        now = time.monotonic()
+        tables = self._tables_cache
+        if tables is not None and now < self._tables_cache_expiry:
+            return list(tables)
+
+        result = self.execute_query("SHOW TABLES", kind=StatementKind.SELECT)
+        if not result.success:
+            return []
+        tables = [row[0] for row in result.data or []]
+        self._tables_cache = tables
+        self._tables_cache_expiry = now + self.TABLE_NAMES_TTL
+        return list(tables)
+
+    def invalidate_schema(self) -> None:
+        """Olvidar la lista de tablas memorizada"""
+        self._tables_cache = None
+
+    def _maintain_tables(self, operation: str) -> QueryResult:
+        """
+        Ejecutar OPTIMIZE/ANALYZE/REPAIR TABLE sobre todas las tablas en una sola sentencia
 
-    def optimize_database(self) -> QueryResult:
-        """Optimizar base de datos"""
+        Los nombres salen de SHOW TABLES; aun así se entrecomillan con backticks.
+        Devuelve las filas de estado que MySQL reporta por tabla.
+        """
         tables = self._get_table_names()
         if not tables:
             return QueryResult(False, None, 0, 0.0, "No se pudieron obtener las tablas")
 
-        optimize_queries = [(f"OPTIMIZE TABLE {table}", None) for table in tables]
-        return self.execute_transaction(optimize_queries)
+        table_list = ', '.join(f"`{table.replace('`', '``')}`" for table in tables)
+        return self.execute_query(f"{operation} TABLE {table_list}", kind=StatementKind.SELECT)
+
+    def optimize_database(self) -> QueryResult:
+        """Optimizar base de datos"""
+        return self._maintain_tables("OPTIMIZE")
+
+    def analyze_database(self) -> QueryResult:
+        """Actualizar estadísticas de índices de todas las tablas"""
+        return self._maintain_tables("ANALYZE")
+
+    def repair_database(self) -> QueryResult:
+        """Reparar todas las tablas (solo motores que lo soportan, p. ej. MyISAM)"""
+        return self._maintain_tables("REPAIR")
 
     def close_all_connections(self):
         """Cerrar todas las conexiones"""
         try:
+            if self._leak_timer is not None:
+                self._leak_timer.cancel()
+                self._leak_timer = None
+
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+                self._executor = None
+
             if self.connection_pool:
                 # Cerrar el pool de conexiones
                 self.connection_pool = None
+            self.read_pools = []
+            self._replica_checked.clear()
 
             self.status = ConnectionStatus.DISCONNECTED
             print("🔒 Todas las conexiones cerradas")
@@ -744,9 +1457,15 @@ class DatabaseManager:
 # FUNCIONES DE UTILIDAD
 # =============================================================================
 
+_db_manager: Optional[DatabaseManager] = None
+
+
 def get_database_manager() -> DatabaseManager:
     """Obtener instancia única del gestor de base de datos"""
-    return DatabaseManager()
+    global _db_manager
+    if _db_manager is None:
+        _db_manager = DatabaseManager()
+    return _db_manager
 
 
 def quick_query(query: str, params: Optional[Tuple] = None) -> Dict[str, Any]:
@@ -765,7 +1484,7 @@ def quick_query(query: str, params: Optional[Tuple] = None) -> Dict[str, Any]:
 
     return {
         'success': result.success,
-        'data': result.data,
+        'data': result.as_dicts() if result.success else None,
         'affected_rows': result.affected_rows,
         'execution_time': result.execution_time,
         'error': result.error_message
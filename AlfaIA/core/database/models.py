@@ -2,13 +2,285 @@
 # AlfaIA/core/database/models.py - Modelos Corregidos con Hash Seguro
 # =============================================================================
 
+import atexit
+import copy
 import json
 import hashlib
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
 import bcrypt  # Usar bcrypt en lugar de SHA-256 simple
 from datetime import datetime, date
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Iterable, Tuple
 from enum import Enum
 
+# orjson y ujson son opcionales: se usa el más rápido disponible y, si no, json
+try:
+    import orjson
+
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import ujson
+
+    UJSON_AVAILABLE = True
+except ImportError:
+    UJSON_AVAILABLE = False
+
+
+def _dumps_json(data: Any) -> str:
+    """Serializar una columna JSON"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS).decode('utf-8')
+    if UJSON_AVAILABLE:
+        return ujson.dumps(data, ensure_ascii=False)
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+
+def _loads_json(raw: Any) -> Any:
+    """Deserializar una columna JSON (str o bytes; si el conector ya la decodificó, tal cual)"""
+    if isinstance(raw, (dict, list)):
+        return raw
+    if ORJSON_AVAILABLE:
+        return orjson.loads(raw)
+    if UJSON_AVAILABLE:
+        return ujson.loads(raw)
+    return json.loads(raw)
+
+
+# SHA-256 de los hashes heredados; la referencia local evita la búsqueda en hashlib.
+# Con OpenSSL se usa su implementación (con SHA-NI si la CPU lo tiene).
+_sha256 = hashlib.sha256
+if not getattr(_sha256, '__name__', '').startswith('openssl_'):
+    print("⚠️ hashlib sin OpenSSL: SHA-256 sin aceleración por hardware")
+
+
+# Coste de bcrypt: ALFAIA_BCRYPT_COST lo fija; si no, se calibra la primera vez
+# para que un hash tarde como mucho ALFAIA_BCRYPT_TARGET_MS en esta máquina.
+# Nunca baja del coste por defecto de bcrypt (12), ni siquiera en máquinas lentas.
+_BCRYPT_MIN_COST = 12
+_BCRYPT_MAX_COST = 14
+_BCRYPT_LIMIT_COST = 31  # máximo que admite bcrypt
+# Coste con el que se mide la máquina (barato); el resto se extrapola
+_BCRYPT_CALIBRATION_COST = 10
+_BCRYPT_TARGET_MS = float(os.getenv('ALFAIA_BCRYPT_TARGET_MS', 250))
+
+
+def _bcrypt_cost_from_env() -> Optional[int]:
+    """Coste fijado en ALFAIA_BCRYPT_COST, o None si no hay uno válido (se calibra)"""
+    raw = os.getenv('ALFAIA_BCRYPT_COST')
+    if not raw:
+        return None
+    try:
+        cost = int(raw)
+    except ValueError:
+        print(f"⚠️ ALFAIA_BCRYPT_COST no válido ({raw!r}): se calibra el coste")
+        return None
+    if not _BCRYPT_MIN_COST <= cost <= _BCRYPT_LIMIT_COST:
+        clamped = min(max(cost, _BCRYPT_MIN_COST), _BCRYPT_LIMIT_COST)
+        print(f"⚠️ ALFAIA_BCRYPT_COST={cost} fuera de rango: se usa {clamped}")
+        return clamped
+    return cost
+
+
+_bcrypt_cost: Optional[int] = _bcrypt_cost_from_env()
+
+
+def _calibrate_bcrypt(target_ms: float) -> int:
+    """Mayor coste cuyo hash estimado no supera target_ms (cada +1 duplica el tiempo)
+
+    El resultado nunca es menor que _BCRYPT_MIN_COST aunque la máquina sea lenta.
+    """
+    start = time.perf_counter()
+    bcrypt.hashpw(b"x" * 8, bcrypt.gensalt(_BCRYPT_CALIBRATION_COST))
+    base_ms = (time.perf_counter() - start) * 1000
+
+    cost = _BCRYPT_MIN_COST
+    while cost < _BCRYPT_MAX_COST and base_ms * 2 ** (cost + 1 - _BCRYPT_CALIBRATION_COST) <= target_ms:
+        cost += 1
+    return cost
+
+
+def get_bcrypt_cost() -> int:
+    """Coste de bcrypt para hashes nuevos (calibrado una vez por proceso)"""
+    global _bcrypt_cost
+    if _bcrypt_cost is None:
+        _bcrypt_cost = _calibrate_bcrypt(_BCRYPT_TARGET_MS)
+    return _bcrypt_cost
+
+
+# ¡SOLO PARA PRUEBAS! Usuario.hash_password_cached memoriza el hash de cada
+# contraseña (misma sal para la misma contraseña y la contraseña en claro
+# retenida en memoria). Sirve para fixtures y scripts de datos de ejemplo que
+# hashean una y otra vez las mismas contraseñas, y solo memoriza si además está
+# definida ALFAIA_TEST_FAST_HASH. hash_password nunca pasa por aquí.
+_FAST_HASH_ENV = 'ALFAIA_TEST_FAST_HASH'
+_FAST_HASH_MAX_LENGTH = 64
+
+
+@lru_cache(maxsize=256)
+def _hash_password_cached(password: str) -> str:
+    return Usuario.hash_password(password)
+
+
+# Caché de verificaciones bcrypt correctas: {hash: huella de la contraseña}.
+# La huella es un blake2b con clave aleatoria que solo vive en memoria de este
+# proceso; la contraseña en claro no se guarda. Solo se guardan aciertos y una
+# entrada por hash, así que los intentos fallidos no desplazan a los usuarios
+# legítimos; al llenarse se descarta la entrada menos usada.
+_VERIFY_CACHE_MAX_ENTRIES = 10000
+_PROCESS_PEPPER = bytearray(os.urandom(32))
+_verified_passwords: 'OrderedDict[bytes, bytes]' = OrderedDict()
+_verified_passwords_lock = threading.Lock()
+
+
+def _checkpw_cached(password_bytes: bytes, hash_bytes: bytes) -> bool:
+    """bcrypt.checkpw memorizado: repetir una contraseña ya validada no recalcula el KDF"""
+    fingerprint = hashlib.blake2b(password_bytes, key=_PROCESS_PEPPER, digest_size=32).digest()
+    with _verified_passwords_lock:
+        cached = _verified_passwords.get(hash_bytes)
+        if cached is not None and hmac.compare_digest(cached, fingerprint):
+            _verified_passwords.move_to_end(hash_bytes)
+            return True
+
+    if not bcrypt.checkpw(password_bytes, hash_bytes):
+        return False
+
+    with _verified_passwords_lock:
+        _verified_passwords[hash_bytes] = fingerprint
+        _verified_passwords.move_to_end(hash_bytes)
+        if len(_verified_passwords) > _VERIFY_CACHE_MAX_ENTRIES:
+            _verified_passwords.popitem(last=False)
+    return True
+
+
+@atexit.register
+def _clear_password_cache() -> None:
+    """Vaciar la caché de verificaciones y borrar la clave al salir"""
+    with _verified_passwords_lock:
+        _verified_passwords.clear()
+    _PROCESS_PEPPER[:] = bytes(len(_PROCESS_PEPPER))
+
+
+# =============================================================================
+# CACHÉ NEGATIVA DE EMAILS
+# =============================================================================
+
+# Emails consultados que no existen en la BD: evita un SELECT por cada intento
+# de login con un email inexistente. Acotada en tamaño y con TTL corto.
+_MISSING_EMAIL_TTL = 60.0
+_MISSING_EMAIL_MAX_ENTRIES = 4096
+_missing_emails: 'OrderedDict[str, float]' = OrderedDict()
+_missing_emails_lock = threading.Lock()
+
+
+def _email_cache_key(email: str) -> str:
+    return email.strip().lower()
+
+
+def _is_known_missing_email(email: str) -> bool:
+    """Indicar si el email se consultó hace poco y no existía"""
+    key = _email_cache_key(email)
+    with _missing_emails_lock:
+        expires = _missing_emails.get(key)
+        if expires is None:
+            return False
+        if expires < time.monotonic():
+            del _missing_emails[key]
+            return False
+        _missing_emails.move_to_end(key)
+        return True
+
+
+def _remember_missing_email(email: str) -> None:
+    """Registrar que el email no existe en la BD"""
+    key = _email_cache_key(email)
+    with _missing_emails_lock:
+        _missing_emails[key] = time.monotonic() + _MISSING_EMAIL_TTL
+        _missing_emails.move_to_end(key)
+        while len(_missing_emails) > _MISSING_EMAIL_MAX_ENTRIES:
+            _missing_emails.popitem(last=False)
+
+
+def forget_missing_email(email: str) -> None:
+    """Eliminar el email de la caché negativa (p. ej. tras registrarlo)"""
+    if not email:
+        return
+    with _missing_emails_lock:
+        _missing_emails.pop(_email_cache_key(email), None)
+
+
+# =============================================================================
+# CACHÉ DE USUARIOS
+# =============================================================================
+
+# Filas de usuarios cargadas recientemente por id y por email: la sesión vuelve a
+# resolver el usuario actual a menudo. Se guarda la fila (no el objeto) y cada
+# acierto construye un Usuario nuevo, así los cambios sin guardar de un llamador
+# no se ven desde otros hilos o ventanas. Entradas con TTL, acotadas en tamaño e
+# invalidadas al guardar el usuario.
+_USER_CACHE_TTL = 60.0
+_USER_CACHE_MAX_ENTRIES = 4096
+_user_cache: 'OrderedDict[tuple, tuple]' = OrderedDict()
+_user_cache_lock = threading.Lock()
+
+
+def _get_cached_user_row(key: tuple) -> Optional[Dict[str, Any]]:
+    """Obtener la fila cacheada para ('id', id) o ('email', email)"""
+    with _user_cache_lock:
+        entry = _user_cache.get(key)
+        if entry is None:
+            return None
+        expires, row = entry
+        if expires < time.monotonic():
+            del _user_cache[key]
+            return None
+        _user_cache.move_to_end(key)
+        return row
+
+
+def _cache_user_row(row: Dict[str, Any]) -> None:
+    """Registrar la fila del usuario por id y, si está activo, por email"""
+    row = dict(row)
+    # Si el conector ya decodificó el JSON, se guarda serializado para que cada
+    # Usuario construido desde la caché reciba su propia copia
+    if isinstance(row.get('configuracion_json'), (dict, list)):
+        row['configuracion_json'] = _dumps_json(row['configuracion_json'])
+
+    keys = [('id', row['id'])]
+    if row.get('activo') and row.get('email'):
+        keys.append(('email', _email_cache_key(row['email'])))
+
+    expires = time.monotonic() + _USER_CACHE_TTL
+    with _user_cache_lock:
+        for key in keys:
+            _user_cache[key] = (expires, row)
+            _user_cache.move_to_end(key)
+        while len(_user_cache) > _USER_CACHE_MAX_ENTRIES:
+            _user_cache.popitem(last=False)
+
+
+def invalidate_cached_user(user_id: int = None, email: str = None) -> None:
+    """Eliminar de la caché las entradas del usuario (por id y/o email)"""
+    with _user_cache_lock:
+        if user_id is not None:
+            entry = _user_cache.pop(('id', user_id), None)
+            if entry is not None and entry[1].get('email'):
+                _user_cache.pop(('email', _email_cache_key(entry[1]['email'])), None)
+        if email:
+            _user_cache.pop(('email', _email_cache_key(email)), None)
+
+
+def clear_user_cache() -> None:
+    """Vaciar la caché de usuarios"""
+    with _user_cache_lock:
+        _user_cache.clear()
+
 
 class NivelUsuario(Enum):
     """Niveles de usuario disponibles"""
@@ -32,9 +304,88 @@ class EstiloAprendizaje(Enum):
     MIXTO = "Mixto"
 
 
+def _lookup_ids(enum_cls) -> Dict[Enum, int]:
+    """Ids de las tablas de catálogo: posición del miembro empezando en 1"""
+    return {member: index for index, member in enumerate(enum_cls, start=1)}
+
+
+# Las columnas de catálogo guardan TINYINT. Los ids NO coinciden con el índice
+# de los ENUM de esquemas previos ('basico', 'profesor'...), así que esas
+# columnas deben migrarse antes de escribir ids (DatabaseManager.migrate_lookup_columns).
+NIVEL_USUARIO_IDS = _lookup_ids(NivelUsuario)
+ROL_USUARIO_IDS = _lookup_ids(RolUsuario)
+ESTILO_APRENDIZAJE_IDS = _lookup_ids(EstiloAprendizaje)
+
+_LOOKUP_IDS = {
+    NivelUsuario: NIVEL_USUARIO_IDS,
+    RolUsuario: ROL_USUARIO_IDS,
+    EstiloAprendizaje: ESTILO_APRENDIZAJE_IDS,
+}
+
+# Textos de los antiguos ENUM sin miembro equivalente en el modelo
+_LEGACY_ALIASES = {
+    NivelUsuario: {'basico': NivelUsuario.PRINCIPIANTE},
+    RolUsuario: {'profesor': RolUsuario.TUTOR},
+    EstiloAprendizaje: {},
+}
+
+
+def _db_values(enum_cls) -> Dict[Any, Enum]:
+    """Valor de BD -> miembro: id de catálogo, texto del Enum y texto de los antiguos ENUM"""
+    values = dict(_LEGACY_ALIASES[enum_cls])
+    for member, member_id in _LOOKUP_IDS[enum_cls].items():
+        values[member_id] = member
+        values[member.value] = member
+        values[member.value.lower()] = member
+        values[member.name.lower()] = member  # 'kinestesico' en los ENUM de MySQL
+    return values
+
+
+_DB_VALUES = {enum_cls: _db_values(enum_cls) for enum_cls in (NivelUsuario, RolUsuario, EstiloAprendizaje)}
+
+
+def _enum_from_db(enum_cls, value: Any, default: Enum) -> Enum:
+    """Convertir el valor de una columna de catálogo (id o texto de ENUM) al Enum"""
+    values = _DB_VALUES[enum_cls]
+    member = values.get(value)
+    if member is None and isinstance(value, str):
+        member = values.get(value.lower())
+    return member or default
+
+
+def lookup_id(enum_cls, value: Any, default: Enum) -> int:
+    """Id de catálogo para un miembro, un id o el texto de un antiguo ENUM"""
+    if isinstance(value, enum_cls):
+        return _LOOKUP_IDS[enum_cls][value]
+    return _LOOKUP_IDS[enum_cls][_enum_from_db(enum_cls, value, default)]
+
+
+def legacy_lookup_ids(enum_cls) -> Dict[str, int]:
+    """Texto en minúsculas de los antiguos ENUM -> id de catálogo (para migrar columnas)"""
+    ids = _LOOKUP_IDS[enum_cls]
+    return {value: ids[member] for value, member in _DB_VALUES[enum_cls].items()
+            if isinstance(value, str) and value == value.lower()}
+
+
+_MISSING = object()
+
+
+@lru_cache(maxsize=256)
+def _profile_update_sql(columns: tuple) -> str:
+    """UPDATE de perfiles_usuario para un conjunto (ordenado) de columnas"""
+    assignments = ', '.join(f"{column} = %s" for column in columns)
+    return f"UPDATE perfiles_usuario SET {assignments} WHERE id = %s"
+
+
 class Usuario:
     """Modelo de Usuario con hash de contraseña seguro"""
 
+    _COLUMNS = ('id', 'email', 'password_hash', 'nombre', 'apellido', 'fecha_nacimiento',
+                'nivel_inicial', 'rol', 'activo', 'fecha_registro', 'configuracion_json')
+    __slots__ = _COLUMNS
+    _FIELDS = frozenset(_COLUMNS)
+    _SELECT = f"SELECT {', '.join(_COLUMNS)} FROM usuarios"
+
     def __init__(self, id: int = None, email: str = None, password_hash: str = None,
                  nombre: str = None, apellido: str = None, fecha_nacimiento: date = None,
                  nivel_inicial: NivelUsuario = NivelUsuario.PRINCIPIANTE,
@@ -49,7 +400,8 @@ class Usuario:
         self.nivel_inicial = nivel_inicial
         self.rol = rol
         self.activo = activo
-        self.fecha_registro = fecha_registro or datetime.now()
+        # Se rellena al insertar; al cargar desde la BD llega ya con valor
+        self.fecha_registro = fecha_registro
         self.configuracion_json = configuracion_json or {}
 
     @staticmethod
@@ -58,43 +410,76 @@ class Usuario:
         try:
             # Usar bcrypt para hash seguro
             password_bytes = password.encode('utf-8')
-            salt = bcrypt.gensalt()
+            salt = bcrypt.gensalt(get_bcrypt_cost())
             hashed = bcrypt.hashpw(password_bytes, salt)
             return hashed.decode('utf-8')
         except Exception as e:
             print(f"❌ Error hasheando contraseña con bcrypt: {e}")
             # Fallback a SHA-256 si bcrypt falla
-            return hashlib.sha256(password.encode('utf-8')).hexdigest()
+            return _sha256(password.encode('utf-8')).hexdigest()
 
-    def verify_password(self, password: str) -> bool:
-        """Verificar contraseña contra el hash (COMPATIBLE CON AMBOS MÉTODOS)"""
-        if not self.password_hash or not password:
+    @staticmethod
+    def hash_password_cached(password: str) -> str:
+        """Hash memorizado por contraseña: SOLO para fixtures y scripts de prueba
+
+        Reutiliza la sal y retiene la contraseña en claro, así que solo memoriza
+        con ALFAIA_TEST_FAST_HASH definida; sin ella equivale a hash_password.
+        """
+        if os.environ.get(_FAST_HASH_ENV) and len(password) <= _FAST_HASH_MAX_LENGTH:
+            return _hash_password_cached(password)
+        return Usuario.hash_password(password)
+
+    @staticmethod
+    def check_password(password: str, password_hash: str) -> bool:
+        """Comprobar una contraseña contra un hash (COMPATIBLE CON AMBOS MÉTODOS)"""
+        if not password_hash or not password:
             return False
 
         try:
             # Intentar verificación con bcrypt primero
             password_bytes = password.encode('utf-8')
-            hash_bytes = self.password_hash.encode('utf-8')
+            hash_bytes = password_hash.encode('utf-8')
 
             # Si el hash parece ser de bcrypt (empieza con $2b$)
-            if self.password_hash.startswith('$2b$'):
-                return bcrypt.checkpw(password_bytes, hash_bytes)
+            if password_hash.startswith('$2b$'):
+                return _checkpw_cached(password_bytes, hash_bytes)
             else:
                 # Fallback para hashes SHA-256 existentes
-                sha256_hash = hashlib.sha256(password_bytes).hexdigest()
-                return self.password_hash == sha256_hash
+                sha256_hash = _sha256(password_bytes).hexdigest()
+                return password_hash == sha256_hash
 
         except Exception as e:
             print(f"❌ Error verificando contraseña: {e}")
             # Último fallback: comparación SHA-256
             try:
-                sha256_hash = hashlib.sha256(password.encode('utf-8')).hexdigest()
-                return self.password_hash == sha256_hash
+                sha256_hash = _sha256(password.encode('utf-8')).hexdigest()
+                return password_hash == sha256_hash
             except:
                 return False
 
-    def save(self) -> bool:
-        """Guardar usuario en la base de datos"""
+    def needs_rehash(self) -> bool:
+        """Indicar si el hash bcrypt tiene un coste inferior al actual"""
+        if not self.password_hash or not self.password_hash.startswith('$2b$'):
+            return False
+        try:
+            return int(self.password_hash.split('$')[2]) < get_bcrypt_cost()
+        except (IndexError, ValueError):
+            return False
+
+    def verify_password(self, password: str) -> bool:
+        """Verificar contraseña contra el hash del usuario"""
+        valid = self.check_password(password, self.password_hash)
+        if valid and self.id and self.needs_rehash():
+            # Hash con un coste inferior al actual: se renueva aprovechando el login
+            self.update_password(password)
+        return valid
+
+    def save(self, cursor=None) -> bool:
+        """Guardar usuario en la base de datos
+
+        Si se recibe un cursor, se escribe sobre él sin hacer commit: la
+        transacción la controla quien lo pasa.
+        """
         try:
             from core.database.connection import DatabaseManager
             db_manager = DatabaseManager()
@@ -106,22 +491,26 @@ class Usuario:
                                               nivel_inicial, rol, activo, configuracion_json)
                         VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
                         """
+                if self.fecha_registro is None:
+                    # La BD pone su CURRENT_TIMESTAMP; se refleja en el objeto
+                    self.fecha_registro = datetime.now()
                 params = (
                     self.email, self.password_hash, self.nombre, self.apellido,
-                    self.fecha_nacimiento, self.nivel_inicial.value, self.rol.value,
-                    self.activo, json.dumps(self.configuracion_json)
+                    self.fecha_nacimiento, NIVEL_USUARIO_IDS[self.nivel_inicial], ROL_USUARIO_IDS[self.rol],
+                    self.activo, _dumps_json(self.configuracion_json)
                 )
 
-                connection = db_manager.get_connection()
-                if connection:
-                    cursor = connection.cursor()
+                if cursor is not None:
                     cursor.execute(query, params)
                     self.id = cursor.lastrowid
-                    connection.commit()
-                    cursor.close()
-                    connection.close()
-                    print(f"✅ Usuario guardado con ID: {self.id}")
                     return True
+
+                self.id = db_manager.execute_insert(query, params)
+                if self.id is None:
+                    return False
+                forget_missing_email(self.email)
+                print(f"✅ Usuario guardado con ID: {self.id}")
+                return True
             else:
                 # Actualizar usuario existente
                 query = """
@@ -139,15 +528,23 @@ class Usuario:
                         """
                 params = (
                     self.email, self.password_hash, self.nombre, self.apellido,
-                    self.fecha_nacimiento, self.nivel_inicial.value, self.rol.value,
-                    self.activo, json.dumps(self.configuracion_json), self.id
+                    self.fecha_nacimiento, NIVEL_USUARIO_IDS[self.nivel_inicial], ROL_USUARIO_IDS[self.rol],
+                    self.activo, _dumps_json(self.configuracion_json), self.id
                 )
+                if cursor is not None:
+                    cursor.execute(query, params)
+                    invalidate_cached_user(self.id, self.email)
+                    return True
+
                 result = db_manager.execute_non_query(query, params)
                 if result:
+                    invalidate_cached_user(self.id, self.email)
                     print(f"✅ Usuario actualizado ID: {self.id}")
                 return result
 
         except Exception as e:
+            if cursor is not None:
+                raise
             print(f"❌ Error guardando usuario: {e}")
             import traceback
             traceback.print_exc()
@@ -158,17 +555,33 @@ class Usuario:
     def find_by_email(cls, email: str) -> Optional['Usuario']:
         """Buscar usuario por email"""
         try:
+            if _is_known_missing_email(email):
+                print(f"❌ Usuario no encontrado (caché): {email}")
+                return None
+
+            row = _get_cached_user_row(('email', _email_cache_key(email)))
+            if row is not None:
+                return cls._from_row(row)
+
             from core.database.connection import DatabaseManager
             db_manager = DatabaseManager()
-            query = "SELECT * FROM usuarios WHERE email = %s AND activo = TRUE"
-            results = db_manager.execute_query(query, (email,))
+            # Sin filtrar por activo: la caché negativa solo debe registrar emails
+            # que no existen, no cuentas desactivadas (find_auth_by_email la consulta)
+            query = f"{cls._SELECT} WHERE email = %s"
+            results = db_manager.execute_prepared(query, (email,), dictionary=True)
 
             if results and len(results) > 0:
                 row = results[0]
+                if not row['activo']:
+                    print(f"❌ Usuario desactivado: {email}")
+                    return None
                 user = cls._from_row(row)
+                _cache_user_row(row)
                 print(f"✅ Usuario encontrado: {user.email} (ID: {user.id})")
                 return user
             else:
+                if results is not None:
+                    _remember_missing_email(email)
                 print(f"❌ Usuario no encontrado: {email}")
                 return None
 
@@ -176,17 +589,45 @@ class Usuario:
             print(f"❌ Error buscando usuario por email: {e}")
             return None
 
+    @classmethod
+    def find_auth_by_email(cls, email: str) -> Optional[Tuple[int, str, bool]]:
+        """Obtener solo (id, password_hash, activo) para validar un login"""
+        try:
+            if _is_known_missing_email(email):
+                return None
+
+            from core.database.connection import DatabaseManager
+            db_manager = DatabaseManager()
+            query = "SELECT id, password_hash, activo FROM usuarios WHERE email = %s LIMIT 1"
+            results = db_manager.execute_query(query, (email,))
+
+            if results:
+                user_id, password_hash, activo = results[0]
+                return user_id, password_hash, bool(activo)
+            if results is not None:
+                _remember_missing_email(email)
+            return None
+
+        except Exception as e:
+            print(f"❌ Error buscando credenciales por email: {e}")
+            return None
+
     @classmethod
     def find_by_id(cls, user_id: int) -> Optional['Usuario']:
         """Buscar usuario por ID"""
         try:
+            row = _get_cached_user_row(('id', user_id))
+            if row is not None:
+                return cls._from_row(row)
+
             from core.database.connection import DatabaseManager
             db_manager = DatabaseManager()
-            query = "SELECT * FROM usuarios WHERE id = %s"
-            results = db_manager.execute_query(query, (user_id,))
+            query = f"{cls._SELECT} WHERE id = %s"
+            results = db_manager.execute_prepared(query, (user_id,), dictionary=True)
 
             if results and len(results) > 0:
                 row = results[0]
+                _cache_user_row(row)
                 return cls._from_row(row)
             return None
 
@@ -195,26 +636,60 @@ class Usuario:
             return None
 
     @classmethod
-    def _from_row(cls, row: tuple) -> 'Usuario':
-        """Crear instancia de Usuario desde fila de BD"""
+    def find_many_by_ids(cls, user_ids: Iterable[int]) -> List['Usuario']:
+        """Buscar varios usuarios por ID con una sola query (en el orden recibido)"""
+        user_ids = list(dict.fromkeys(user_ids))
+        if not user_ids:
+            return []
+
+        try:
+            from core.database.connection import DatabaseManager
+            db_manager = DatabaseManager()
+            placeholders = ', '.join(['%s'] * len(user_ids))
+            query = f"{cls._SELECT} WHERE id IN ({placeholders})"
+            results = db_manager.execute_query(query, tuple(user_ids), dictionary=True)
+            if not results:
+                return []
+
+            users = {row['id']: cls._from_row(row) for row in results}
+            return [users[user_id] for user_id in user_ids if user_id in users]
+
+        except Exception as e:
+            print(f"❌ Error buscando usuarios por ID: {e}")
+            return []
+
+    @classmethod
+    def find_with_perfil(cls, user_id: int) -> Optional[Tuple['Usuario', Optional['PerfilUsuario']]]:
+        """Buscar usuario y su perfil con un único JOIN (perfil None si no tiene)"""
+        try:
+            from core.database.connection import DatabaseManager
+            db_manager = DatabaseManager()
+            results = db_manager.execute_query(_user_with_profile_sql(), (user_id,), dictionary=True)
+
+            if not results:
+                return None
+
+            row = results[0]
+            profile_row = {column: row[_PROFILE_ALIAS + column] for column in PerfilUsuario._COLUMNS}
+            profile = PerfilUsuario._from_row(profile_row) if profile_row['id'] is not None else None
+            return cls._from_row(row), profile
+
+        except Exception as e:
+            print(f"❌ Error buscando usuario con perfil: {e}")
+            return None
+
+    @classmethod
+    def _from_row(cls, row: Dict[str, Any]) -> 'Usuario':
+        """Crear instancia de Usuario desde fila de BD (dict por columna)"""
+        data = {column: value for column, value in row.items() if column in cls._FIELDS}
         try:
-            configuracion = json.loads(row[10]) if row[10] else {}
-        except (json.JSONDecodeError, TypeError):
-            configuracion = {}
-
-        return cls(
-            id=row[0],
-            email=row[1],
-            password_hash=row[2],
-            nombre=row[3],
-            apellido=row[4],
-            fecha_nacimiento=row[5],
-            nivel_inicial=NivelUsuario(row[6]),
-            rol=RolUsuario(row[7]),
-            activo=row[8],
-            fecha_registro=row[9],
-            configuracion_json=configuracion
-        )
+            data['configuracion_json'] = _loads_json(data.get('configuracion_json') or '{}')
+        except (ValueError, TypeError):
+            data['configuracion_json'] = {}
+
+        data['nivel_inicial'] = _enum_from_db(NivelUsuario, data.get('nivel_inicial'), NivelUsuario.PRINCIPIANTE)
+        data['rol'] = _enum_from_db(RolUsuario, data.get('rol'), RolUsuario.ESTUDIANTE)
+        return cls(**data)
 
     def update_password(self, new_password: str) -> bool:
         """Actualizar contraseña del usuario"""
@@ -229,6 +704,18 @@ class Usuario:
 class PerfilUsuario:
     """Modelo de Perfil de Usuario"""
 
+    _COLUMNS = ('id', 'user_id', 'nivel_lectura', 'nivel_gramatica', 'nivel_vocabulario',
+                'puntos_totales', 'experiencia_total', 'racha_dias_consecutivos',
+                'tiempo_total_minutos', 'ejercicios_completados', 'objetivo_diario_ejercicios',
+                'estilo_aprendizaje', 'preferencias_json', 'estadisticas_json')
+    __slots__ = _COLUMNS + ('_json_saved', '_dirty')
+    _FIELDS = frozenset(_COLUMNS)
+    _JSON_COLUMNS = ('preferencias_json', 'estadisticas_json')
+    # Columnas que el UPDATE puede escribir (id y user_id no cambian)
+    _TRACKED = frozenset(_COLUMNS[2:])
+    _INSERT_COLUMNS = _COLUMNS[1:]
+    _SELECT = f"SELECT {', '.join(_COLUMNS)} FROM perfiles_usuario"
+
     def __init__(self, id: int = None, user_id: int = None, nivel_lectura: int = 1,
                  nivel_gramatica: int = 1, nivel_vocabulario: int = 1, puntos_totales: int = 0,
                  experiencia_total: int = 0, racha_dias_consecutivos: int = 0,
@@ -236,6 +723,8 @@ class PerfilUsuario:
                  objetivo_diario_ejercicios: int = 5,
                  estilo_aprendizaje: EstiloAprendizaje = EstiloAprendizaje.MIXTO,
                  preferencias_json: Dict = None, estadisticas_json: Dict = None):
+        # Columnas modificadas desde la última carga o guardado
+        self._dirty = set()
         self.id = id
         self.user_id = user_id
         self.nivel_lectura = nivel_lectura
@@ -248,11 +737,65 @@ class PerfilUsuario:
         self.ejercicios_completados = ejercicios_completados
         self.objetivo_diario_ejercicios = objetivo_diario_ejercicios
         self.estilo_aprendizaje = estilo_aprendizaje
+        # JSON tal como está guardado en la BD: {campo: texto} (vacío si es nuevo)
+        self._json_saved = {}
         self.preferencias_json = preferencias_json or {}
         self.estadisticas_json = estadisticas_json or {}
+        self._dirty.clear()
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if name in self._TRACKED and getattr(self, name, _MISSING) != value:
+            self._dirty.add(name)
+        object.__setattr__(self, name, value)
+
+    def _json_blobs(self) -> Dict[str, str]:
+        """Serializar los campos JSON (siempre de nuevo: pueden cambiar valores anidados)"""
+        return {field: _dumps_json(getattr(self, field)) for field in self._JSON_COLUMNS}
+
+    def _changed_columns(self, blobs: Dict[str, str]) -> Tuple[str, ...]:
+        """Columnas a escribir: las reasignadas más los JSON que difieren de lo guardado"""
+        columns = set(self._dirty)
+        columns.update(field for field, blob in blobs.items() if self._json_saved.get(field) != blob)
+        return tuple(sorted(columns))
+
+    def mark_json_changed(self, field: str = None) -> None:
+        """Forzar la escritura de un campo JSON (o de todos) en el próximo save"""
+        self._dirty.update(self._JSON_COLUMNS if field is None else (field,))
+
+    def copy(self) -> 'PerfilUsuario':
+        """Copia independiente (JSON incluidos) con los mismos cambios pendientes de guardar"""
+        perfil = PerfilUsuario(**{
+            column: copy.deepcopy(getattr(self, column)) if column in self._JSON_COLUMNS
+            else getattr(self, column)
+            for column in self._COLUMNS
+        })
+        perfil._json_saved.update(self._json_saved)
+        perfil._dirty.update(self._dirty)
+        return perfil
 
-    def save(self) -> bool:
-        """Guardar perfil en la base de datos"""
+    def _insert_params(self, blobs: Dict[str, str] = None) -> tuple:
+        """Parámetros del INSERT en el orden de _INSERT_COLUMNS"""
+        blobs = blobs or self._json_blobs()
+        return tuple(self._column_value(column, blobs) for column in self._INSERT_COLUMNS)
+
+    def _column_value(self, column: str, blobs: Dict[str, str]) -> Any:
+        """Valor de la columna tal como se envía a la BD"""
+        if column == 'estilo_aprendizaje':
+            return ESTILO_APRENDIZAJE_IDS[self.estilo_aprendizaje]
+        if column in blobs:
+            return blobs[column]
+        return getattr(self, column)
+
+    def _mark_saved(self, blobs: Dict[str, str]) -> None:
+        """Tras escribir en la BD: nada pendiente y el JSON guardado es el actual"""
+        self._json_saved.update(blobs)
+        self._dirty.clear()
+
+    def save(self, cursor=None) -> bool:
+        """Guardar perfil en la base de datos
+
+        Si se recibe un cursor, se escribe sobre él sin hacer commit.
+        """
         try:
             from core.database.connection import DatabaseManager
             db_manager = DatabaseManager()
@@ -267,63 +810,101 @@ class PerfilUsuario:
                                                       estilo_aprendizaje, preferencias_json, estadisticas_json)
                         VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
                         """
-                params = (
-                    self.user_id, self.nivel_lectura, self.nivel_gramatica, self.nivel_vocabulario,
-                    self.puntos_totales, self.experiencia_total, self.racha_dias_consecutivos,
-                    self.tiempo_total_minutos, self.ejercicios_completados, self.objetivo_diario_ejercicios,
-                    self.estilo_aprendizaje.value, json.dumps(self.preferencias_json),
-                    json.dumps(self.estadisticas_json)
-                )
+                blobs = self._json_blobs()
+                params = self._insert_params(blobs)
 
-                connection = db_manager.get_connection()
-                if connection:
-                    cursor = connection.cursor()
+                if cursor is not None:
                     cursor.execute(query, params)
                     self.id = cursor.lastrowid
-                    connection.commit()
-                    cursor.close()
-                    connection.close()
+                    self._mark_saved(blobs)
                     return True
+
+                self.id = db_manager.execute_insert(query, params)
+                if self.id is None:
+                    return False
+                self._mark_saved(blobs)
+                return True
             else:
-                # Actualizar perfil existente
-                query = """
-                        UPDATE perfiles_usuario
-                        SET nivel_lectura=%s, \
-                            nivel_gramatica=%s, \
-                            nivel_vocabulario=%s,
-                            puntos_totales=%s, \
-                            experiencia_total=%s, \
-                            racha_dias_consecutivos=%s,
-                            tiempo_total_minutos=%s, \
-                            ejercicios_completados=%s, \
-                            objetivo_diario_ejercicios=%s,
-                            estilo_aprendizaje=%s, \
-                            preferencias_json=%s, \
-                            estadisticas_json=%s
-                        WHERE id = %s
-                        """
-                params = (
-                    self.nivel_lectura, self.nivel_gramatica, self.nivel_vocabulario,
-                    self.puntos_totales, self.experiencia_total, self.racha_dias_consecutivos,
-                    self.tiempo_total_minutos, self.ejercicios_completados, self.objetivo_diario_ejercicios,
-                    self.estilo_aprendizaje.value, json.dumps(self.preferencias_json),
-                    json.dumps(self.estadisticas_json), self.id
-                )
-                return db_manager.execute_non_query(query, params)
+                # Actualizar solo las columnas modificadas; los JSON se comparan ya
+                # serializados, así también se detectan los cambios anidados
+                blobs = self._json_blobs()
+                columns = self._changed_columns(blobs)
+                if not columns:
+                    return True
+
+                query = _profile_update_sql(columns)
+                params = tuple(self._column_value(column, blobs) for column in columns) + (self.id,)
+                if cursor is not None:
+                    cursor.execute(query, params)
+                    self._mark_saved(blobs)
+                    return True
+
+                if db_manager.execute_non_query(query, params):
+                    self._mark_saved(blobs)
+                    return True
+                return False
 
         except Exception as e:
+            if cursor is not None:
+                raise
             print(f"❌ Error guardando perfil: {e}")
             return False
         return False
 
+    @classmethod
+    def increment_counters(cls, user_id: int, exercises: int = 0, minutes: int = 0,
+                           points: int = 0, streak_delta: int = 0) -> bool:
+        """Sumar progreso al perfil con un único UPDATE atómico
+
+        La suma la hace MySQL, así que actualizaciones concurrentes del mismo
+        perfil no se pisan. Los puntos cuentan también como experiencia.
+        """
+        from core.database.connection import DatabaseManager
+        query = """
+                UPDATE perfiles_usuario
+                SET ejercicios_completados  = ejercicios_completados + %s,
+                    tiempo_total_minutos    = tiempo_total_minutos + %s,
+                    puntos_totales          = puntos_totales + %s,
+                    experiencia_total       = experiencia_total + %s,
+                    racha_dias_consecutivos = racha_dias_consecutivos + %s
+                WHERE user_id = %s
+                """
+        params = (exercises, minutes, points, points, streak_delta, user_id)
+        return DatabaseManager().execute_non_query(query, params)
+
+    def apply_counter_deltas(self, exercises: int = 0, minutes: int = 0,
+                             points: int = 0, streak_delta: int = 0) -> None:
+        """Reflejar en memoria un increment_counters ya guardado
+
+        No marca las columnas como modificadas: un save() posterior no debe
+        reescribir los contadores con valores absolutos.
+        """
+        deltas = (('ejercicios_completados', exercises), ('tiempo_total_minutos', minutes),
+                  ('puntos_totales', points), ('experiencia_total', points),
+                  ('racha_dias_consecutivos', streak_delta))
+        for column, delta in deltas:
+            if delta:
+                object.__setattr__(self, column, getattr(self, column) + delta)
+
+    @classmethod
+    def bulk_insert(cls, perfiles: Iterable['PerfilUsuario']) -> int:
+        """Insertar muchos perfiles con INSERT multi-fila
+
+        Los perfiles no reciben su id (usar find_by_user_id si hace falta).
+        Retorna las filas insertadas o -1 si hay error.
+        """
+        from core.database.connection import DatabaseManager
+        rows = [perfil._insert_params() for perfil in perfiles]
+        return DatabaseManager().bulk_insert('perfiles_usuario', list(cls._INSERT_COLUMNS), rows)
+
     @classmethod
     def find_by_user_id(cls, user_id: int) -> Optional['PerfilUsuario']:
         """Buscar perfil por ID de usuario"""
         try:
             from core.database.connection import DatabaseManager
             db_manager = DatabaseManager()
-            query = "SELECT * FROM perfiles_usuario WHERE user_id = %s"
-            results = db_manager.execute_query(query, (user_id,))
+            query = f"{cls._SELECT} WHERE user_id = %s"
+            results = db_manager.execute_prepared(query, (user_id,), dictionary=True)
 
             if results and len(results) > 0:
                 row = results[0]
@@ -335,39 +916,48 @@ class PerfilUsuario:
             return None
 
     @classmethod
-    def _from_row(cls, row: tuple) -> 'PerfilUsuario':
-        """Crear instancia de PerfilUsuario desde fila de BD"""
+    def _from_row(cls, row: Dict[str, Any]) -> 'PerfilUsuario':
+        """Crear instancia de PerfilUsuario desde fila de BD (dict por columna)"""
+        data = {column: value for column, value in row.items() if column in cls._FIELDS}
         try:
-            preferencias = json.loads(row[11]) if row[11] else {}
-            estadisticas = json.loads(row[12]) if row[12] else {}
-        except (json.JSONDecodeError, TypeError):
-            preferencias = {}
-            estadisticas = {}
-
-        return cls(
-            id=row[0],
-            user_id=row[1],
-            nivel_lectura=row[2],
-            nivel_gramatica=row[3],
-            nivel_vocabulario=row[4],
-            puntos_totales=row[5],
-            experiencia_total=row[6],
-            racha_dias_consecutivos=row[7],
-            tiempo_total_minutos=row[8],
-            ejercicios_completados=row[9],
-            objetivo_diario_ejercicios=row[10],
-            estilo_aprendizaje=EstiloAprendizaje.MIXTO,  # Simplificado por ahora
-            preferencias_json=preferencias,
-            estadisticas_json=estadisticas
-        )
+            data['preferencias_json'] = _loads_json(data.get('preferencias_json') or '{}')
+            data['estadisticas_json'] = _loads_json(data.get('estadisticas_json') or '{}')
+        except (ValueError, TypeError):
+            data['preferencias_json'] = {}
+            data['estadisticas_json'] = {}
+
+        data['estilo_aprendizaje'] = _enum_from_db(EstiloAprendizaje, data.get('estilo_aprendizaje'),
+                                                   EstiloAprendizaje.MIXTO)
+        perfil = cls(**data)
+        perfil._json_saved.update(perfil._json_blobs())
+        return perfil
+
+
+_PROFILE_ALIAS = 'perfil__'
+
+
+@lru_cache(maxsize=None)
+def _user_with_profile_sql() -> str:
+    """SELECT de usuario + perfil; las columnas del perfil llevan prefijo para no chocar"""
+    user_columns = ', '.join(f"u.{column}" for column in Usuario._COLUMNS)
+    profile_columns = ', '.join(f"p.{column} AS {_PROFILE_ALIAS}{column}" for column in PerfilUsuario._COLUMNS)
+    return (f"SELECT {user_columns}, {profile_columns} FROM usuarios u "
+            f"LEFT JOIN perfiles_usuario p ON p.user_id = u.id WHERE u.id = %s")
 
 
 # =============================================================================
 # FUNCIONES DE UTILIDAD PARA MIGRACIÓN
 # =============================================================================
 
-def migrate_existing_passwords():
-    """Migrar contraseñas existentes a bcrypt (SOLO EJECUTAR UNA VEZ)"""
+_MIGRATION_BATCH_SIZE = 1000
+
+
+def migrate_existing_passwords(batch_size: int = _MIGRATION_BATCH_SIZE):
+    """Migrar contraseñas existentes a bcrypt (SOLO EJECUTAR UNA VEZ)
+
+    Recorre los usuarios por lotes de `batch_size` con paginación por id, así que
+    la memoria y la duración de cada query no dependen del tamaño de la tabla.
+    """
     print("🔄 Migrando contraseñas existentes a bcrypt...")
 
     try:
@@ -375,20 +965,38 @@ def migrate_existing_passwords():
 
         db_manager = DatabaseManager()
 
-        # Obtener todos los usuarios con hashes SHA-256 (no empiezan con $2b$)
-        query = "SELECT id, email, password_hash FROM usuarios WHERE password_hash NOT LIKE '$2b$%'"
-        results = db_manager.execute_query(query)
+        # Usuarios con hashes SHA-256 (no empiezan con $2b$), paginados por id
+        query = """
+                SELECT id, email, password_hash
+                FROM usuarios
+                WHERE id > %s AND password_hash NOT LIKE '$2b$%%'
+                ORDER BY id
+                LIMIT %s
+                """
+        last_id = 0
+        total = 0
+        while True:
+            results = db_manager.execute_query(query, (last_id, batch_size))
+            if results is None:
+                print("❌ Error leyendo usuarios a migrar")
+                return False
+            if not results:
+                break
 
-        if not results:
-            print("✅ No hay contraseñas que migrar")
-            return True
+            total += len(results)
+            for user_id, email, old_hash in results:
+                print(f"⚠️  Usuario {email} tiene hash SHA-256 antiguo")
+                print("   Este usuario necesitará cambiar su contraseña en el próximo login")
 
-        print(f"🔍 Encontradas {len(results)} contraseñas para migrar")
+            last_id = results[-1][0]
+            if len(results) < batch_size:
+                break
 
-        for user_id, email, old_hash in results:
-            print(f"⚠️  Usuario {email} tiene hash SHA-256 antiguo")
-            print("   Este usuario necesitará cambiar su contraseña en el próximo login")
+        if not total:
+            print("✅ No hay contraseñas que migrar")
+            return True
 
+        print(f"🔍 Encontradas {total} contraseñas para migrar")
         print("✅ Migración completada (hashes antiguos mantenidos por compatibilidad)")
         return True
 
@@ -402,7 +1010,7 @@ if __name__ == "__main__":
 
     # Probar hash de contraseña
     test_password = "TestPassword123"
-    hashed = Usuario.hash_password(test_password)
+    hashed = Usuario.hash_password_cached(test_password)
     print(f"🔑 Hash generado: {hashed}")
 
     # Crear usuario temporal para probar
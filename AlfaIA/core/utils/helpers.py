@@ -2,15 +2,48 @@
 # AlfaIA/core/utils/helpers.py - Funciones Auxiliares y Utilidades
 # =============================================================================
 
+import base64
+import functools
+import io
 import os
+import random
+import re
 import json
 import hashlib
 import secrets
-from datetime import datetime, timedelta
-from typing import Any, Dict, List, Optional, Union
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Optional, Union
 from pathlib import Path
+from bisect import bisect_right
 import logging
 
+# orjson es opcional: si no está disponible se usa json
+try:
+    import orjson
+
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+# Patrones compilados una sola vez para los validadores y el análisis de texto
+_EMAIL_RE = re.compile(r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$')
+_NUM_RE = re.compile(r'-?\d+\.?\d*')
+# Una secuencia máxima de \w ya está delimitada por \b a ambos lados
+_WORD_RE = re.compile(r'\w+')
+_SENT_RE = re.compile(r'[.!?]+')
+_SPANISH_RE = re.compile(r'^[a-zA-ZáéíóúÁÉÍÓÚñÑüÜ\s\d\.,;:¡!¿?\-\(\)\"\']+$')
+_FINAL_PUNCT_RE = re.compile(r'[.!?]$')
+
+# Caracteres de control (salvo tabulador y saltos de línea) -> eliminados
+_CONTROL_CHARS_TABLE = dict.fromkeys(code for code in range(32) if chr(code) not in '\t\n\r')
+
+# Constructor de SHA-256 resuelto una vez (usa OpenSSL cuando está disponible)
+_sha256 = hashlib.sha256
+
+# Caracteres problemáticos en nombres de archivo -> '_'
+_FILENAME_TABLE = str.maketrans({char: '_' for char in '<>:"/\\|?*'})
+
 
 def setup_logging(log_level: str = "INFO", log_file: str = "alfaia.log") -> logging.Logger:
     """
@@ -23,6 +56,13 @@ def setup_logging(log_level: str = "INFO", log_file: str = "alfaia.log") -> logg
     Returns:
         Logger configurado
     """
+    logger = logging.getLogger("AlfaIA")
+    logger.setLevel(getattr(logging, log_level.upper()))
+
+    # Ya configurado: no duplicar handlers (ni abrir otra vez el archivo)
+    if logger.handlers:
+        return logger
+
     # Crear directorio de logs si no existe
     log_dir = Path("logs")
     log_dir.mkdir(exist_ok=True)
@@ -41,8 +81,6 @@ def setup_logging(log_level: str = "INFO", log_file: str = "alfaia.log") -> logg
     console_handler.setFormatter(formatter)
 
     # Configurar logger
-    logger = logging.getLogger("AlfaIA")
-    logger.setLevel(getattr(logging, log_level.upper()))
     logger.addHandler(file_handler)
     logger.addHandler(console_handler)
 
@@ -86,11 +124,8 @@ def sanitize_text(text: str, max_length: int = None) -> str:
     if not isinstance(text, str):
         return ""
 
-    # Eliminar caracteres de control
-    sanitized = ''.join(char for char in text if ord(char) >= 32 or char in '\t\n\r')
-
-    # Recortar espacios
-    sanitized = sanitized.strip()
+    # Eliminar caracteres de control y recortar espacios
+    sanitized = text.translate(_CONTROL_CHARS_TABLE).strip()
 
     # Limitar longitud si se especifica
     if max_length and len(sanitized) > max_length:
@@ -126,7 +161,32 @@ def hash_data(data: str, salt: str = None) -> str:
     if salt:
         data = f"{data}{salt}"
 
-    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+    return _sha256(data.encode('utf-8')).hexdigest()
+
+
+def hash_data_many(items: Iterable[str], salt: str = None) -> List[str]:
+    """
+    Crear hashes SHA-256 de muchos datos (equivale a hash_data por elemento)
+
+    Args:
+        items: Datos a hashear
+        salt: Salt opcional, común a todos
+
+    Returns:
+        List[str]: Hashes hexadecimales en el mismo orden
+    """
+    salt_bytes = salt.encode('utf-8') if salt else b''
+    new_hash = _sha256
+    hashes = []
+    append = hashes.append
+
+    for item in items:
+        digest = new_hash(item.encode('utf-8'))
+        if salt_bytes:
+            digest.update(salt_bytes)
+        append(digest.hexdigest())
+
+    return hashes
 
 
 def format_time_duration(seconds: int) -> str:
@@ -142,24 +202,16 @@ def format_time_duration(seconds: int) -> str:
     if seconds < 60:
         return f"{seconds}s"
 
-    minutes = seconds // 60
-    remaining_seconds = seconds % 60
-
-    if minutes < 60:
-        if remaining_seconds > 0:
-            return f"{minutes}m {remaining_seconds}s"
-        return f"{minutes}m"
+    minutes, remaining_seconds = divmod(seconds, 60)
+    hours, remaining_minutes = divmod(minutes, 60)
 
-    hours = minutes // 60
-    remaining_minutes = minutes % 60
-
-    result = f"{hours}h"
-    if remaining_minutes > 0:
-        result += f" {remaining_minutes}m"
+    parts = [f"{hours}h"] if hours else []
+    if remaining_minutes or not hours:
+        parts.append(f"{remaining_minutes}m")
     if remaining_seconds > 0:
-        result += f" {remaining_seconds}s"
+        parts.append(f"{remaining_seconds}s")
 
-    return result
+    return ' '.join(parts)
 
 
 def calculate_percentage(part: Union[int, float], total: Union[int, float]) -> float:
@@ -226,17 +278,21 @@ def get_file_size_human(file_path: Union[str, Path]) -> str:
         str: Tamaño formateado (ej: "1.5 MB")
     """
     try:
-        size_bytes = Path(file_path).stat().st_size
+        size_bytes = os.stat(file_path).st_size
+    except (OSError, FileNotFoundError):
+        return "0 B"
 
-        for unit in ['B', 'KB', 'MB', 'GB', 'TB']:
-            if size_bytes < 1024.0:
-                return f"{size_bytes:.1f} {unit}"
-            size_bytes /= 1024.0
+    return _format_size(size_bytes)
 
-        return f"{size_bytes:.1f} PB"
 
-    except (OSError, FileNotFoundError):
-        return "0 B"
+_SIZE_UNITS = ('B', 'KB', 'MB', 'GB', 'TB', 'PB')
+
+
+def _format_size(size_bytes: int) -> str:
+    """Formatear un tamaño en bytes con la unidad adecuada"""
+    # Cada unidad son 10 bits: la longitud en bits da la unidad sin bucles
+    unit = min((size_bytes.bit_length() - 1) // 10, len(_SIZE_UNITS) - 1) if size_bytes > 0 else 0
+    return f"{size_bytes / (1 << (10 * unit)):.1f} {_SIZE_UNITS[unit]}"
 
 
 def ensure_directory(directory: Union[str, Path]) -> bool:
@@ -256,6 +312,31 @@ def ensure_directory(directory: Union[str, Path]) -> bool:
         return False
 
 
+def _loads_json_bytes(raw: bytes) -> Any:
+    """Decodificar JSON desde bytes UTF-8 (orjson si está disponible)"""
+    if ORJSON_AVAILABLE:
+        try:
+            return orjson.loads(raw)
+        except orjson.JSONDecodeError:
+            # json acepta extensiones que orjson rechaza (NaN, Infinity)
+            pass
+    return json.loads(raw.decode('utf-8'))
+
+
+def _dumps_json_bytes(data: Any, indent: Optional[int]) -> bytes:
+    """Serializar a JSON UTF-8 (orjson si está disponible y la indentación lo permite)"""
+    if ORJSON_AVAILABLE and indent in (None, 0, 2):
+        option = orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(data, option=option)
+        except TypeError:
+            # Tipos que orjson no admite (p. ej. enteros de más de 64 bits)
+            pass
+    return json.dumps(data, ensure_ascii=False, indent=indent or None).encode('utf-8')
+
+
 def load_json_file(file_path: Union[str, Path], default: Any = None) -> Any:
     """
     Cargar archivo JSON de forma segura
@@ -268,8 +349,9 @@ def load_json_file(file_path: Union[str, Path], default: Any = None) -> Any:
         Datos del JSON o valor por defecto
     """
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+        with open(file_path, 'rb') as f:
+            raw = f.read()
+        return _loads_json_bytes(raw)
     except (FileNotFoundError, json.JSONDecodeError, Exception):
         return default
 
@@ -290,8 +372,9 @@ def save_json_file(file_path: Union[str, Path], data: Any, indent: int = 2) -> b
         # Asegurar que el directorio padre existe
         ensure_directory(Path(file_path).parent)
 
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=indent)
+        payload = _dumps_json_bytes(data, indent)
+        with open(file_path, 'wb') as f:
+            f.write(payload)
         return True
     except Exception:
         return False
@@ -314,13 +397,20 @@ def merge_dicts(dict1: Dict, dict2: Dict, deep: bool = True) -> Dict:
         result.update(dict2)
         return result
 
+    # Recorrido iterativo: solo se copian los subdiccionarios que se fusionan
     result = dict1.copy()
-
-    for key, value in dict2.items():
-        if key in result and isinstance(result[key], dict) and isinstance(value, dict):
-            result[key] = merge_dicts(result[key], value, deep=True)
-        else:
-            result[key] = value
+    pending = [(result, dict2)]
+
+    while pending:
+        target, source = pending.pop()
+        for key, value in source.items():
+            current = target.get(key)
+            if isinstance(current, dict) and isinstance(value, dict):
+                merged = current.copy()
+                target[key] = merged
+                pending.append((merged, value))
+            else:
+                target[key] = value
 
     return result
 
@@ -381,13 +471,8 @@ def clean_filename(filename: str) -> str:
     Returns:
         str: Nombre de archivo limpio
     """
-    # Caracteres problemáticos en nombres de archivo
-    invalid_chars = '<>:"/\\|?*'
-
-    # Reemplazar caracteres inválidos con guiones bajos
-    cleaned = filename
-    for char in invalid_chars:
-        cleaned = cleaned.replace(char, '_')
+    # Reemplazar caracteres inválidos con guiones bajos (una sola pasada)
+    cleaned = filename.translate(_FILENAME_TABLE)
 
     # Eliminar espacios múltiples y reemplazar con guiones bajos
     cleaned = '_'.join(cleaned.split())
@@ -401,15 +486,20 @@ def clean_filename(filename: str) -> str:
 
 
 def retry_operation(operation, max_attempts: int = 3, delay: float = 1.0,
-                    backoff_factor: float = 2.0):
+                    backoff_factor: float = 2.0, max_delay: float = 30.0):
     """
-    Reintentar operación con backoff exponencial
+    Reintentar operación con backoff exponencial y jitter
+
+    Cada espera se elige al azar entre `delay` y la anterior por
+    `backoff_factor` (jitter decorrelacionado), para que varios clientes
+    fallando a la vez no reintenten sincronizados.
 
     Args:
         operation: Función a ejecutar
         max_attempts: Máximo número de intentos
         delay: Delay inicial en segundos
         backoff_factor: Factor de backoff
+        max_delay: Espera máxima entre intentos en segundos
 
     Returns:
         Resultado de la operación
@@ -427,9 +517,8 @@ def retry_operation(operation, max_attempts: int = 3, delay: float = 1.0,
             last_exception = e
 
             if attempt < max_attempts - 1:
-                import time
                 time.sleep(current_delay)
-                current_delay *= backoff_factor
+                current_delay = min(max_delay, random.uniform(delay, current_delay * backoff_factor))
 
     # Si llegamos aquí, todos los intentos fallaron
     raise last_exception
@@ -445,13 +534,10 @@ def validate_email_format(email: str) -> bool:
     Returns:
         bool: True si el formato es válido
     """
-    import re
-
     if not email or not isinstance(email, str):
         return False
 
-    pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}
-    return re.match(pattern, email.strip()) is not None
+    return _EMAIL_RE.match(email.strip()) is not None
 
 
 def truncate_text(text: str, max_length: int, suffix: str = "...") -> str:
@@ -482,14 +568,11 @@ def extract_numbers(text: str) -> List[float]:
     Returns:
         List[float]: Lista de números encontrados
     """
-    import re
-
     if not text:
         return []
 
-    # Patrón para números (enteros y decimales)
-    pattern = r'-?\d+\.?\d*'
-    matches = re.findall(pattern, text)
+    # Números enteros y decimales
+    matches = _NUM_RE.findall(text)
 
     numbers = []
     for match in matches:
@@ -523,19 +606,16 @@ def calculate_text_difficulty(text: str) -> Dict[str, Any]:
             'difficulty_level': 1
         }
 
-    import re
-
-    # Contar palabras
-    words = re.findall(r'\b\w+\b', text.lower())
+    # Contar palabras (no hace falta pasar a minúsculas para contarlas)
+    words = _WORD_RE.findall(text)
     word_count = len(words)
 
     # Contar oraciones (aproximado)
-    sentences = re.split(r'[.!?]+', text)
-    sentence_count = len([s for s in sentences if s.strip()])
+    sentence_count = sum(1 for s in _SENT_RE.split(text) if s and not s.isspace())
 
     # Calcular promedios
-    avg_words_per_sentence = safe_divide(word_count, sentence_count, 0)
-    avg_chars_per_word = safe_divide(sum(len(word) for word in words), word_count, 0)
+    avg_words_per_sentence = word_count / sentence_count if sentence_count else 0
+    avg_chars_per_word = sum(map(len, words)) / word_count if word_count else 0
 
     # Calcular nivel de dificultad básico (1-10)
     difficulty_level = 1
@@ -586,22 +666,13 @@ def generate_color_palette(base_color: str, variations: int = 5) -> List[str]:
         g = int(base_color[3:5], 16)
         b = int(base_color[5:7], 16)
 
-        colors = []
-
-        for i in range(variations):
-            # Calcular factor de variación
-            factor = 0.3 + (i * 0.4 / max(1, variations - 1))
-
-            # Aplicar variación
-            new_r = clamp(int(r * factor), 0, 255)
-            new_g = clamp(int(g * factor), 0, 255)
-            new_b = clamp(int(b * factor), 0, 255)
+        # El factor va de 0.3 a 0.7, así que cada canal queda siempre en 0-255
+        # y no hace falta limitarlo
+        step = 0.4 / max(1, variations - 1)
+        factors = [0.3 + i * step for i in range(variations)]
 
-            # Convertir de vuelta a hex
-            color_hex = f"#{new_r:02x}{new_g:02x}{new_b:02x}"
-            colors.append(color_hex)
-
-        return colors
+        return [f"#{int(r * factor):02x}{int(g * factor):02x}{int(b * factor):02x}"
+                for factor in factors]
 
     except ValueError:
         return [base_color] * variations
@@ -634,6 +705,19 @@ def format_score(score: Union[int, float], max_score: Union[int, float] = 100) -
     return f"{emoji} {score}/{max_score} ({percentage}%)"
 
 
+# Niveles de logro: (puntos requeridos, nombre, icono), ordenados por puntos
+_LEVELS = (
+    (0, "Principiante", "🌱"),
+    (100, "Aprendiz", "📚"),
+    (300, "Estudiante", "🎓"),
+    (600, "Competente", "⭐"),
+    (1000, "Experto", "🏆"),
+    (1500, "Maestro", "👑"),
+    (2500, "Leyenda", "🌟")
+)
+_LEVEL_POINTS = tuple(level[0] for level in _LEVELS)
+
+
 def get_achievement_level(points: int) -> Dict[str, Any]:
     """
     Determinar nivel de logro basado en puntos
@@ -644,26 +728,10 @@ def get_achievement_level(points: int) -> Dict[str, Any]:
     Returns:
         Dict con información del nivel
     """
-    levels = [
-        (0, "Principiante", "🌱"),
-        (100, "Aprendiz", "📚"),
-        (300, "Estudiante", "🎓"),
-        (600, "Competente", "⭐"),
-        (1000, "Experto", "🏆"),
-        (1500, "Maestro", "👑"),
-        (2500, "Leyenda", "🌟")
-    ]
-
-    current_level = levels[0]
-    next_level = None
-
-    for i, (required_points, name, icon) in enumerate(levels):
-        if points >= required_points:
-            current_level = (required_points, name, icon)
-            if i + 1 < len(levels):
-                next_level = levels[i + 1]
-        else:
-            break
+    index = bisect_right(_LEVEL_POINTS, points) - 1
+    current_level = _LEVELS[max(index, 0)]
+    # Con puntos negativos no se calcula progreso hacia el siguiente nivel
+    next_level = _LEVELS[index + 1] if 0 <= index < len(_LEVELS) - 1 else None
 
     # Calcular progreso hacia siguiente nivel
     if next_level:
@@ -672,8 +740,6 @@ def get_achievement_level(points: int) -> Dict[str, Any]:
         progress_percentage = calculate_percentage(points_progress, points_needed)
     else:
         progress_percentage = 100
-        points_needed = 0
-        points_progress = 0
 
     return {
         'current_level': current_level[1],
@@ -714,12 +780,15 @@ def compress_json_data(data: Any) -> str:
         str: Datos comprimidos en base64
     """
     import gzip
-    import base64
 
     try:
-        json_str = json.dumps(data, ensure_ascii=False)
-        compressed = gzip.compress(json_str.encode('utf-8'))
-        return base64.b64encode(compressed).decode('ascii')
+        # json.dump codifica por trozos directamente en el compresor: no se
+        # materializa el JSON completo antes de comprimir
+        buffer = io.BytesIO()
+        with gzip.GzipFile(fileobj=buffer, mode='wb', compresslevel=6) as gz:
+            with io.TextIOWrapper(gz, encoding='utf-8') as writer:
+                json.dump(data, writer, ensure_ascii=False)
+        return base64.b64encode(buffer.getbuffer()).decode('ascii')
     except Exception:
         return ""
 
@@ -735,7 +804,6 @@ def decompress_json_data(compressed_data: str) -> Any:
         Datos descomprimidos o None si hay error
     """
     import gzip
-    import base64
 
     try:
         compressed = base64.b64decode(compressed_data.encode('ascii'))
@@ -755,8 +823,6 @@ def validate_spanish_text(text: str) -> Dict[str, Any]:
     Returns:
         Dict con resultados de validación
     """
-    import re
-
     if not text:
         return {
             'is_valid': False,
@@ -769,8 +835,7 @@ def validate_spanish_text(text: str) -> Dict[str, Any]:
     warnings = []
 
     # Verificar caracteres básicos del español
-    spanish_pattern = r'^[a-zA-ZáéíóúÁÉÍÓÚñÑüÜ\s\d\.,;:¡!¿?\-\(\)\"\']+
-    if not re.match(spanish_pattern, text):
+    if not _SPANISH_RE.match(text):
         errors.append('Contiene caracteres no válidos para español')
 
     # Verificar longitud mínima y máxima
@@ -784,12 +849,12 @@ def validate_spanish_text(text: str) -> Dict[str, Any]:
         warnings.append('Contiene espacios múltiples')
 
     # Verificar puntuación básica
-    if text.strip() and not re.search(r'[.!?], text.strip()):
-    warnings.append('Falta puntuación final')
+    if text.strip() and not _FINAL_PUNCT_RE.search(text.strip()):
+        warnings.append('Falta puntuación final')
 
     # Calcular estadísticas
-    words = len(re.findall(r'\b\w+\b', text))
-    sentences = len(re.findall(r'[.!?]+', text))
+    words = len(_WORD_RE.findall(text))
+    sentences = len(_SENT_RE.findall(text))
 
     return {
         'is_valid': len(errors) == 0,
@@ -811,25 +876,25 @@ def timed_operation(func):
     """
     Decorador para medir tiempo de ejecución de funciones
 
+    El tiempo se registra a nivel DEBUG en el logger "AlfaIA".
+
     Args:
         func: Función a decorar
 
     Returns:
         Función decorada que mide tiempo
     """
-    import functools
-    import time
+    logger = logging.getLogger("AlfaIA")
+    perf_counter_ns = time.perf_counter_ns
 
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        start_time = time.time()
+        start_ns = perf_counter_ns()
         try:
-            result = func(*args, **kwargs)
-            return result
+            return func(*args, **kwargs)
         finally:
-            end_time = time.time()
-            duration = end_time - start_time
-            print(f"⏱️  {func.__name__} ejecutado en {duration:.3f}s")
+            logger.debug("⏱️  %s ejecutado en %.3f ms", func.__name__,
+                         (perf_counter_ns() - start_ns) / 1e6)
 
     return wrapper
 
@@ -847,16 +912,15 @@ def safe_operation(default_return=None, log_errors=True):
     """
 
     def decorator(func):
-        import functools
+        logger = logging.getLogger("AlfaIA") if log_errors else None
 
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
             try:
                 return func(*args, **kwargs)
             except Exception as e:
-                if log_errors:
-                    logger = logging.getLogger("AlfaIA")
-                    logger.error(f"Error en {func.__name__}: {str(e)}")
+                if logger is not None:
+                    logger.error("Error en %s: %s", func.__name__, e)
                 return default_return
 
         return wrapper
@@ -875,12 +939,13 @@ SPANISH_ACCENTS = {
     'n': 'ñ', 'N': 'Ñ', 'u': 'ü', 'U': 'Ü'
 }
 
-# Palabras comunes en español para validación
+# Palabras comunes en español para validación (conjuntos: se usan con `in`)
 COMMON_SPANISH_WORDS = {
-    'articles': ['el', 'la', 'los', 'las', 'un', 'una', 'unos', 'unas'],
-    'prepositions': ['a', 'ante', 'bajo', 'con', 'de', 'desde', 'en', 'entre', 'hacia', 'hasta', 'para', 'por', 'según',
-                     'sin', 'sobre', 'tras'],
-    'pronouns': ['yo', 'tú', 'él', 'ella', 'nosotros', 'vosotros', 'ellos', 'ellas', 'me', 'te', 'se', 'nos', 'os']
+    'articles': frozenset(['el', 'la', 'los', 'las', 'un', 'una', 'unos', 'unas']),
+    'prepositions': frozenset(['a', 'ante', 'bajo', 'con', 'de', 'desde', 'en', 'entre', 'hacia', 'hasta', 'para',
+                               'por', 'según', 'sin', 'sobre', 'tras']),
+    'pronouns': frozenset(['yo', 'tú', 'él', 'ella', 'nosotros', 'vosotros', 'ellos', 'ellas', 'me', 'te', 'se',
+                           'nos', 'os'])
 }
 
 # Niveles de dificultad estándar
@@ -940,16 +1005,19 @@ def cleanup_temp_files(max_age_hours: int = 24) -> int:
     if not temp_dir.exists():
         return 0
 
-    cutoff_time = datetime.now() - timedelta(hours=max_age_hours)
+    # Se comparan mtimes en bruto; scandir reutiliza el tipo de cada entrada
+    cutoff_time = time.time() - max_age_hours * 3600
     files_deleted = 0
 
     try:
-        for file_path in temp_dir.iterdir():
-            if file_path.is_file():
-                file_time = datetime.fromtimestamp(file_path.stat().st_mtime)
-                if file_time < cutoff_time:
-                    file_path.unlink()
-                    files_deleted += 1
+        with os.scandir(temp_dir) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file(follow_symlinks=False) and entry.stat().st_mtime < cutoff_time:
+                        os.unlink(entry.path)
+                        files_deleted += 1
+                except OSError:
+                    continue
     except Exception as e:
         logger = logging.getLogger("AlfaIA")
         logger.warning(f"Error limpiando archivos temporales: {e}")
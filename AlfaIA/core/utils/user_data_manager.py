@@ -2,129 +2,304 @@
 # AlfaIA/core/utils/user_data_manager.py - CON CONEXIÓN BD SEGURA
 # =============================================================================
 
-import sys
-from pathlib import Path
+import importlib.util
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from operator import attrgetter
 from datetime import datetime
-from typing import Optional, Dict, Any, List
+from types import MappingProxyType
+from weakref import WeakValueDictionary
+from typing import Optional, Dict, Any, Mapping, Sequence
 
-print("🔧 Inicializando user_data_manager con BD...")
+logger = logging.getLogger(__name__)
 
-# Imports seguros de BD con fallback
+logger.debug("🔧 Inicializando user_data_manager con BD...")
+
+# Los modelos de BD (ORM + driver MySQL) se importan bajo demanda; al cargar el
+# módulo solo se comprueba que existen, sin ejecutarlos
 try:
-    sys.path.append(str(Path(__file__).parent.parent.parent))
-    from core.database.models import PerfilUsuario
-
-    print("✅ Modelos de BD importados correctamente")
-    BD_AVAILABLE = True
-except ImportError as e:
-    print(f"⚠️ Error importando modelos de BD: {e}")
-    print("🔄 Funcionando sin BD por ahora")
+    BD_AVAILABLE = bool(__package__) and importlib.util.find_spec('..database.models', __package__) is not None
+except (ImportError, ValueError) as e:
+    logger.warning("⚠️ Error localizando modelos de BD: %s", e)
     BD_AVAILABLE = False
 
+if not BD_AVAILABLE:
+    logger.warning("🔄 Funcionando sin BD por ahora")
+
+
+class _PerfilUsuarioFallback:
+    """Clase fallback para cuando no hay BD"""
+
+    @classmethod
+    def find_by_user_id(cls, user_id):
+        return None
+
+
+_PU = None
+
+
+def _get_perfil_model():
+    """Clase PerfilUsuario, importada la primera vez que se necesita"""
+    global _PU
+    if _PU is None:
+        try:
+            from ..database.models import PerfilUsuario as _PU_
+            logger.debug("✅ Modelos de BD importados correctamente")
+        except ImportError as e:
+            logger.warning("⚠️ Error importando modelos de BD: %s", e)
+            _PU_ = _PerfilUsuarioFallback
+        _PU = _PU_
+    return _PU
+
+
+# =============================================================================
+# CACHÉ DE PERFILES
+# =============================================================================
+
+# Perfiles cargados por user_id, compartidos por los UserDataManager que se crean
+# para el mismo usuario. LRU acotada; se invalida tras cada escritura del perfil.
+# Cada llamador recibe una copia: sus cambios sin guardar no llegan a la caché.
+_PROFILE_CACHE_MAX_ENTRIES = 512
+_profile_cache: 'OrderedDict[int, Any]' = OrderedDict()
+# Cerrojo simple (sin reentrada): solo protege operaciones cortas sobre el dict
+_profile_cache_lock = threading.Lock()
+
+
+def _get_profile(user_id: int) -> Optional[Any]:
+    """
+    Perfil del usuario desde la caché o, si no está, desde la BD
+
+    La consulta se hace fuera del cerrojo: el ORM no comparte sesión entre hilos
+    (cada llamada saca su propia conexión del pool), así que los hilos solo
+    compiten por el acceso al dict, nunca por la espera de red. Se devuelve
+    siempre una copia del perfil cacheado.
+    """
+    with _profile_cache_lock:
+        profile = _profile_cache.get(user_id)
+        if profile is not None:
+            _profile_cache.move_to_end(user_id)
+            return profile.copy()
+
+    profile = _get_perfil_model().find_by_user_id(user_id)
+    if profile is None:
+        # No se cachea la ausencia: el perfil puede crearse después
+        return None
 
-    # Clase fallback para cuando no hay BD
-    class PerfilUsuario:
-        @classmethod
-        def find_by_user_id(cls, user_id):
-            return None
+    with _profile_cache_lock:
+        # Si otro hilo lo cargó mientras tanto, se usa el suyo
+        profile = _profile_cache.setdefault(user_id, profile)
+        _profile_cache.move_to_end(user_id)
+        while len(_profile_cache) > _PROFILE_CACHE_MAX_ENTRIES:
+            _profile_cache.popitem(last=False)
+    return profile.copy()
+
+
+def invalidate_profile(user_id: int) -> None:
+    """Descartar el perfil cacheado del usuario"""
+    with _profile_cache_lock:
+        _profile_cache.pop(user_id, None)
+
+
+# Contadores del perfil que el gestor copia a sus propios atributos, en el orden
+# points, streak, exercises, time, goal
+_read_profile_counters = attrgetter('puntos_totales', 'racha_dias_consecutivos', 'ejercicios_completados',
+                                    'tiempo_total_minutos', 'objetivo_diario_ejercicios')
+
+
+@lru_cache(maxsize=256)
+def _fmt_time(minutes: int) -> str:
+    """
+    Formatear minutos de estudio ("45 min", "2h 5m", "3h")
+
+    Los valores se repiten en cada refresco del dashboard, así que se cachean;
+    lru_cache es seguro entre hilos en CPython.
+    """
+    if minutes < 60:
+        return f"{minutes} min"
+    hours, remaining = divmod(minutes, 60)
+    return f"{hours}h {remaining}m" if remaining else f"{hours}h"
+
+
+@lru_cache(maxsize=1024)
+def _achievement_for(points: int) -> Mapping[str, Any]:
+    """Nivel de logro (solo lectura) para una cantidad de puntos"""
+    return MappingProxyType({
+        'current_level': 'Principiante',
+        'current_icon': '🌱',
+        'current_description': 'Empezando el viaje',
+        'total_points': points,
+        'next_level': 'Aprendiz',
+        'points_to_next': 100 - points,
+        'progress_percentage': min(100, points)
+    })
+
+
+# =============================================================================
+# DATOS DE RESPALDO (solo lectura, compartidos)
+# =============================================================================
+
+_FALLBACK_STATS = tuple(MappingProxyType(card) for card in (
+    {'title': 'Nivel', 'value': 'Principiante', 'icon': '🎓', 'color': '#4A90E2',
+     'description': 'Nivel actual'},
+    {'title': 'Meta', 'value': '0 / 5', 'icon': '📝', 'color': '#7ED321', 'description': 'Ejercicios hoy'},
+    {'title': 'Racha', 'value': '0 días', 'icon': '🔥', 'color': '#F5A623', 'description': 'Días seguidos'},
+    {'title': 'Puntos', 'value': '0', 'icon': '⭐', 'color': '#FFD700', 'description': 'Puntos totales'},
+    {'title': 'Ejercicios', 'value': '0', 'icon': '🏆', 'color': '#9013FE', 'description': 'Completados'},
+    {'title': 'Tiempo', 'value': '0 min', 'icon': '⏱️', 'color': '#FF6B6B', 'description': 'Tiempo estudio'}
+))
+
+_FALLBACK_DAILY = MappingProxyType({
+    'completed': 0,
+    'goal': 5,
+    'percentage': 0.0,
+    'remaining': 5
+})
+
+_FALLBACK_ACHIEVEMENT = MappingProxyType({
+    'current_level': 'Principiante',
+    'current_icon': '🌱',
+    'current_description': 'Empezando',
+    'total_points': 0,
+    'next_level': 'Aprendiz',
+    'points_to_next': 100,
+    'progress_percentage': 0
+})
 
 
 class UserDataManager:
     """
     Gestor de datos de usuario CON conexión a BD segura
+
+    Los contadores del perfil se copian a atributos propios al cargar o
+    modificar el perfil, así los getters del dashboard solo leen un atributo.
     """
 
+    __slots__ = ('user', 'profile', 'bd_available',
+                 '_nombre', '_apellido', '_email', '_nivel',
+                 '_points', '_streak', '_exercises', '_time', '_goal',
+                 '_version', '_stats_cache', '__weakref__')
+
     def __init__(self, user):
         """Inicializar con usuario y cargar de BD de forma segura"""
-        print(f"📊 Creando UserDataManager para: {type(user).__name__}")
+        logger.debug("📊 Creando UserDataManager para: %s", type(user).__name__)
 
         self.user = user
         self.profile = None
         self.bd_available = BD_AVAILABLE
 
-        # Datos por defecto
-        self._default_data = {
-            'nombre': 'Usuario',
-            'apellido': 'Demo',
-            'email': 'demo@alfaia.com',
-            'nivel': 'Principiante',
-            'puntos': 0,
-            'racha': 0,
-            'ejercicios': 0,
-            'tiempo': 0,
-            'meta_diaria': 5
-        }
+        # Datos del usuario leídos una sola vez (ver refresh_user)
+        self._read_user_attributes()
+
+        # Datos por defecto (se sustituyen por los del perfil al cargarlo)
+        self._points = 0
+        self._streak = 0
+        self._exercises = 0
+        self._time = 0
+        self._goal = 5
+
+        # Tarjetas del dashboard ya construidas; se descartan al cambiar los datos
+        self._version = 0
+        self._stats_cache = None
 
         # Cargar perfil de BD si está disponible
         self._load_profile_safe()
 
-        print(f"✅ UserDataManager inicializado (BD: {'✅' if self.bd_available else '❌'})")
+        logger.debug("✅ UserDataManager inicializado (BD: %s)", '✅' if self.bd_available else '❌')
 
     def _load_profile_safe(self):
         """Cargar perfil de BD de forma segura"""
         if not self.bd_available:
-            print("⚠️ BD no disponible, usando datos por defecto")
+            logger.debug("⚠️ BD no disponible, usando datos por defecto")
             return
 
         try:
             if hasattr(self.user, 'id') and self.user.id:
-                print(f"🔍 Cargando perfil desde BD para user_id: {self.user.id}")
-                self.profile = PerfilUsuario.find_by_user_id(self.user.id)
+                logger.debug("🔍 Cargando perfil desde BD para user_id: %s", self.user.id)
+                self.profile = _get_profile(self.user.id)
 
                 if self.profile:
-                    print("✅ Perfil cargado desde BD exitosamente")
+                    logger.debug("✅ Perfil cargado desde BD exitosamente")
                     self._update_defaults_from_profile()
                 else:
-                    print("⚠️ No se encontró perfil en BD, usando defaults")
+                    logger.debug("⚠️ No se encontró perfil en BD, usando defaults")
             else:
-                print("⚠️ Usuario sin ID válido")
+                logger.debug("⚠️ Usuario sin ID válido")
         except Exception as e:
-            print(f"❌ Error cargando perfil de BD: {e}")
+            logger.error("❌ Error cargando perfil de BD: %s", e, exc_info=True)
             self.profile = None
 
+    def _invalidate_stats(self):
+        """Marcar como obsoletos los datos derivados (tarjetas del dashboard)"""
+        self._version += 1
+        self._stats_cache = None
+
     def _update_defaults_from_profile(self):
         """Actualizar datos por defecto con los del perfil de BD"""
         if not self.profile:
             return
 
-        try:
-            # Actualizar con datos reales de BD
-            if hasattr(self.profile, 'puntos_totales'):
-                self._default_data['puntos'] = self.profile.puntos_totales
+        self._invalidate_stats()
 
-            if hasattr(self.profile, 'racha_dias_consecutivos'):
-                self._default_data['racha'] = self.profile.racha_dias_consecutivos
-
-            if hasattr(self.profile, 'ejercicios_completados'):
-                self._default_data['ejercicios'] = self.profile.ejercicios_completados
-
-            if hasattr(self.profile, 'tiempo_total_minutos'):
-                self._default_data['tiempo'] = self.profile.tiempo_total_minutos
-
-            if hasattr(self.profile, 'objetivo_diario_ejercicios'):
-                self._default_data['meta_diaria'] = self.profile.objetivo_diario_ejercicios
-
-            print("✅ Datos actualizados desde perfil de BD")
+        try:
+            # Actualizar con datos reales de BD (una sola lectura de los contadores)
+            try:
+                (self._points, self._streak, self._exercises,
+                 self._time, self._goal) = _read_profile_counters(self.profile)
+            except AttributeError:
+                # Perfil incompleto: conservar el valor actual de lo que falte
+                self._points = getattr(self.profile, 'puntos_totales', self._points)
+                self._streak = getattr(self.profile, 'racha_dias_consecutivos', self._streak)
+                self._exercises = getattr(self.profile, 'ejercicios_completados', self._exercises)
+                self._time = getattr(self.profile, 'tiempo_total_minutos', self._time)
+                self._goal = getattr(self.profile, 'objetivo_diario_ejercicios', self._goal)
+
+            logger.debug("✅ Datos actualizados desde perfil de BD")
         except Exception as e:
-            print(f"❌ Error actualizando datos desde perfil: {e}")
+            logger.error("❌ Error actualizando datos desde perfil: %s", e, exc_info=True)
 
     def refresh_from_database(self):
         """Refrescar datos desde BD"""
         if self.bd_available:
-            print("🔄 Refrescando datos desde BD...")
+            logger.debug("🔄 Refrescando datos desde BD...")
+            self._invalidate_stats()
+            if getattr(self.user, 'id', None):
+                invalidate_profile(self.user.id)
             self._load_profile_safe()
         else:
-            print("⚠️ BD no disponible para refresh")
+            logger.debug("⚠️ BD no disponible para refresh")
+
+    def _read_user_attributes(self):
+        """Copiar nombre, apellido, email y nivel del usuario con sus valores por defecto"""
+        user = self.user
+
+        def read(attr_name: str, default_value: Any) -> Any:
+            try:
+                value = getattr(user, attr_name, None) if user else None
+            except Exception:
+                value = None
+            return value if value is not None else default_value
+
+        self._nombre = read('nombre', 'Usuario')
+        self._apellido = read('apellido', '')
+        self._email = read('email', 'demo@alfaia.com')
+
+        # nivel_inicial puede ser un enum (se usa su valor) o un string directo
+        nivel_inicial = read('nivel_inicial', None)
+        if nivel_inicial and hasattr(nivel_inicial, 'value'):
+            self._nivel = nivel_inicial.value
+        elif nivel_inicial and isinstance(nivel_inicial, str):
+            self._nivel = nivel_inicial
+        else:
+            self._nivel = "Principiante"
 
-    def _safe_get_attr(self, attr_name: str, default_value: Any = None):
-        """Obtener atributo de usuario de forma ultra segura"""
-        try:
-            if self.user and hasattr(self.user, attr_name):
-                value = getattr(self.user, attr_name, default_value)
-                return value if value is not None else default_value
-            return default_value
-        except Exception:
-            return default_value
+    def refresh_user(self, user=None):
+        """Volver a leer los datos del usuario (opcionalmente sustituyéndolo)"""
+        if user is not None:
+            self.user = user
+        self._read_user_attributes()
+        self._invalidate_stats()
 
     # =============================================================================
     # MÉTODOS BÁSICOS - ULTRA SEGUROS
@@ -132,129 +307,92 @@ class UserDataManager:
 
     def get_display_name(self) -> str:
         """Nombre completo para mostrar"""
-        try:
-            nombre = self._safe_get_attr('nombre', 'Usuario')
-            apellido = self._safe_get_attr('apellido', '')
-
-            if apellido:
-                return f"{nombre} {apellido}"
-            return nombre
-        except Exception:
-            return "Usuario Demo"
+        if self._apellido:
+            return f"{self._nombre} {self._apellido}"
+        return self._nombre
 
     def get_first_name(self) -> str:
         """Solo el primer nombre"""
-        try:
-            return self._safe_get_attr('nombre', 'Usuario')
-        except Exception:
-            return "Usuario"
+        return self._nombre
 
     def get_email(self) -> str:
         """Email del usuario"""
-        try:
-            return self._safe_get_attr('email', 'demo@alfaia.com')
-        except Exception:
-            return "demo@alfaia.com"
+        return self._email
 
     def get_level(self) -> str:
         """Nivel actual del usuario"""
-        try:
-            # Intentar desde nivel_inicial del usuario
-            nivel_inicial = self._safe_get_attr('nivel_inicial', None)
-
-            if nivel_inicial:
-                # Si es un enum, obtener el valor
-                if hasattr(nivel_inicial, 'value'):
-                    return nivel_inicial.value
-                # Si es string directo
-                if isinstance(nivel_inicial, str):
-                    return nivel_inicial
-
-            return "Principiante"
-        except Exception:
-            return "Principiante"
+        return self._nivel
 
     def get_total_points(self) -> int:
         """Puntos totales acumulados"""
-        # Primero intentar desde BD, luego fallback
-        if self.profile and hasattr(self.profile, 'puntos_totales'):
-            return self.profile.puntos_totales
-        return self._default_data['puntos']
+        return self._points
 
     def get_streak(self) -> int:
         """Racha de días consecutivos"""
-        if self.profile and hasattr(self.profile, 'racha_dias_consecutivos'):
-            return self.profile.racha_dias_consecutivos
-        return self._default_data['racha']
+        return self._streak
 
     def get_completed_exercises(self) -> int:
         """Ejercicios completados"""
-        if self.profile and hasattr(self.profile, 'ejercicios_completados'):
-            return self.profile.ejercicios_completados
-        return self._default_data['ejercicios']
+        return self._exercises
 
     def get_study_time(self) -> int:
         """Tiempo de estudio en minutos"""
-        if self.profile and hasattr(self.profile, 'tiempo_total_minutos'):
-            return self.profile.tiempo_total_minutos
-        return self._default_data['tiempo']
+        return self._time
 
     def get_daily_goal(self) -> int:
         """Meta diaria de ejercicios"""
-        if self.profile and hasattr(self.profile, 'objetivo_diario_ejercicios'):
-            return self.profile.objetivo_diario_ejercicios
-        return self._default_data['meta_diaria']
+        return self._goal
 
     def get_study_time_formatted(self) -> str:
         """Tiempo de estudio formateado"""
-        minutes = self.get_study_time()
-        if minutes < 60:
-            return f"{minutes} min"
-        hours = minutes // 60
-        remaining = minutes % 60
-        if remaining > 0:
-            return f"{hours}h {remaining}m"
-        return f"{hours}h"
+        return _fmt_time(self._time)
 
     # =============================================================================
     # MÉTODOS PARA EL DASHBOARD
     # =============================================================================
 
-    def get_stats_cards_data(self) -> List[Dict[str, Any]]:
-        """Datos para las tarjetas de estadísticas del dashboard"""
+    def get_stats_cards_data(self) -> Sequence[Mapping[str, Any]]:
+        """Datos para las tarjetas de estadísticas del dashboard
+
+        Se construyen una vez y se reutilizan (solo lectura) hasta que cambian
+        los datos del usuario.
+        """
+        if self._stats_cache is not None:
+            return self._stats_cache
+
         try:
-            return [
+            cards = [
                 {
                     'title': 'Nivel Actual',
-                    'value': self.get_level(),
+                    'value': self._nivel,
                     'icon': '🎓',
                     'color': '#4A90E2',
                     'description': 'Tu nivel de español'
                 },
                 {
                     'title': 'Meta Diaria',
-                    'value': f"0 / {self.get_daily_goal()}",
+                    'value': f"0 / {self._goal}",
                     'icon': '📝',
                     'color': '#7ED321',
                     'description': 'Ejercicios de hoy'
                 },
                 {
                     'title': 'Racha',
-                    'value': f"{self.get_streak()} días",
+                    'value': f"{self._streak} días",
                     'icon': '🔥',
                     'color': '#F5A623',
                     'description': 'Días consecutivos'
                 },
                 {
                     'title': 'Puntos',
-                    'value': f"{self.get_total_points():,}",
+                    'value': f"{self._points:,}",
                     'icon': '⭐',
                     'color': '#FFD700',
                     'description': 'Puntos acumulados'
                 },
                 {
                     'title': 'Ejercicios',
-                    'value': f"{self.get_completed_exercises():,}",
+                    'value': f"{self._exercises:,}",
                     'icon': '🏆',
                     'color': '#9013FE',
                     'description': 'Completados'
@@ -267,23 +405,17 @@ class UserDataManager:
                     'description': 'Tiempo de estudio'
                 }
             ]
+            self._stats_cache = tuple(MappingProxyType(card) for card in cards)
+            return self._stats_cache
         except Exception:
             # Fallback ultra seguro
-            return [
-                {'title': 'Nivel', 'value': 'Principiante', 'icon': '🎓', 'color': '#4A90E2',
-                 'description': 'Nivel actual'},
-                {'title': 'Meta', 'value': '0 / 5', 'icon': '📝', 'color': '#7ED321', 'description': 'Ejercicios hoy'},
-                {'title': 'Racha', 'value': '0 días', 'icon': '🔥', 'color': '#F5A623', 'description': 'Días seguidos'},
-                {'title': 'Puntos', 'value': '0', 'icon': '⭐', 'color': '#FFD700', 'description': 'Puntos totales'},
-                {'title': 'Ejercicios', 'value': '0', 'icon': '🏆', 'color': '#9013FE', 'description': 'Completados'},
-                {'title': 'Tiempo', 'value': '0 min', 'icon': '⏱️', 'color': '#FF6B6B', 'description': 'Tiempo estudio'}
-            ]
+            return _FALLBACK_STATS
 
-    def get_daily_progress(self) -> Dict[str, Any]:
+    def get_daily_progress(self) -> Mapping[str, Any]:
         """Progreso del día actual"""
         try:
             completed_today = 0
-            goal = self.get_daily_goal()
+            goal = self._goal
 
             return {
                 'completed': completed_today,
@@ -292,37 +424,14 @@ class UserDataManager:
                 'remaining': goal
             }
         except Exception:
-            return {
-                'completed': 0,
-                'goal': 5,
-                'percentage': 0.0,
-                'remaining': 5
-            }
+            return _FALLBACK_DAILY
 
-    def get_achievement_level(self) -> Dict[str, Any]:
+    def get_achievement_level(self) -> Mapping[str, Any]:
         """Nivel de logro basado en puntos"""
         try:
-            points = self.get_total_points()
-
-            return {
-                'current_level': 'Principiante',
-                'current_icon': '🌱',
-                'current_description': 'Empezando el viaje',
-                'total_points': points,
-                'next_level': 'Aprendiz',
-                'points_to_next': 100 - points,
-                'progress_percentage': min(100, points)
-            }
+            return _achievement_for(self._points)
         except Exception:
-            return {
-                'current_level': 'Principiante',
-                'current_icon': '🌱',
-                'current_description': 'Empezando',
-                'total_points': 0,
-                'next_level': 'Aprendiz',
-                'points_to_next': 100,
-                'progress_percentage': 0
-            }
+            return _FALLBACK_ACHIEVEMENT
 
     # =============================================================================
     # MÉTODOS DE ACTUALIZACIÓN DE BD
@@ -338,36 +447,33 @@ class UserDataManager:
             points_earned: Puntos ganados
         """
         if not self.bd_available or not self.profile:
-            print("⚠️ BD no disponible o perfil no cargado")
+            logger.debug("⚠️ BD no disponible o perfil no cargado")
             # Actualizar al menos los datos locales
-            self._default_data['ejercicios'] += exercises_completed
-            self._default_data['tiempo'] += time_spent
-            self._default_data['puntos'] += points_earned
+            self._exercises += exercises_completed
+            self._time += time_spent
+            self._points += points_earned
+            self._invalidate_stats()
             return False
 
         try:
-            # Actualizar perfil
-            self.profile.ejercicios_completados += exercises_completed
-            self.profile.tiempo_total_minutos += time_spent
-            self.profile.puntos_totales += points_earned
-            self.profile.experiencia_total += points_earned
-
             # Verificar meta diaria para racha
-            if exercises_completed >= self.get_daily_goal():
-                self.profile.racha_dias_consecutivos += 1
+            streak_delta = 1 if exercises_completed >= self._goal else 0
 
-            # Guardar en BD
-            if self.profile.save():
-                print(
-                    f"✅ Progreso guardado en BD: +{exercises_completed} ejercicios, +{time_spent}min, +{points_earned}pts")
-                self._update_defaults_from_profile()  # Actualizar cache local
-                return True
-            else:
-                print("❌ Error guardando en BD")
+            # La BD suma los incrementos en un único UPDATE (sin leer-modificar-guardar)
+            if not _get_perfil_model().increment_counters(self.profile.user_id, exercises_completed, time_spent,
+                                                           points_earned, streak_delta):
+                logger.error("❌ Error guardando en BD")
                 return False
 
+            self.profile.apply_counter_deltas(exercises_completed, time_spent, points_earned, streak_delta)
+            invalidate_profile(self.profile.user_id)
+            self._update_defaults_from_profile()  # Actualizar cache local
+            logger.debug("✅ Progreso guardado en BD: +%s ejercicios, +%smin, +%spts",
+                         exercises_completed, time_spent, points_earned)
+            return True
+
         except Exception as e:
-            print(f"❌ Error actualizando progreso en BD: {e}")
+            logger.error("❌ Error actualizando progreso en BD: %s", e, exc_info=True)
             return False
 
     def create_profile_if_missing(self) -> bool:
@@ -380,13 +486,13 @@ class UserDataManager:
                 return True  # Ya existe
 
             if not hasattr(self.user, 'id') or not self.user.id:
-                print("❌ Usuario sin ID, no se puede crear perfil")
+                logger.error("❌ Usuario sin ID, no se puede crear perfil")
                 return False
 
             # Crear nuevo perfil
-            from core.database.models import PerfilUsuario, EstiloAprendizaje
+            from ..database.models import EstiloAprendizaje
 
-            new_profile = PerfilUsuario(
+            new_profile = _get_perfil_model()(
                 user_id=self.user.id,
                 nivel_lectura=1,
                 nivel_gramatica=1,
@@ -408,49 +514,57 @@ class UserDataManager:
             )
 
             if new_profile.save():
+                invalidate_profile(self.user.id)
                 self.profile = new_profile
-                print(f"✅ Perfil creado en BD para user_id: {self.user.id}")
+                self._update_defaults_from_profile()
+                logger.debug("✅ Perfil creado en BD para user_id: %s", self.user.id)
                 return True
             else:
-                print("❌ Error guardando nuevo perfil")
+                logger.error("❌ Error guardando nuevo perfil")
                 return False
 
         except Exception as e:
-            print(f"❌ Error creando perfil: {e}")
+            logger.error("❌ Error creando perfil: %s", e, exc_info=True)
             return False
 
     def update_daily_goal(self, new_goal: int) -> bool:
         """Actualizar meta diaria"""
         if not self.bd_available or not self.profile:
-            self._default_data['meta_diaria'] = new_goal
+            self._goal = new_goal
+            self._invalidate_stats()
             return False
 
         try:
             self.profile.objetivo_diario_ejercicios = new_goal
+            self._goal = new_goal
+            self._invalidate_stats()
             if self.profile.save():
-                self._default_data['meta_diaria'] = new_goal
-                print(f"✅ Meta diaria actualizada a {new_goal}")
+                invalidate_profile(self.profile.user_id)
+                logger.debug("✅ Meta diaria actualizada a %s", new_goal)
                 return True
             return False
         except Exception as e:
-            print(f"❌ Error actualizando meta diaria: {e}")
+            logger.error("❌ Error actualizando meta diaria: %s", e, exc_info=True)
             return False
 
     def reset_streak(self) -> bool:
         """Resetear racha (cuando se pierde)"""
         if not self.bd_available or not self.profile:
-            self._default_data['racha'] = 0
+            self._streak = 0
+            self._invalidate_stats()
             return False
 
         try:
             self.profile.racha_dias_consecutivos = 0
+            self._streak = 0
+            self._invalidate_stats()
             if self.profile.save():
-                self._default_data['racha'] = 0
-                print("📉 Racha reseteada")
+                invalidate_profile(self.profile.user_id)
+                logger.debug("📉 Racha reseteada")
                 return True
             return False
         except Exception as e:
-            print(f"❌ Error reseteando racha: {e}")
+            logger.error("❌ Error reseteando racha: %s", e, exc_info=True)
             return False
 
     def is_valid(self) -> bool:
@@ -459,7 +573,7 @@ class UserDataManager:
             return (
                     self.user is not None and
                     self.get_display_name() != "" and
-                    self.get_email() != ""
+                    self._email != ""
             )
         except Exception:
             return False
@@ -470,15 +584,15 @@ class UserDataManager:
             return {
                 'user_info': {
                     'name': self.get_display_name(),
-                    'email': self.get_email(),
-                    'level': self.get_level()
+                    'email': self._email,
+                    'level': self._nivel
                 },
                 'progress': {
-                    'points': self.get_total_points(),
-                    'streak': self.get_streak(),
-                    'exercises': self.get_completed_exercises(),
-                    'study_time': self.get_study_time(),
-                    'daily_goal': self.get_daily_goal()
+                    'points': self._points,
+                    'streak': self._streak,
+                    'exercises': self._exercises,
+                    'study_time': self._time,
+                    'daily_goal': self._goal
                 },
                 'valid': self.is_valid()
             }
@@ -502,7 +616,7 @@ class UserDataManager:
     def __str__(self) -> str:
         """Representación string"""
         try:
-            return f"UserDataManager({self.get_display_name()}, {self.get_level()})"
+            return f"UserDataManager({self.get_display_name()}, {self._nivel})"
         except Exception:
             return "UserDataManager(Error)"
 
@@ -514,6 +628,46 @@ class UserDataManager:
             return "UserDataManager(error=True)"
 
 
+# =============================================================================
+# REGISTRO DE GESTORES POR USUARIO
+# =============================================================================
+
+# Un gestor vivo por user_id, compartido por las ventanas que lo usan; se libera
+# solo cuando nadie mantiene ya una referencia.
+_manager_registry: 'WeakValueDictionary[int, UserDataManager]' = WeakValueDictionary()
+_manager_registry_lock = threading.Lock()
+
+
+def get_user_data_manager(user) -> UserDataManager:
+    """Gestor compartido del usuario (se crea y registra si no existe)"""
+    user_id = getattr(user, 'id', None)
+    if not user_id:
+        # Sin ID no hay clave para compartirlo
+        return UserDataManager(user)
+
+    with _manager_registry_lock:
+        manager = _manager_registry.get(user_id)
+        if manager is not None:
+            if manager.user is not user:
+                manager.refresh_user(user)
+            return manager
+
+    # Se construye fuera del cerrojo (carga el perfil de la BD) para no hacer
+    # esperar a los demás usuarios; si otro hilo se adelanta, se usa el suyo
+    created = UserDataManager(user)
+    with _manager_registry_lock:
+        manager = _manager_registry.setdefault(user_id, created)
+        if manager is not created and manager.user is not user:
+            manager.refresh_user(user)
+        return manager
+
+
+def release_user_data_manager(user_id) -> None:
+    """Quitar del registro el gestor del usuario (p. ej. al cerrar sesión)"""
+    with _manager_registry_lock:
+        _manager_registry.pop(user_id, None)
+
+
 # =============================================================================
 # FUNCIÓN DE UTILIDAD
 # =============================================================================
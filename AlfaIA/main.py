@@ -6,7 +6,7 @@ import sys
 import logging
 from pathlib import Path
 from PyQt6.QtWidgets import QApplication, QMessageBox, QSplashScreen
-from PyQt6.QtCore import QTimer, Qt
+from PyQt6.QtCore import QTimer, Qt, QThreadPool
 from PyQt6.QtGui import QPixmap, QColor
 try:
     from modules.exercises.exercises_main_widget import ExercisesMainWidget
@@ -66,6 +66,8 @@ class SimpleAlfaIAApplication:
             print("🔧 Inicializando PyQt6...")
             self.app = QApplication(sys.argv)
             self.app.setApplicationName("AlfaIA")
+            # Pool compartido por las tareas en segundo plano (autenticación, etc.)
+            QThreadPool.globalInstance().setMaxThreadCount(4)
             print("✅ PyQt6 inicializado")
             return True
         except Exception as e:
@@ -77,11 +79,20 @@ class SimpleAlfaIAApplication:
         try:
             print("🗄️ Inicializando BD...")
             db_manager = DatabaseManager()
+            db_manager.warmup()
 
             if not db_manager.test_connection():
                 print("❌ No se pudo conectar a BD")
                 return False
 
+            # Los modelos escriben ids de catálogo: no arrancar sobre columnas ENUM antiguas
+            if not db_manager.migrate_lookup_columns():
+                print("❌ No se pudieron migrar las columnas de catálogo")
+                return False
+
+            if not db_manager.migrate_indexes():
+                print("⚠️ Faltan índices por migrar (ver log); se continúa sin ellos")
+
             print("✅ BD inicializada")
             return True
         except Exception as e:
@@ -178,6 +189,7 @@ class SimpleAlfaIAApplication:
                 self.main_window.close()
             if self.login_window:
                 self.login_window.close()
+            DatabaseManager().stop_keepalive()
         except Exception as e:
             print(f"⚠️ Error en limpieza: {e}")
 
@@ -14,8 +14,11 @@ from pathlib import Path
 sys.path.append(str(Path(__file__).parent.parent.parent))
 
 try:
-    from core.database.connection import DatabaseManager
-    from core.database.models import Usuario
+    from core.database.connection import DatabaseManager, LOOKUP_TABLES
+    from core.database.models import Usuario, _loads_json
+
+    # ejercicios.tipo guarda el id de tipos_ejercicio (posición del nombre, desde 1)
+    TIPO_IDS = {nombre: index for index, nombre in enumerate(LOOKUP_TABLES["tipos_ejercicio"], start=1)}
 
     print("✅ Dependencias de base de datos importadas")
 except ImportError as e:
@@ -23,6 +26,19 @@ except ImportError as e:
     DatabaseManager = None
 
 
+# Columnas en el orden que espera _parse_exercise_row; el tipo se devuelve por nombre
+EXERCISE_SELECT = """
+                  SELECT e.id, t.nombre AS tipo, e.titulo, e.instrucciones,
+                         e.contenido_json, e.respuestas_correctas_json, e.explicaciones_json,
+                         e.categoria_id, e.nivel_dificultad, e.puntos_maximos,
+                         e.tiempo_limite_segundos, e.pistas_json, e.activo,
+                         c.nombre AS categoria_nombre, c.color_hex
+                  FROM ejercicios e
+                           JOIN tipos_ejercicio t ON t.id = e.tipo
+                           LEFT JOIN categorias c ON e.categoria_id = c.id
+                  """
+
+
 class TipoEjercicio(Enum):
     """Tipos de ejercicios disponibles"""
     COMPLETAR_PALABRA = "Completar_Palabra"
@@ -64,17 +80,14 @@ class ExercisesManager:
                 print("⚠️ BD no disponible, retornando ejercicios demo")
                 return self._get_demo_exercises(tipo, limite)
 
-            query = """
-                    SELECT e.*, c.nombre as categoria_nombre, c.color_hex
-                    FROM ejercicios e
-                             LEFT JOIN categorias c ON e.categoria_id = c.id
+            query = EXERCISE_SELECT + """
                     WHERE e.tipo = %s \
                       AND e.activo = TRUE
                     ORDER BY e.nivel_dificultad, RAND()
                     LIMIT %s \
                     """
 
-            results = self.db_manager.execute_query(query, (tipo.value, limite))
+            results = self.db_manager.execute_query(query, (TIPO_IDS[tipo.value], limite))
 
             if results:
                 exercises = []
@@ -98,10 +111,7 @@ class ExercisesManager:
             if not self.db_manager:
                 return self._get_demo_exercises_by_level(nivel, limite)
 
-            query = """
-                    SELECT e.*, c.nombre as categoria_nombre, c.color_hex
-                    FROM ejercicios e
-                             LEFT JOIN categorias c ON e.categoria_id = c.id
+            query = EXERCISE_SELECT + """
                     WHERE e.nivel_dificultad = %s \
                       AND e.activo = TRUE
                     ORDER BY RAND()
@@ -135,10 +145,7 @@ class ExercisesManager:
             if not self.db_manager:
                 return self._get_demo_random_exercise(user_level)
 
-            query = """
-                    SELECT e.*, c.nombre as categoria_nombre, c.color_hex
-                    FROM ejercicios e
-                             LEFT JOIN categorias c ON e.categoria_id = c.id
+            query = EXERCISE_SELECT + """
                     WHERE e.nivel_dificultad BETWEEN %s AND %s
                       AND e.activo = TRUE
                     ORDER BY RAND()
@@ -233,10 +240,10 @@ class ExercisesManager:
     def _parse_exercise_row(self, row: tuple) -> Dict[str, Any]:
         """Parsear fila de ejercicio de la BD"""
         try:
-            contenido = json.loads(row[4]) if row[4] else {}
-            respuestas = json.loads(row[5]) if row[5] else {}
-            explicaciones = json.loads(row[6]) if row[6] else {}
-            pistas = json.loads(row[12]) if row[12] else {}
+            contenido = _loads_json(row[4]) if row[4] else {}
+            respuestas = _loads_json(row[5]) if row[5] else {}
+            explicaciones = _loads_json(row[6]) if row[6] else {}
+            pistas = _loads_json(row[11]) if row[11] else {}
 
             return {
                 'id': row[0],
@@ -251,9 +258,9 @@ class ExercisesManager:
                 'puntos_maximos': row[9],
                 'tiempo_limite': row[10],
                 'pistas': pistas,
-                'activo': row[11],
-                'categoria_nombre': row[14] if len(row) > 14 else "General",
-                'categoria_color': row[15] if len(row) > 15 else "#4A90E2"
+                'activo': row[12],
+                'categoria_nombre': row[13] or "General",
+                'categoria_color': row[14] or "#4A90E2"
             }
         except Exception as e:
             print(f"❌ Error parseando ejercicio: {e}")
@@ -0,0 +1,136 @@
+# =============================================================================
+# AlfaIA/tests/test_exercises_manager.py - ExercisesManager sobre el esquema migrado
+# =============================================================================
+
+import json
+import random
+import sqlite3
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from core.database.connection import LOOKUP_COLUMNS, LOOKUP_TABLES
+from modules.exercises.exercises_manager import ExercisesManager, TipoEjercicio
+
+# Subconjunto del esquema tras migrate_lookup_columns: ejercicios.tipo es el id del catálogo
+SCHEMA = """
+         CREATE TABLE tipos_ejercicio (id INTEGER PRIMARY KEY, nombre TEXT UNIQUE NOT NULL);
+         CREATE TABLE categorias (id INTEGER PRIMARY KEY, nombre TEXT, color_hex TEXT);
+         CREATE TABLE ejercicios
+         (
+             id                        INTEGER PRIMARY KEY,
+             tipo                      INTEGER NOT NULL REFERENCES tipos_ejercicio (id),
+             titulo                    TEXT    NOT NULL,
+             instrucciones             TEXT    NOT NULL,
+             contenido_json            TEXT    NOT NULL,
+             respuestas_correctas_json TEXT    NOT NULL,
+             explicaciones_json        TEXT,
+             categoria_id              INTEGER REFERENCES categorias (id),
+             nivel_dificultad          INTEGER DEFAULT 1,
+             puntos_maximos            INTEGER DEFAULT 10,
+             tiempo_limite_segundos    INTEGER DEFAULT 300,
+             pistas_json               TEXT,
+             activo                    BOOLEAN DEFAULT TRUE
+         );
+         """
+
+
+class SQLiteDatabase:
+    """Sustituto de DatabaseManager.execute_query sobre SQLite en memoria"""
+
+    def __init__(self):
+        self.connection = sqlite3.connect(":memory:")
+        self.connection.create_function("RAND", 0, random.random)
+        self.connection.executescript(SCHEMA)
+        self.connection.executemany(
+            "INSERT INTO tipos_ejercicio (id, nombre) VALUES (?, ?)",
+            enumerate(LOOKUP_TABLES["tipos_ejercicio"], start=1)
+        )
+        self.connection.execute("INSERT INTO categorias VALUES (1, 'Gramática', '#4A90E2')")
+        self.queries = []
+
+    def add_exercise(self, tipo_id, titulo, categoria_id=None, nivel=3, activo=True):
+        self.connection.execute(
+            "INSERT INTO ejercicios (tipo, titulo, instrucciones, contenido_json, "
+            "respuestas_correctas_json, explicaciones_json, categoria_id, nivel_dificultad, "
+            "pistas_json, activo) VALUES (?, ?, 'Instrucciones', ?, ?, NULL, ?, ?, ?, ?)",
+            (tipo_id, titulo, json.dumps({"oraciones": ["Los niña juegan"]}),
+             json.dumps([{"error": "niña", "correccion": "niñas"}]), categoria_id, nivel,
+             json.dumps({"1": "Revisa la concordancia"}), activo)
+        )
+
+    def execute_query(self, query, params=None, dictionary=False):
+        self.queries.append((query, params))
+        return self.connection.execute(query.replace("%s", "?"), params or ()).fetchall()
+
+
+@pytest.fixture
+def database():
+    return SQLiteDatabase()
+
+
+@pytest.fixture
+def manager(database):
+    manager = ExercisesManager()
+    manager.db_manager = database
+    return manager
+
+
+def test_tipo_ids_match_the_migration_mapping():
+    migrated = next(mapping for tabla, columna, _, mapping, _ in LOOKUP_COLUMNS
+                    if (tabla, columna) == ("ejercicios", "tipo"))
+    for index, tipo in enumerate(TipoEjercicio, start=1):
+        assert migrated[tipo.value.lower()] == index
+
+
+def test_get_exercises_by_type_filters_by_catalog_id(manager, database):
+    database.add_exercise(2, "Concordancia", categoria_id=1)
+    database.add_exercise(1, "Completar")
+    database.add_exercise(2, "Inactivo", activo=False)
+
+    exercises = manager.get_exercises_by_type(TipoEjercicio.ENCONTRAR_ERROR, limite=5)
+
+    assert database.queries[-1][1] == (2, 5)
+    assert [exercise["titulo"] for exercise in exercises] == ["Concordancia"]
+    exercise = exercises[0]
+    assert exercise["tipo"] == TipoEjercicio.ENCONTRAR_ERROR.value
+    assert exercise["contenido"] == {"oraciones": ["Los niña juegan"]}
+    assert exercise["respuestas_correctas"] == [{"error": "niña", "correccion": "niñas"}]
+    assert exercise["explicaciones"] == {}
+    assert exercise["pistas"] == {"1": "Revisa la concordancia"}
+    assert exercise["categoria_nombre"] == "Gramática"
+    assert exercise["categoria_color"] == "#4A90E2"
+
+
+def test_get_exercises_by_level_returns_type_names(manager, database):
+    database.add_exercise(5, "Ordenar", nivel=4)
+
+    exercises = manager.get_exercises_by_level(4)
+
+    assert len(exercises) == 1
+    assert exercises[0]["tipo"] == TipoEjercicio.ORDENAR_FRASE.value
+    assert exercises[0]["categoria_nombre"] == "General"
+
+
+def test_get_random_exercise_parses_decoded_json(manager, database):
+    database.add_exercise(4, "Lectura", nivel=2)
+    decoded_rows = []
+
+    def execute_query(query, params=None, dictionary=False):
+        rows = SQLiteDatabase.execute_query(database, query, params)
+        # El conector con OrjsonConverter entrega las columnas JSON ya decodificadas
+        decoded_rows.extend(
+            row[:4] + tuple(json.loads(value) if value else value for value in row[4:7]) + row[7:]
+            for row in rows
+        )
+        return decoded_rows
+
+    database.execute_query = execute_query
+    exercise = manager.get_random_exercise(user_level=2)
+
+    assert exercise["titulo"] == "Lectura"
+    assert exercise["tipo"] == TipoEjercicio.COMPRENSION.value
+    assert exercise["contenido"] == {"oraciones": ["Los niña juegan"]}
@@ -11,7 +11,9 @@ from PyQt6.QtWidgets import (
     QMessageBox, QProgressBar, QApplication, QSizePolicy,
     QScrollArea, QSpacerItem
 )
-from PyQt6.QtCore import Qt, QDate, QThread, pyqtSignal, QTimer, QSize, QPropertyAnimation, QEasingCurve
+from PyQt6.QtCore import (
+    Qt, QDate, QObject, QRunnable, QThreadPool, pyqtSignal, QTimer, QSize, QPropertyAnimation, QEasingCurve
+)
 from PyQt6.QtGui import QFont, QPixmap, QPalette, QColor, QPainter, QBrush, QLinearGradient, QScreen
 
 from AlfaIA.core.auth.authentication import get_auth_manager
@@ -74,14 +76,35 @@ class ResponsiveFrame(QFrame):
             self.layout().setContentsMargins(int(margin_h), int(margin_v), int(margin_h), int(margin_v))
 
 
-class AuthWorker(QThread):
-    """Worker thread para operaciones de autenticación - SIN DEADLOCK"""
+class AuthWorkerSignals(QObject):
+    """Señales del AuthWorker (QRunnable no es un QObject)"""
     auth_completed = pyqtSignal(bool, str, object)
 
+
+class AuthWorker(QRunnable):
+    """
+    Tarea de autenticación para el QThreadPool global - SIN DEADLOCK
+
+    Se reutilizan los hilos del pool en lugar de crear un QThread por intento,
+    y el pool limita cuántas autenticaciones golpean la BD a la vez.
+    """
+
     def __init__(self, operation, **kwargs):
         super().__init__()
+        # El formulario conserva la referencia; el pool no debe destruirla
+        self.setAutoDelete(False)
         self.operation = operation
         self.kwargs = kwargs
+        self.signals = AuthWorkerSignals()
+        self._running = False
+
+    def start(self):
+        """Encolar la tarea en el pool global de hilos"""
+        self._running = True
+        QThreadPool.globalInstance().start(self)
+
+    def isRunning(self):
+        return self._running
 
     def run(self):
         """Ejecutar operación de autenticación - VERSIÓN SIN DEADLOCK"""
@@ -122,21 +145,22 @@ class AuthWorker(QThread):
                             print(f"✅ Usuario obtenido en segundo intento: {user.email}")
 
                 print(f"🎯 Emitiendo señal: success={success}, user={'Sí' if user else 'No'}")
-                self.auth_completed.emit(success, message, user)
+                self.signals.auth_completed.emit(success, message, user)
 
             elif self.operation == "register":
                 success, message = auth_manager.register_user(**self.kwargs)
-                self.auth_completed.emit(success, message, None)
+                self.signals.auth_completed.emit(success, message, None)
             else:
-                self.auth_completed.emit(False, "Operación no válida", None)
+                self.signals.auth_completed.emit(False, "Operación no válida", None)
 
         except Exception as e:
             print(f"❌ Error en AuthWorker: {e}")
             import traceback
             traceback.print_exc()
-            self.auth_completed.emit(False, f"Error: {str(e)}", None)
+            self.signals.auth_completed.emit(False, f"Error: {str(e)}", None)
 
         finally:
+            self._running = False
             print("🏁 AuthWorker terminado")
 
 
@@ -539,7 +563,7 @@ class LoginForm(QWidget):
         self.set_loading_state(True)
 
         self.auth_worker = AuthWorker("login", email=email, password=password)
-        self.auth_worker.auth_completed.connect(self.on_login_completed)
+        self.auth_worker.signals.auth_completed.connect(self.on_login_completed)
         self.auth_worker.start()
 
     def show_field_error(self, field, message):
@@ -1001,7 +1025,7 @@ class RegisterForm(QWidget):
             apellido=apellido,
             nivel_inicial=nivel_inicial
         )
-        self.auth_worker.auth_completed.connect(self.on_register_completed)
+        self.auth_worker.signals.auth_completed.connect(self.on_register_completed)
         self.auth_worker.start()
 
     def show_field_error(self, field, message):
@@ -1265,16 +1289,20 @@ class LoginWindow(QWidget):
         """Manejar cierre de ventana con cleanup"""
         print("🧹 Limpiando recursos antes de cerrar...")
 
-        # Cleanup workers
-        if hasattr(self.login_form, 'auth_worker') and self.login_form.auth_worker:
-            if self.login_form.auth_worker.isRunning():
-                self.login_form.auth_worker.terminate()
-                self.login_form.auth_worker.wait(1000)  # Wait max 1 second
+        # Cleanup workers: las tareas del pool no se pueden abortar, así que se
+        # desconectan sus señales y se espera un máximo de 1 segundo
+        pending = False
+        for form in (self.login_form, self.register_form):
+            worker = getattr(form, 'auth_worker', None)
+            if worker and worker.isRunning():
+                try:
+                    worker.signals.auth_completed.disconnect()
+                except TypeError:
+                    pass
+                pending = True
 
-        if hasattr(self.register_form, 'auth_worker') and self.register_form.auth_worker:
-            if self.register_form.auth_worker.isRunning():
-                self.register_form.auth_worker.terminate()
-                self.register_form.auth_worker.wait(1000)
+        if pending:
+            QThreadPool.globalInstance().waitForDone(1000)
 
         print("✅ Cleanup completado")
         event.accept()
@@ -1289,6 +1317,7 @@ if __name__ == "__main__":
     print("=" * 60)
 
     app = QApplication(sys.argv)
+    QThreadPool.globalInstance().setMaxThreadCount(4)
 
     # Configurar aplicación
     app.setApplicationName("AlfaIA")
@@ -66,7 +66,7 @@ except ImportError as e:
     auth_manager = DummyAuthManager()
 
 try:
-    from core.utils.user_data_manager import UserDataManager as ImportedUserDataManager
+    from core.utils.user_data_manager import get_user_data_manager, release_user_data_manager
 
     print("✅ UserDataManager importado correctamente")
     USE_IMPORTED_MANAGER = True
@@ -85,7 +85,7 @@ class SafeUserDataManager:
         # Usar el importado si está disponible, sino usar fallback
         if USE_IMPORTED_MANAGER:
             try:
-                self.manager = ImportedUserDataManager(user)
+                self.manager = get_user_data_manager(user)
             except Exception as e:
                 print(f"❌ Error creando UserDataManager importado: {e}")
                 self.manager = None
@@ -1221,6 +1221,8 @@ class MainWindow(QMainWindow):
             except:
                 pass
 
+            self._release_user_data()
+
             # Cerrar ventana principal
             self.close()
 
@@ -1233,6 +1235,13 @@ class MainWindow(QMainWindow):
             except Exception as e:
                 print(f"❌ Error mostrando login: {e}")
 
+    def _release_user_data(self):
+        """Liberar el gestor de datos compartido del usuario actual"""
+        if USE_IMPORTED_MANAGER and self.user_data_manager:
+            user_id = getattr(self.user_data_manager.user, 'id', None)
+            if user_id:
+                release_user_data_manager(user_id)
+
     def show_about(self):
         """Mostrar información acerca de la aplicación"""
         QMessageBox.about(
@@ -1264,6 +1273,7 @@ class MainWindow(QMainWindow):
                 auth_manager.logout()
             except:
                 pass
+            self._release_user_data()
             event.accept()
         else:
             event.ignore()